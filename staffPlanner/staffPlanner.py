@@ -1,13 +1,36 @@
 import sys
 import os
+import math
+import csv
 import json
-from datetime import datetime, timedelta
+import hashlib
+import zlib
+import gzip
+import lzma
+import io
+import codecs
+import argparse
+import asyncio
+import bisect
+import threading
+import tracemalloc
+import struct
+import re
+from collections import deque, namedtuple
+from itertools import islice
+from multiprocessing import shared_memory, resource_tracker
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QTabWidget, QTableWidget,
     QTableWidgetItem, QVBoxLayout, QHBoxLayout, QPushButton, QComboBox,
-    QDialog, QLabel, QDoubleSpinBox, QHeaderView, QMessageBox, QLineEdit
+    QDialog, QLabel, QDoubleSpinBox, QHeaderView, QMessageBox, QLineEdit,
+    QFileDialog, QInputDialog, QProgressBar, QPlainTextEdit, QSpinBox, QCheckBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QEvent, QEventLoop, QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, pyqtSignal
+from PyQt6.QtGui import QAction, QActionGroup, QKeySequence, QImage, QPainter, QColor, QFontDatabase
 
 try:
     import qdarkstyle
@@ -17,20 +40,24 @@ except ImportError:
 MONTH_FORMAT = "%m/%y"
 MONTH_JSON_FORMAT = "%Y-%m"
 DOMAINS = ["Analysis", "HW", "MPG", "Functional"]
+RESOLUTIONS = {"month": 1, "quarter": 3, "year": 12}
+HORIZONS = [12, 24, 36, 60]
+
+Period = namedtuple("Period", ["label", "start", "stop", "months"])
+
+def add_months(month_key, delta):
+    year, month = map(int, month_key.split("-"))
+    year, month = divmod(year * 12 + month - 1 + delta, 12)
+    return f"{year:04d}-{month + 1:02d}"
+
+def month_range(start_key, count):
+    return [add_months(start_key, i) for i in range(count)]
+
+def month_span(first, last):
+    return (int(last[:4]) - int(first[:4])) * 12 + int(last[5:7]) - int(first[5:7]) + 1
 
 def get_next_months(start_month, count):
-    months = []
-    dt = datetime.strptime(start_month, MONTH_JSON_FORMAT)
-    for i in range(count):
-        months.append((dt + timedelta(days=31 * i)).replace(day=1))
-    unique_months = []
-    seen = set()
-    for m in months:
-        key = m.strftime(MONTH_JSON_FORMAT)
-        if key not in seen:
-            unique_months.append(m)
-            seen.add(key)
-    return unique_months[:count]
+    return [datetime.strptime(m, MONTH_JSON_FORMAT) for m in month_range(start_month, count)]
 
 def format_month(dt):
     return dt.strftime(MONTH_FORMAT)
@@ -42,61 +69,1779 @@ def get_current_month():
     now = datetime.now()
     return now.replace(day=1).strftime(MONTH_JSON_FORMAT)
 
+def period_start(month_key, resolution, fiscal_start=1):
+    month = int(month_key.split("-")[1])
+    return add_months(month_key, -((month - fiscal_start) % RESOLUTIONS[resolution]))
+
+def period_label(first, resolution, fiscal_start=1):
+    dt = datetime.strptime(first, MONTH_JSON_FORMAT)
+    if resolution == "month":
+        return format_month(dt)
+    # Fiscal years are named after the calendar year they end in
+    fiscal_year = (dt.year + (fiscal_start > 1 and dt.month >= fiscal_start)) % 100
+    if resolution == "quarter":
+        return f"Q{(dt.month - fiscal_start) % 12 // 3 + 1} FY{fiscal_year:02d}"
+    return f"FY{fiscal_year:02d}"
+
+def build_periods(start_key, count, resolution="month", fiscal_start=1):
+    # The first period is snapped back to its boundary; the months before
+    # start_key don't count towards the horizon, which always runs to
+    # start_key + count
+    step = RESOLUTIONS[resolution]
+    first = period_start(start_key, resolution, fiscal_start)
+    offset = month_span(first, start_key) - 1
+    periods = []
+    for i in range(-(-(offset + count) // step)):
+        start = add_months(first, i * step)
+        periods.append(Period(period_label(start, resolution, fiscal_start), i * step, (i + 1) * step, month_range(start, step)))
+    return periods
+
+def period_index(periods, month_key):
+    # Period.start/stop count months from the first period's first month
+    offset = month_span(periods[0].months[0], month_key) - 1
+    return next((i for i, p in enumerate(periods) if p.start <= offset < p.stop), None)
+
+def period_means(matrix, periods):
+    # Average FTE per period from cumulative sums along the month axis; rounded
+    # so that sums of equal months don't pick up float noise near thresholds.
+    if all(p.stop - p.start == 1 for p in periods):
+        return matrix
+    sums = np.zeros((matrix.shape[0], matrix.shape[1] + 1))
+    np.cumsum(matrix, axis=1, out=sums[:, 1:])
+    starts = np.array([p.start for p in periods])
+    stops = np.array([p.stop for p in periods])
+    return np.round((sums[:, stops] - sums[:, starts]) / (stops - starts), 9)
+
+def period_values(staffing_data, kind, key, periods):
+    months = [m for p in periods for m in p.months]
+    values = [staffing_data.month_value(kind, key, m) for m in months]
+    return list(period_means(np.array([values]), periods)[0]) if len(months) != len(periods) else values
+
+def period_value(staffing_data, kind, key, period):
+    if len(period.months) == 1:
+        return staffing_data.month_value(kind, key, period.months[0])
+    return sum(staffing_data.month_value(kind, key, m) for m in period.months) / len(period.months)
+
+def period_text(value, period):
+    return str(value) if len(period.months) == 1 else f"{value:.2f}"
+
+def set_period(staffing_data, kind, key, period, value):
+    if len(period.months) == 1:
+        staffing_data.set_month(kind, key, period.months[0], value)
+        return
+    # Typing a value over a quarter or year sets every month in it
+    with staffing_data.transaction():
+        for month in period.months:
+            staffing_data.set_month(kind, key, month, value)
+
+def fill_project_combo(combo, staffing_data, project_id=None):
+    combo.blockSignals(True)
+    combo.clear()
+    for name in staffing_data.project_names():
+        combo.addItem(name, staffing_data.project_id(name))
+    if project_id:
+        idx = combo.findData(project_id)
+        if idx >= 0:
+            combo.setCurrentIndex(idx)
+    combo.blockSignals(False)
+
+def fill_employee_combo(combo, staffing_data, emp_id=None):
+    combo.blockSignals(True)
+    combo.clear()
+    for emp in staffing_data.data["employees"]:
+        combo.addItem(emp["name"], emp["id"])
+    if emp_id:
+        idx = combo.findData(emp_id)
+        if idx >= 0:
+            combo.setCurrentIndex(idx)
+    combo.blockSignals(False)
+
+def lists_names(event):
+    # Only these change what a project or employee dropdown shows
+    return isinstance(event, (RecordAdded, RecordRemoved)) or event.field in ("name", "id")
+
+def update_name_combo(combo, event, by_name):
+    # One project/employee event applied to a filled dropdown; projects are
+    # listed by name, employees in plan order
+    combo.blockSignals(True)
+    current, text = combo.currentData(), combo.currentText()
+    if isinstance(event, RecordRemoved):
+        combo.removeItem(combo.findData(event.key))
+    elif isinstance(event, RecordUpdated) and event.field == "id":
+        combo.setItemData(combo.findData(event.old), event.new)
+    elif isinstance(event, RecordUpdated) and not by_name:
+        combo.setItemText(combo.findData(event.key), event.new)
+    else:
+        name = event.new if isinstance(event, RecordUpdated) else event.record["name"]
+        combo.removeItem(combo.findData(event.key))
+        if by_name:
+            position = bisect.bisect([combo.itemText(i) for i in range(combo.count())], name)
+        else:
+            position = min(event.position, combo.count())
+        combo.insertItem(position, name, event.key)
+        if current == event.key:
+            combo.setCurrentIndex(position)
+    if current is None and combo.isEditable():
+        combo.setEditText(text)
+    combo.blockSignals(False)
+
+def set_combo_text(combo, text):
+    combo.blockSignals(True)
+    combo.setCurrentText(text)
+    combo.blockSignals(False)
+
+def parse_cell(item):
+    try:
+        return float(item.text())
+    except (AttributeError, ValueError):
+        return None
+
+def set_cell_text(table, row, col, text):
+    item = table.item(row, col)
+    if item and item.text() != text:
+        blocked = table.blockSignals(True)
+        item.setText(text)
+        table.blockSignals(blocked)
+    return item
+
+def mark_period_header(table, label):
+    # Bold the column of the period holding the current month
+    for col in range(table.columnCount()):
+        item = table.horizontalHeaderItem(col)
+        if item is not None:
+            font = item.font()
+            font.setBold(item.text() == label)
+            item.setFont(font)
+
+def set_output_cell(table, row, col, val, colour):
+    item = table.item(row, col)
+    if item is None:
+        item = QTableWidgetItem()
+        table.setItem(row, col, item)
+    item.setText(f"{val:.2f}")
+    if colour is not None:
+        item.setBackground(colour)
+    else:
+        item.setData(Qt.ItemDataRole.BackgroundRole, None)
+
+def style_demand_item(item, val):
+    table = item.tableWidget()
+    blocked = table.blockSignals(True) if table else False
+    if val == 0.0:
+        item.setBackground(Qt.GlobalColor.lightGray)
+        item.setForeground(Qt.GlobalColor.gray)
+    else:
+        item.setData(Qt.ItemDataRole.BackgroundRole, None)
+        item.setData(Qt.ItemDataRole.ForegroundRole, None)
+    if table:
+        table.blockSignals(blocked)
+
+def combo_project_id(combo, staffing_data):
+    name = combo.currentText()
+    pid = combo.currentData()
+    if pid and staffing_data.project_name(pid) == name:
+        return pid
+    return staffing_data.add_project(name) if name else None
+
+RECORD_LISTS = {"employee": "employees", "project": "projects", "demand": "demand", "allocation": "allocation"}
+MONTHLY_FIELDS = {"availability": "availability", "demand": "monthly_demand", "allocation": "monthly_allocation"}
+MONTH_DEFAULTS = {"availability": 1.0, "demand": 0.0, "allocation": 0.0}
+UNDO_DEPTH = 200
+RELOAD_DEBOUNCE_MS = 300
+
+# One edit to the plan. For record-level changes field is None, month holds the
+# list position and old/new hold the whole record (None when absent).
+Change = namedtuple("Change", ["kind", "key", "field", "month", "old", "new"])
+
+# Events published to views, one list per committed transaction
+RecordAdded = namedtuple("RecordAdded", ["kind", "key", "record", "position"])
+RecordRemoved = namedtuple("RecordRemoved", ["kind", "key", "record", "position"])
+RecordUpdated = namedtuple("RecordUpdated", ["kind", "key", "field", "old", "new"])
+CellChanged = namedtuple("CellChanged", ["kind", "key", "month", "old", "new"])
+
+def invert_change(change):
+    return change._replace(old=change.new, new=change.old)
+
+def change_event(change):
+    if change.field is None:
+        if change.new is None:
+            return RecordRemoved(change.kind, change.key, change.old, change.month)
+        return RecordAdded(change.kind, change.key, change.new, change.month)
+    if change.month is not None:
+        return CellChanged(change.kind, change.key, change.month, change.old, change.new)
+    return RecordUpdated(change.kind, change.key, change.field, change.old, change.new)
+
+def numeric_ids(records):
+    return [int(r["id"]) for r in records if str(r.get("id", "")).isdigit()]
+
+def default_thresholds():
+    return {
+        "output1_red": 1.0,
+        "output1_blue": 0.0,
+        "output2_red": 1.2,
+        "output2_blue": 0.8
+    }
+
+def normalize_plan(data):
+    for key in ["employees", "projects", "demand", "allocation", "availability", "thresholds"]:
+        if key not in data:
+            if key == "thresholds":
+                data[key] = default_thresholds()
+            elif key in ["employees", "projects", "demand", "allocation"]:
+                data[key] = []
+            else:
+                data[key] = {}
+    migrate_project_names(data)
+    ensure_record_ids(data)
+    for emp in data["employees"]:
+        if emp["id"] not in data["availability"]:
+            data["availability"][emp["id"]] = {}
+    return data
+
+def migrate_project_names(data):
+    # Older files repeat the project name in every demand/allocation entry
+    name_to_id = {p["name"]: p["id"] for p in data["projects"]}
+    for key in ["demand", "allocation"]:
+        for entry in data[key]:
+            if "project_id" in entry:
+                continue
+            name = entry.pop("project", "")
+            if name not in name_to_id:
+                pid = str(max(numeric_ids(data["projects"]) + [0]) + 1)
+                data["projects"].append({"id": pid, "name": name})
+                name_to_id[name] = pid
+            entry["project_id"] = name_to_id[name]
+
+def ensure_record_ids(data):
+    for key in ["demand", "allocation"]:
+        if all("id" in entry for entry in data[key]):
+            continue
+        next_id = max(numeric_ids(data[key]) + [0]) + 1
+        for entry in data[key]:
+            if "id" not in entry:
+                entry["id"] = str(next_id)
+                next_id += 1
+
+def plan_records(data):
+    for kind, key in RECORD_LISTS.items():
+        for record in data[key]:
+            yield (kind, record["id"]), record
+    for emp_id, series in data["availability"].items():
+        yield ("availability", emp_id), series
+
+PLAN_SECTIONS = set(RECORD_LISTS.values()) | {"availability"}
+
+def plan_settings(data):
+    # Everything besides the record sections: thresholds, format rules, fiscal
+    # year start, domain rates, output metrics and whatever comes next
+    return {key: value for key, value in data.items() if key not in PLAN_SECTIONS}
+
+def record_digest(record):
+    return hashlib.blake2b(json.dumps(record, sort_keys=True).encode(), digest_size=8).digest()
+
+def plan_digests(data):
+    return {ref: record_digest(record) for ref, record in plan_records(data)}
+
+class UndoStack:
+    def __init__(self, depth=UNDO_DEPTH):
+        self.depth = depth
+        self.undo_groups = deque(maxlen=depth)
+        self.redo_groups = []
+
+    def push(self, changes):
+        self.undo_groups.append(changes)
+        self.redo_groups.clear()
+
+    def clear(self):
+        self.undo_groups.clear()
+        self.redo_groups.clear()
+
+    def can_undo(self):
+        return bool(self.undo_groups)
+
+    def can_redo(self):
+        return bool(self.redo_groups)
+
 class StaffingData:
-    def __init__(self, filename="staffing_data.json"):
+    def __init__(self, filename="staffing_data.json", undo_depth=UNDO_DEPTH, data=None, readonly=False, stream=False):
         self.filename = filename
-        self.load()
+        self.readonly = readonly
+        self.undo_stack = UndoStack(undo_depth)
+        self.subscribers = []
+        self._batch = None
+        self._external = False
+        self.dirty = False
+        self.file_digest = None
+        self.base_raw = b""
+        self.history = None
+        self.save_format = plan_save_format(filename)
+        self.mapped = None
+        self.mapped_stale = set()
+        self.loading = False
+        self.save_pending = None
+        if data is not None:
+            self.data = normalize_plan(data)
+            self.reindex()
+            self.unsaved = set()
+            return
+        if stream and self.streamable():
+            # Sections arrive through load_section(); finish_loading() completes the plan
+            self.data = normalize_plan({})
+            self.reindex()
+            self.unsaved = set()
+            self.loading = True
+            self.section_order = []
+        else:
+            self.load()
+        path = history_dir(filename)
+        if os.path.isdir(path):
+            self.history = PlanHistory(path)
+            self.history.attach(self)
 
     def load(self):
         if not os.path.exists(self.filename):
-            self.data = {
-                "employees": [],
-                "demand": [],
-                "allocation": [],
-                "availability": {},
-                "thresholds": {
-                    "output1_red": 1.0,
-                    "output1_blue": 0.0,
-                    "output2_red": 1.2,
-                    "output2_blue": 0.8
-                }
-            }
+            self.data = normalize_plan({})
             self.save()
         else:
-            with open(self.filename, "r") as f:
-                self.data = json.load(f)
-        for key in ["employees", "demand", "allocation", "availability", "thresholds"]:
-            if key not in self.data:
-                if key == "thresholds":
-                    self.data[key] = {
-                        "output1_red": 1.0,
-                        "output1_blue": 0.0,
-                        "output2_red": 1.2,
-                        "output2_blue": 0.8
-                    }
-                elif key in ["demand", "allocation"]:
-                    self.data[key] = []
+            with open(self.filename, "rb") as f:
+                raw = f.read()
+            if raw.startswith(COLUMNAR_MAGIC):
+                self.map_file()
+                self.data = normalize_plan(self.mapped.to_plan())
+                self.save_format = "columnar"
+            else:
+                data, self.save_format = decode_plan(raw)
+                self.data = normalize_plan(data)
+            self.file_digest = hashlib.sha1(raw).hexdigest()
+            self.base_raw = raw
+        self.reindex()
+        self.undo_stack.clear()
+        self.unsaved = set()
+        self.dirty = False
+
+    def streamable(self):
+        if not os.path.exists(self.filename):
+            return False
+        with open(self.filename, "rb") as f:
+            return not f.read(len(COLUMNAR_MAGIC)).startswith(COLUMNAR_MAGIC)
+
+    def load_section(self, section, items, complete):
+        if section not in self.section_order:
+            self.section_order.append(section)
+        if section in RECORD_LISTS.values():
+            self.data[section].extend(items)
+        elif section == "availability":
+            self.data["availability"].update(items)
+        else:
+            self.data[section] = items
+        if complete and all(self.section_ready(key) for key in RECORD_LISTS.values()):
+            self.reindex()
+
+    def section_ready(self, section):
+        # Old files without record ids are migrated once everything is in
+        if section not in ("demand", "allocation"):
+            return all("id" in r for r in self.data[section])
+        return all("id" in r and "project_id" in r for r in self.data[section])
+
+    def finish_loading(self, digest, raw, save_format):
+        # Keep the file's section order, as a full read would
+        order = self.section_order + [key for key in self.data if key not in self.section_order]
+        self.data = normalize_plan({key: self.data[key] for key in order})
+        self.reindex()
+        self.save_format = save_format
+        self.file_digest = digest
+        self.base_raw = raw
+        self.loading = False
+        if self.save_pending is not None:
+            self.save(self.save_pending)
+
+    def map_file(self):
+        # The engine reads unedited series straight from the mapped file
+        self.mapped = ColumnarPlan(self.filename)
+        self.mapped_stale = set()
+
+    def mapped_vector(self, kind, key, month_keys):
+        if self.mapped is None or (kind, key) in self.mapped_stale:
+            return None
+        return self.mapped.vector(kind, key, month_keys)
+
+    def reindex(self):
+        self.records = {
+            kind: {r["id"]: r for r in self.data[key]}
+            for kind, key in RECORD_LISTS.items()
+        }
+        self.next_ids = {
+            kind: max(numeric_ids(self.data[key]) + [0]) + 1
+            for kind, key in RECORD_LISTS.items()
+        }
+        self.project_ids_by_name = {}
+        self.demand_by_project = {pid: {} for pid in self.records["project"]}
+        self.allocation_by_project = {pid: {} for pid in self.records["project"]}
+        self.allocation_by_employee = {eid: {} for eid in self.records["employee"]}
+        for kind in RECORD_LISTS:
+            for record in self.records[kind].values():
+                self._index(kind, record)
+
+    def _index(self, kind, record):
+        if kind == "project":
+            self.project_ids_by_name[record["name"]] = record["id"]
+        elif kind == "demand":
+            self.demand_by_project.setdefault(record["project_id"], {})[record["id"]] = record
+        elif kind == "allocation":
+            self.allocation_by_project.setdefault(record["project_id"], {})[record["id"]] = record
+            self.allocation_by_employee.setdefault(record["employee_id"], {})[record["id"]] = record
+
+    def _unindex(self, kind, record):
+        if kind == "project":
+            if self.project_ids_by_name.get(record["name"]) == record["id"]:
+                del self.project_ids_by_name[record["name"]]
+        elif kind == "demand":
+            self.demand_by_project.get(record["project_id"], {}).pop(record["id"], None)
+        elif kind == "allocation":
+            self.allocation_by_project.get(record["project_id"], {}).pop(record["id"], None)
+            self.allocation_by_employee.get(record["employee_id"], {}).pop(record["id"], None)
+
+    def get_record(self, kind, key):
+        if kind == "availability":
+            return self.data["availability"].get(key)
+        return self.records[kind].get(key)
+
+    def series(self, kind, key):
+        if kind == "availability":
+            return self.data["availability"].setdefault(key, {})
+        return self.records[kind][key].setdefault(MONTHLY_FIELDS[kind], {})
+
+    def month_value(self, kind, key, month):
+        record = self.get_record(kind, key)
+        if record is None:
+            return MONTH_DEFAULTS[kind]
+        series = record if kind == "availability" else record.get(MONTHLY_FIELDS[kind], {})
+        return series.get(month, MONTH_DEFAULTS[kind])
+
+    def new_id(self, kind):
+        key = str(self.next_ids[kind])
+        self.next_ids[kind] += 1
+        return key
+
+    def apply(self, change):
+        kind, key = change.kind, change.key
+        if kind == "plan":
+            # A top-level setting such as thresholds or domain_rates
+            if change.new is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = change.new
+            return
+        if self.mapped is not None:
+            self.mapped_stale.add((kind, key))
+        if change.field is None:
+            if kind == "availability":
+                if change.new is None:
+                    self.data["availability"].pop(key, None)
+                else:
+                    self.data["availability"][key] = change.new
+                return
+            records = self.data[RECORD_LISTS[kind]]
+            if change.new is None:
+                record = self.records[kind].pop(key)
+                position = change.month
+                if position is None or position >= len(records) or records[position] is not record:
+                    position = next(i for i, r in enumerate(records) if r is record)
+                del records[position]
+                self._unindex(kind, record)
+            else:
+                position = change.month if change.month is not None else len(records)
+                records.insert(position, change.new)
+                if str(key).isdigit():
+                    self.next_ids[kind] = max(self.next_ids[kind], int(key) + 1)
+                self.records[kind][key] = change.new
+                self._index(kind, change.new)
+        elif change.month is not None:
+            series = self.series(kind, key)
+            if change.new is None:
+                series.pop(change.month, None)
+            else:
+                series[change.month] = change.new
+        else:
+            record = self.records[kind][key]
+            self._unindex(kind, record)
+            if change.new is None:
+                record.pop(change.field, None)
+            else:
+                record[change.field] = change.new
+            self._index(kind, record)
+
+    def commit(self, change):
+        if self.readonly:
+            raise PermissionError("this plan is read-only")
+        self.apply(change)
+        if not self._external:
+            self.unsaved.add((change.kind, change.key, change.field, change.month))
+            self.dirty = True
+        if self._batch is not None:
+            self._batch.append(change)
+        else:
+            self.undo_stack.push([change])
+            self.notify([change])
+
+    @contextmanager
+    def transaction(self, external=False):
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        self._external = external
+        unsaved, dirty = set(self.unsaved), self.dirty
+        try:
+            yield
+        except BaseException:
+            # A failed batch is undone in place: nothing is pushed, notified or left unsaved
+            for change in reversed(self._batch):
+                self.apply(invert_change(change))
+            self._batch = []
+            self.unsaved, self.dirty = unsaved, dirty
+            raise
+        finally:
+            changes, self._batch = self._batch, None
+            self._external = False
+            if changes:
+                self.undo_stack.push(changes)
+                self.notify(changes)
+
+    def subscribe(self, handler, kinds=None):
+        self.subscribers.append((handler, set(kinds) if kinds else None))
+
+    def unsubscribe(self, handler):
+        self.subscribers = [(h, k) for h, k in self.subscribers if h != handler]
+
+    def notify(self, changes):
+        events = [change_event(c) for c in changes]
+        for handler, kinds in list(self.subscribers):
+            selected = events if kinds is None else [e for e in events if e.kind in kinds]
+            if selected:
+                handler(selected)
+
+    def event_record(self, event):
+        if isinstance(event, (RecordAdded, RecordRemoved)):
+            return event.record
+        return self.get_record(event.kind, event.key)
+
+    def undo(self):
+        if not self.undo_stack.can_undo():
+            return False
+        changes = self.undo_stack.undo_groups.pop()
+        inverse = [invert_change(c) for c in reversed(changes)]
+        for change in inverse:
+            self.apply(change)
+            self.unsaved.add((change.kind, change.key, change.field, change.month))
+        self.undo_stack.redo_groups.append(changes)
+        self.dirty = True
+        self.notify(inverse)
+        return True
+
+    def redo(self):
+        if not self.undo_stack.can_redo():
+            return False
+        changes = self.undo_stack.redo_groups.pop()
+        for change in changes:
+            self.apply(change)
+            self.unsaved.add((change.kind, change.key, change.field, change.month))
+        self.undo_stack.undo_groups.append(changes)
+        self.dirty = True
+        self.notify(changes)
+        return True
+
+    def set_field(self, kind, key, field, value):
+        old = self.records[kind][key].get(field)
+        if old != value:
+            self.commit(Change(kind, key, field, None, old, value))
+
+    def set_month(self, kind, key, month, value):
+        old = self.series(kind, key).get(month)
+        if (old if old is not None else MONTH_DEFAULTS[kind]) != value:
+            self.commit(Change(kind, key, MONTHLY_FIELDS[kind], month, old, value))
+
+    def set_setting(self, name, value):
+        old = self.data.get(name)
+        if old != value:
+            self.commit(Change("plan", name, "value", None, old, value))
+
+    def add_record(self, kind, record):
+        if kind == "availability":
+            self.commit(Change(kind, record["id"], None, None, None, {}))
+            return record["id"]
+        key = record.get("id") or self.new_id(kind)
+        record["id"] = key
+        with self.transaction():
+            self.commit(Change(kind, key, None, len(self.data[RECORD_LISTS[kind]]), None, record))
+            if kind == "employee":
+                self.commit(Change("availability", key, None, None, None, {}))
+        return key
+
+    def remove_record(self, kind, key):
+        if kind == "availability":
+            old = self.data["availability"].get(key)
+            if old is not None:
+                self.commit(Change(kind, key, None, None, old, None))
+            return
+        with self.transaction():
+            if kind == "employee":
+                for alloc_id in list(self.allocation_by_employee.get(key, {})):
+                    self.remove_record("allocation", alloc_id)
+                self.remove_record("availability", key)
+            elif kind == "project":
+                for entry_id in list(self.demand_by_project.get(key, {})):
+                    self.remove_record("demand", entry_id)
+                for alloc_id in list(self.allocation_by_project.get(key, {})):
+                    self.remove_record("allocation", alloc_id)
+            self.commit(Change(kind, key, None, self.position(kind, key), self.records[kind][key], None))
+
+    def project_name(self, project_id):
+        project = self.records["project"].get(project_id)
+        return project["name"] if project else ""
+
+    def project_id(self, name):
+        return self.project_ids_by_name.get(name)
+
+    def project_names(self):
+        return sorted(self.project_ids_by_name)
+
+    def add_project(self, name):
+        if name in self.project_ids_by_name:
+            return self.project_ids_by_name[name]
+        return self.add_record("project", {"name": name})
+
+    def rename_project(self, project_id, name):
+        self.set_field("project", project_id, "name", name)
+
+    def remove_project(self, project_id):
+        self.remove_record("project", project_id)
+
+    def project_scaling(self, project_id):
+        entries = self.demand_by_project.get(project_id)
+        return next(iter(entries.values())).get("scaling_factor", 1.0) if entries else 1.0
+
+    def set_project_scaling(self, project_id, scaling):
+        with self.transaction():
+            for entry_id in list(self.demand_by_project.get(project_id, {})):
+                self.set_field("demand", entry_id, "scaling_factor", scaling)
+
+    def save(self, message=""):
+        if self.readonly:
+            raise PermissionError("this plan is read-only")
+        if self.loading:
+            # Writing now would drop the sections still on their way in
+            self.save_pending = message
+            return
+        if self.save_format == "columnar":
+            # Written aside and swapped in: the old file may still be mapped
+            raw = ColumnarPlan.encode(self.data)
+            with open(self.filename + ".tmp", "wb") as f:
+                f.write(raw)
+            os.replace(self.filename + ".tmp", self.filename)
+            self.map_file()
+        else:
+            if self.save_format == "compact":
+                raw = encode_compact(stream_order(self.data), COMPRESSORS.get(os.path.splitext(self.filename)[1]))
+            else:
+                raw = json.dumps(stream_order(self.data), indent=2).encode()
+            with open(self.filename, "wb") as f:
+                f.write(raw)
+        self.file_digest = hashlib.sha1(raw).hexdigest()
+        self.base_raw = raw
+        self.unsaved = set()
+        self.dirty = False
+        if self.history:
+            self.history.commit(self.data, message)
+
+    def sync_from_disk(self):
+        # Three-way merge: the file on disk against the last loaded/saved state
+        # (kept as raw bytes, digested per record on demand) and the in-memory
+        # plan with unsaved edits.
+        with open(self.filename, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if digest == self.file_digest:
+            return None
+        remote = normalize_plan(read_plan_bytes(raw))
+        base = normalize_plan(read_plan_bytes(self.base_raw)) if self.base_raw else None
+        base_digests = plan_digests(base) if base else {}
+        base_settings = plan_settings(base) if base else {}
+        conflicts = self.merge_plan(remote, base_digests, base_settings, self.unsaved, external=True)
+        self.file_digest = digest
+        self.base_raw = raw
+        if raw.startswith(COLUMNAR_MAGIC):
+            self.map_file()
+            self.mapped_stale = {(kind, key) for (kind, key, _, _) in self.unsaved}
+        self.dirty = bool(self.unsaved)
+        return conflicts
+
+    def restore(self, data):
+        # Bring the plan to another state (e.g. a history version) as one undoable edit
+        self.merge_plan(normalize_plan(data), plan_digests(self.data), plan_settings(self.data), set())
+
+    def merge_plan(self, remote, base_digests, base_settings, protected, external=False):
+        # Apply the records of remote whose digest differs from base_digests, and
+        # the settings that differ from base_settings; cells and settings listed
+        # in protected keep their current value and are returned.
+        remote_records = dict(plan_records(remote))
+        positions = {(kind, r["id"]): i for kind, key in RECORD_LISTS.items() for i, r in enumerate(remote[key])}
+        touched = {(kind, key) for (kind, key, _, _) in protected}
+        conflicts = []
+        with self.transaction(external=external):
+            for kind in ["allocation", "demand", "availability", "employee", "project"]:
+                for ref in [r for r in base_digests if r[0] == kind and r not in remote_records]:
+                    if self.get_record(*ref) is None:
+                        continue
+                    if ref in touched:
+                        conflicts.append(ref + (None, None))
+                    elif kind == "availability":
+                        self.commit(Change(kind, ref[1], None, None, self.get_record(*ref), None))
+                    else:
+                        self.commit(Change(kind, ref[1], None, self.position(kind, ref[1]), self.get_record(*ref), None))
+            for kind in ["project", "employee", "availability", "demand", "allocation"]:
+                for ref, record in remote_records.items():
+                    if ref[0] != kind or base_digests.get(ref) == record_digest(record):
+                        continue
+                    local = self.get_record(*ref)
+                    if local is None:
+                        if ref in base_digests:
+                            conflicts.append(ref + (None, None))
+                        elif kind == "availability":
+                            self.commit(Change(kind, ref[1], None, None, None, record))
+                        else:
+                            position = min(positions[ref], len(self.data[RECORD_LISTS[kind]]))
+                            self.commit(Change(kind, ref[1], None, position, None, record))
+                        continue
+                    conflicts.extend(self.merge_record(kind, ref[1], local, record, protected))
+            remote_settings = plan_settings(remote)
+            for name in set(base_settings) | set(remote_settings) | set(plan_settings(self.data)):
+                value = remote_settings.get(name)
+                if value == base_settings.get(name) or value == self.data.get(name):
+                    continue
+                if ("plan", name, "value", None) in protected:
+                    conflicts.append(("plan", name, "value", None))
                 else:
-                    self.data[key] = {}
-        self.ensure_availability()
+                    self.set_setting(name, value)
+        return conflicts
 
-    def ensure_availability(self):
-        if "availability" not in self.data:
-            self.data["availability"] = {}
-        for emp in self.data["employees"]:
-            if emp["id"] not in self.data["availability"]:
-                self.data["availability"][emp["id"]] = {}
+    def merge_record(self, kind, key, local, remote, protected):
+        conflicts = []
+        monthly = MONTHLY_FIELDS.get(kind)
+        if kind == "availability":
+            local_series, remote_series, scalar_fields = local, remote, []
+        else:
+            local_series = local.get(monthly, {}) if monthly else {}
+            remote_series = remote.get(monthly, {}) if monthly else {}
+            scalar_fields = [f for f in set(local) | set(remote) if f not in ("id", monthly)]
+        for field in scalar_fields:
+            if local.get(field) != remote.get(field):
+                if (kind, key, field, None) in protected:
+                    conflicts.append((kind, key, field, None))
+                else:
+                    self.commit(Change(kind, key, field, None, local.get(field), remote.get(field)))
+        for month in set(local_series) | set(remote_series):
+            if local_series.get(month) != remote_series.get(month):
+                if (kind, key, monthly, month) in protected:
+                    conflicts.append((kind, key, monthly, month))
+                else:
+                    self.commit(Change(kind, key, monthly, month, local_series.get(month), remote_series.get(month)))
+        return conflicts
 
-    def save(self):
-        with open(self.filename, "w") as f:
-            json.dump(self.data, f, indent=2)
+    def position(self, kind, key):
+        record = self.records[kind][key]
+        return next(i for i, r in enumerate(self.data[RECORD_LISTS[kind]]) if r is record)
+
+OUTPUT_IDLE_MS = 120
+
+PlanSnapshot = namedtuple("PlanSnapshot", [
+    "generation", "months", "employees", "employee_domains", "project_names", "thresholds",
+    "demand", "allocation", "availability", "metrics", "employee_managers", "rates"
+])
+OutputResult = namedtuple("OutputResult", [
+    "generation", "months", "pairs", "pair_projects", "pair_scaling", "demand_alloc",
+    "employees", "avail_alloc", "demand", "availability", "employee_domains", "metrics", "costs"
+], defaults=[{}, {}])
+OVERALLOCATED_EPSILON = 1e-9
+COST_GROUPS = {"project": "Project", "domain": "Domain", "manager": "Manager"}
+
+class ComputeCancelled(Exception):
+    pass
+
+def month_vector(staffing_data, kind, key, month_keys):
+    record = staffing_data.get_record(kind, key) or {}
+    series = record if kind == "availability" else record.get(MONTHLY_FIELDS[kind], {})
+    default = MONTH_DEFAULTS[kind]
+    return tuple(series.get(m, default) for m in month_keys)
+
+def build_snapshot(staffing_data, month_keys, generation=0, vector=None):
+    if vector is None:
+        vector = lambda kind, key: month_vector(staffing_data, kind, key, month_keys)
+    data = staffing_data.data
+    return PlanSnapshot(
+        generation,
+        list(month_keys),
+        [(e["id"], e["name"]) for e in data["employees"]],
+        [e.get("domain", "") for e in data["employees"]],
+        {p["id"]: p["name"] for p in data["projects"]},
+        dict(data["thresholds"]),
+        [(d["project_id"], d["domain"], d.get("scaling_factor", 1.0), vector("demand", d["id"]))
+         for d in data["demand"]],
+        [(a["employee_id"], a["project_id"], a.get("domain", DOMAINS[0]), vector("allocation", a["id"]))
+         for a in data["allocation"]],
+        {e["id"]: vector("availability", e["id"]) for e in data["employees"]},
+        plan_metrics(data),
+        [e.get("manager", "") for e in data["employees"]],
+        plan_rates(data),
+    )
+
+def group_sums(groups, values, n_groups):
+    # Row sums per group in one bincount, much faster than np.add.at on wide rows
+    n_months = values.shape[1]
+    flat = (groups[:, None] * n_months + np.arange(n_months)).ravel()
+    return np.bincount(flat, weights=values.ravel(), minlength=n_groups * n_months).reshape(n_groups, n_months)
+
+def plan_rates(data):
+    # Costs are only computed once someone has entered a rate
+    employee_rates = [e.get("rates") for e in data["employees"]]
+    domain_rates = data.get("domain_rates", {})
+    return (employee_rates, domain_rates) if domain_rates or any(employee_rates) else None
+
+def parse_rates(text):
+    rates = {}
+    for part in re.split(r"[,;]", text):
+        if not part.strip():
+            continue
+        month, sep, value = part.partition("=")
+        key = parse_month_key(month) if sep else None
+        if key is None:
+            raise ValueError(f"expected YYYY-MM=rate, not {part.strip()!r}")
+        try:
+            rates[key] = float(value)
+        except ValueError:
+            raise ValueError(f"{value.strip()!r} is not a rate") from None
+        if rates[key] < 0 or not math.isfinite(rates[key]):
+            raise ValueError(f"{value.strip()!r} is not a rate")
+    return dict(sorted(rates.items()))
+
+def format_rates(rates):
+    return ", ".join(f"{month}={rate:g}" for month, rate in sorted((rates or {}).items()))
+
+def rate_matrix(histories, months):
+    # The rate in force each month is the latest one effective at or before
+    # it; months before a row's first effective date stay NaN.
+    n_months = len(months)
+    column = {m: c for c, m in enumerate(months)}
+    rows, cols, values = [], [], []
+    for i, history in enumerate(histories):
+        if not history:
+            continue
+        opening = None
+        for month, rate in sorted(history.items()):
+            if month <= months[0]:
+                opening = rate
+            elif month in column:
+                rows.append(i)
+                cols.append(column[month])
+                values.append(rate)
+        if opening is not None:
+            rows.append(i)
+            cols.append(0)
+            values.append(opening)
+    changes = np.full((len(histories), n_months), np.nan)
+    changes[rows, cols] = values
+    # Carry each rate forward to the next change
+    index = np.where(np.isnan(changes), 0, np.arange(n_months))
+    np.maximum.accumulate(index, axis=1, out=index)
+    return changes[np.arange(len(histories))[:, None], index]
+
+def safe_ratio(a, b):
+    return np.divide(a, b, out=np.where(a > 0, np.inf, 0.0), where=b > 0)
+
+# Metrics are derived from the totals compute_outputs has already gathered, so
+# adding one here costs array arithmetic rather than another pass over the plan.
+def metric_utilization(totals):
+    return totals["employees"], safe_ratio(totals["allocated"], totals["availability"]) * 100
+
+def metric_bench(totals):
+    domains = sorted(set(totals["employee_domains"]))
+    position = {d: i for i, d in enumerate(domains)}
+    bench = np.zeros((len(domains), totals["availability"].shape[1]))
+    rows = np.fromiter((position[d] for d in totals["employee_domains"]), dtype=np.intp,
+                       count=len(totals["employee_domains"]))
+    np.add.at(bench, rows, np.maximum(totals["availability"] - totals["allocated"], 0))
+    return [d or "(none)" for d in domains], bench
+
+def metric_coverage(totals):
+    # Pairs are laid out project by project over the same domains
+    n_projects, n_months = len(totals["projects"]), totals["demand"].shape[1]
+    if not n_projects:
+        return [], np.zeros((0, n_months))
+    demand = totals["demand"].reshape(n_projects, -1, n_months).sum(axis=1)
+    covered = totals["covered"].reshape(n_projects, -1, n_months).sum(axis=1)
+    return totals["projects"], safe_ratio(covered, demand) * 100
+
+def metric_overallocated(totals):
+    over = totals["allocated"] > totals["availability"] + OVERALLOCATED_EPSILON
+    return ["Employees"], over.sum(axis=0, keepdims=True).astype(float)
+
+OUTPUT_METRICS = {
+    "utilization": ("Utilization % per Employee", metric_utilization),
+    "bench": ("Bench FTE per Domain", metric_bench),
+    "coverage": ("Demand Coverage % per Project", metric_coverage),
+    "overallocated": ("Over-allocated Headcount", metric_overallocated),
+}
+
+def plan_metrics(data):
+    return [name for name in data.get("output_metrics", OUTPUT_METRICS) if name in OUTPUT_METRICS]
+
+def compute_outputs(snapshot, cancelled=lambda: False):
+    n_months = len(snapshot.months)
+    project_name = lambda pid: snapshot.project_names.get(pid, "")
+
+    project_ids = sorted({d[0] for d in snapshot.demand}, key=project_name)
+    domains = sorted({d[1] for d in snapshot.demand})
+    pairs = [(p, d) for p in project_ids for d in domains]
+    pair_index = {pair: i for i, pair in enumerate(pairs)}
+    pair_scaling = np.ones(len(pairs))
+    seen = set()
+    for pid, domain, scaling, _ in snapshot.demand:
+        if (pid, domain) not in seen:
+            seen.add((pid, domain))
+            pair_scaling[pair_index[(pid, domain)]] = scaling
+
+    demand_alloc = np.zeros((len(pairs), n_months))
+    if snapshot.demand:
+        rows = np.fromiter((pair_index[(d[0], d[1])] for d in snapshot.demand), dtype=np.intp, count=len(snapshot.demand))
+        scaling = np.fromiter((d[2] for d in snapshot.demand), dtype=float, count=len(snapshot.demand))
+        values = np.array([d[3] for d in snapshot.demand], dtype=float).reshape(len(snapshot.demand), n_months)
+        np.add.at(demand_alloc, rows, values * scaling[:, None])
+    demand = demand_alloc.copy()
+    if cancelled():
+        raise ComputeCancelled()
+
+    # The allocation rows are read once and feed both outputs and every metric
+    allocs = snapshot.allocation
+    alloc_values = np.array([a[3] for a in allocs], dtype=float).reshape(len(allocs), n_months)
+    rows = np.fromiter((pair_index.get((a[1], a[2]), -1) for a in allocs), dtype=np.intp, count=len(allocs))
+    inside = rows >= 0
+    np.subtract.at(demand_alloc, rows[inside], alloc_values[inside])
+    if cancelled():
+        raise ComputeCancelled()
+
+    emp_index = {emp_id: i for i, (emp_id, _) in enumerate(snapshot.employees)}
+    avail_alloc = np.ones((len(snapshot.employees), n_months))
+    for emp_id, values in snapshot.availability.items():
+        if emp_id in emp_index:
+            avail_alloc[emp_index[emp_id]] = values
+    availability = avail_alloc.copy()
+    emp_rows = np.fromiter((emp_index.get(a[0], -1) for a in allocs), dtype=np.intp, count=len(allocs))
+    employed = emp_rows >= 0
+    np.subtract.at(avail_alloc, emp_rows[employed], alloc_values[employed])
+
+    totals = {
+        "employees": [name for (_, name) in snapshot.employees],
+        "employee_domains": snapshot.employee_domains,
+        "availability": availability,
+        "allocated": availability - avail_alloc,
+        "projects": [project_name(p) for p in project_ids],
+        "demand": demand,
+        "covered": demand - demand_alloc,
+    }
+    metrics = {name: OUTPUT_METRICS[name][1](totals) for name in snapshot.metrics}
 
-class DragFillTableWidget(QTableWidget):
+    costs = {}
+    if snapshot.rates is not None:
+        # Employee rates, falling back to their domain's default, times the allocation rows
+        employee_rates, domain_rates = snapshot.rates
+        domains = sorted(domain_rates)
+        domain_row = {d: i for i, d in enumerate(domains)}
+        defaults = np.vstack([rate_matrix([domain_rates[d] for d in domains], snapshot.months),
+                              np.full((1, n_months), np.nan)])
+        fallback = np.fromiter((domain_row.get(d, len(domains)) for d in snapshot.employee_domains),
+                               dtype=np.intp, count=len(snapshot.employee_domains))
+        rates = rate_matrix(employee_rates, snapshot.months)
+        rates = np.nan_to_num(np.where(np.isnan(rates), defaults[fallback], rates))
+        cost = alloc_values[employed] * rates[emp_rows[employed]]
+        charged = [a for a, known in zip(allocs, employed) if known]
+        keys = {
+            "project": [project_name(a[1]) for a in charged],
+            "domain": [a[2] for a in charged],
+            "manager": [snapshot.employee_managers[emp_index[a[0]]] for a in charged],
+        }
+        for group, labels in keys.items():
+            labels, groups = np.unique(np.array(labels, dtype=str), return_inverse=True)
+            matrix = group_sums(groups.reshape(-1), cost, len(labels))
+            costs[group] = ([label or "(none)" for label in labels.tolist()], matrix)
+
+    return OutputResult(
+        snapshot.generation, snapshot.months, pairs,
+        [project_name(p) for (p, _) in pairs], pair_scaling, demand_alloc,
+        snapshot.employees, avail_alloc, demand, availability, snapshot.employee_domains, metrics, costs
+    )
+
+class OutputJob(QRunnable):
+    def __init__(self, snapshot, signals):
+        super().__init__()
+        self.snapshot = snapshot
+        self.signals = signals
+        self.cancel_event = threading.Event()
+        self.done = False
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            result = compute_outputs(self.snapshot, self.cancel_event.is_set)
+            if not self.cancel_event.is_set():
+                self.signals.finished.emit(result)
+        except ComputeCancelled:
+            pass
+        finally:
+            self.done = True
+
+class OutputSignals(QObject):
+    finished = pyqtSignal(object)
+
+class OutputScheduler(QObject):
+    results_ready = pyqtSignal(object)
+
+    def __init__(self, staffing_data, months, parent=None):
+        super().__init__(parent)
+        self.staffing_data = staffing_data
+        self.month_keys = [json_month(m) for m in months]
+        self.generation = 0
+        self.job = None
+        self.jobs = []
+        self.result = None
+        # Per-record month vectors for the visible window, dropped when an edit touches them
+        self.vectors = {}
+        self.pool = QThreadPool.globalInstance()
+        self.signals = OutputSignals()
+        self.signals.finished.connect(self.on_finished)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.start_job)
+        self.staffing_data.subscribe(self.on_events)
+
+    def on_events(self, events):
+        for event in events:
+            if event.kind in MONTHLY_FIELDS and not isinstance(event, RecordUpdated):
+                self.vectors.pop((event.kind, event.key), None)
+        self.schedule()
+
+    def set_months(self, months):
+        self.month_keys = [json_month(m) for m in months]
+        self.vectors.clear()
+        self.schedule(0)
+
+    def schedule(self, delay=OUTPUT_IDLE_MS):
+        self.timer.start(delay)
+
+    def vector(self, kind, key):
+        vec = self.vectors.get((kind, key))
+        if vec is None:
+            vec = self.staffing_data.mapped_vector(kind, key, self.month_keys)
+            if vec is None:
+                vec = month_vector(self.staffing_data, kind, key, self.month_keys)
+            self.vectors[(kind, key)] = vec
+        return vec
+
+    def snapshot(self):
+        self.generation += 1
+        return build_snapshot(self.staffing_data, self.month_keys, self.generation, self.vector)
+
+    def start_job(self):
+        if self.staffing_data.loading:
+            return
+        if self.job is not None:
+            self.job.cancel()
+            if self.pool.tryTake(self.job):
+                self.job.done = True
+        # Superseded jobs stay referenced until their thread lets go of them
+        self.jobs = [job for job in self.jobs if not job.done]
+        self.job = OutputJob(self.snapshot(), self.signals)
+        self.jobs.append(self.job)
+        self.pool.start(self.job)
+
+    def compute_now(self):
+        self.timer.stop()
+        if self.job is not None:
+            self.job.cancel()
+        self.job = None
+        self.on_finished(compute_outputs(self.snapshot()))
+        return self.result
+
+    def on_finished(self, result):
+        # Results from superseded snapshots are dropped
+        if result.generation != self.generation:
+            return
+        self.job = None
+        self.result = result
+        self.results_ready.emit(result)
+
+FORMAT_OUTPUTS = {"output1": "Demand - Allocation", "output2": "Availability - Allocation"}
+FORMAT_COLOURS = {
+    "red": 0xFFFF0000, "blue": 0xFF0000FF, "orange": 0xFFFFA500, "yellow": 0xFFFFFF00,
+    "green": 0xFF00A000, "purple": 0xFF800080, "grey": 0xFF808080
+}
+FORMAT_OPS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+FORMAT_UNITS = {"fte": "FTE", "percent": "% of base"}
+
+def default_format_rules(thresholds, output):
+    return [
+        {"scope": "all", "target": "", "op": ">", "value": thresholds[f"{output}_red"], "unit": "fte", "colour": "red"},
+        {"scope": "all", "target": "", "op": "<", "value": thresholds[f"{output}_blue"], "unit": "fte", "colour": "blue"}
+    ]
+
+def format_rules(data, output):
+    return data.get("format_rules", {}).get(output) or default_format_rules(data["thresholds"], output)
+
+class CompiledRules:
+    # Ordered bands (first match wins) turned into numpy comparisons over whole
+    # matrices. Domain and project bands replace the "all" bands for their rows;
+    # percent bands compare 100 * value / base (availability or demand).
+    def __init__(self, rules):
+        names = list(dict.fromkeys(r["colour"] for r in rules))
+        self.palette = np.array([0] + [FORMAT_COLOURS[n] for n in names], dtype=np.uint32)
+        self.bands = {}
+        for r in rules:
+            band = (FORMAT_OPS[r["op"]], float(r["value"]), r.get("unit") == "percent", names.index(r["colour"]) + 1)
+            self.bands.setdefault((r["scope"], r.get("target", "")), []).append(band)
+
+    def classify(self, values, base, domains=None, projects=None):
+        codes = self.apply_bands(self.bands.get(("all", ""), []), values, base)
+        for scope, keys in [("domain", domains), ("project", projects)]:
+            if keys is None:
+                continue
+            keys = np.asarray(keys)
+            for (s, target), bands in self.bands.items():
+                if s != scope:
+                    continue
+                rows = np.flatnonzero(keys == target)
+                if len(rows):
+                    codes[rows] = self.apply_bands(bands, values[rows], base[rows])
+        return codes
+
+    def apply_bands(self, bands, values, base):
+        codes = np.zeros(values.shape, dtype=np.uint8)
+        unmatched = np.ones(values.shape, dtype=bool)
+        percent = None
+        for op, value, use_percent, index in bands:
+            if use_percent and percent is None:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    percent = 100.0 * values / base
+            mask = op(percent if use_percent else values, value) & unmatched
+            codes[mask] = index
+            unmatched &= ~mask
+        return codes
+
+    def colour(self, index):
+        return QColor.fromRgba(int(self.palette[index])) if index else None
+
+def result_covers(result, periods):
+    # Results computed for a previous horizon are skipped until the new one lands
+    return result is not None and result.months == [m for p in periods for m in p.months]
+
+FREE_EPSILON = 1e-9
+
+class FreeCapacityIndex:
+    # Range-minimum sparse tables over each domain's free capacity (availability
+    # minus allocation, straight from the output result). Level k holds every
+    # employee's minimum over the 2**k months starting at each month, and each
+    # of those columns is kept sorted, so "free >= X from a to b" is two binary
+    # searches plus a check of the shorter candidate list rather than a scan.
+    # Tables are built on first query and only for domains whose rows changed.
+    def __init__(self):
+        self.result = None
+        self.months = []
+        self.rows = {}
+        self.tables = {}
+
+    def update(self, result):
+        if result.months != self.months:
+            self.tables.clear()
+        self.result = result
+        self.months = result.months
+        self.rows = {}
+        for i, domain in enumerate(result.employee_domains):
+            self.rows.setdefault(domain, []).append(i)
+
+    def domains(self):
+        return sorted(self.rows)
+
+    def table(self, domain):
+        cached = self.tables.get(domain)
+        if cached is not None and cached["generation"] == self.result.generation:
+            return cached
+        rows = self.rows.get(domain, [])
+        free = self.result.avail_alloc[rows]
+        ids = [self.result.employees[r][0] for r in rows]
+        if cached is not None and cached["ids"] == ids and np.array_equal(cached["free"], free):
+            cached["generation"] = self.result.generation
+            return cached
+        orders, ranked = [], []
+        level, width = free, 1
+        while True:
+            order = np.argsort(-level, axis=0, kind="stable")
+            # Stored column-major, negated so each column ascends for searchsorted
+            orders.append(np.ascontiguousarray(order.T, dtype=np.int32))
+            ranked.append(np.ascontiguousarray(-np.take_along_axis(level, order, axis=0).T))
+            if 2 * width > free.shape[1]:
+                break
+            level = np.minimum(level[:, :-width], level[:, width:])
+            width *= 2
+        table = {"generation": self.result.generation, "ids": ids, "names": [self.result.employees[r][1] for r in rows], "free": free,
+                 "orders": orders, "ranked": ranked}
+        self.tables[domain] = table
+        return table
+
+    def query(self, domain, minimum, first, last):
+        # (employee id, name, domain, lowest free, mean free) for everyone in
+        # the domain (None: all of them) with at least minimum free in every
+        # month first..last of the window, most free first
+        if self.result is None:
+            return []
+        a, b = self.months.index(first), self.months.index(last)
+        if a > b:
+            raise ValueError(f"{first} is after {last}")
+        k = (b - a + 1).bit_length() - 1
+        found = []
+        for name in self.domains() if domain is None else [domain]:
+            table = self.table(name)
+            if not table["ids"]:
+                continue
+            bound = -(minimum - FREE_EPSILON)
+            # The range minimum is the smaller of two overlapping 2**k blocks
+            prefixes = []
+            for start in (a, b - (1 << k) + 1):
+                count = np.searchsorted(table["ranked"][k][start], bound, side="right")
+                prefixes.append(table["orders"][k][start][:count])
+            candidates = min(prefixes, key=len)
+            window = table["free"][candidates, a:b + 1]
+            lowest = window.min(axis=1)
+            keep = lowest >= minimum - FREE_EPSILON
+            means = window[keep].mean(axis=1)
+            for row, low, mean in zip(candidates[keep].tolist(), lowest[keep].tolist(), means.tolist()):
+                found.append((table["ids"][row], table["names"][row], name, low, mean))
+        found.sort(key=lambda f: (-f[3], -f[4], f[1]))
+        return found
+
+FILTER_TOKEN = re.compile(r'\s*(?:(>=|<=|!=|=|<|>|~|\(|\))|"([^"]*)"|([^\s()=!<>~"]+))')
+FILTER_RANGE = re.compile(r"(\d{4}-(?:0[1-9]|1[0-2]))(?:\.\.(\d{4}-(?:0[1-9]|1[0-2])))?$")
+FILTER_FIELDS = ["project", "domain", "employee", "manager"]
+FILTER_CHUNK_ROWS = 1000
+FILTER_METRICS = {
+    "allocation": ["alloc", "avail", "util", "free"],
+    "pair": ["demand", "alloc", "gap", "util"],
+    "employee": ["avail", "alloc", "util", "free"],
+}
+# Fields answered from the plan's indexes rather than a scan of the rows
+FILTER_INDEXED = {
+    "allocation": {"project", "employee", "manager"},
+    "pair": {"project", "employee", "manager"},
+    "employee": {"project"},
+}
+FILTER_COMPARE = dict(FORMAT_OPS, **{"=": np.isclose, "!=": lambda a, b: ~np.isclose(a, b)})
+FILTER_HELP = ("Fields: project, domain, employee, manager with = != or ~ (contains).\n"
+               "Monthly means: alloc, avail, util, free (employees and allocations) or demand, alloc, gap, util\n"
+               "(project/domain rows), over a range such as util(2026-01..2026-06) or the shown months, compared\n"
+               "with < <= > >= = != to a number. Combine with and, or, not and parentheses; quote values with spaces.")
+
+def parse_month_range(text):
+    match = FILTER_RANGE.match(text)
+    if match is None:
+        raise ValueError(f"expected YYYY-MM or YYYY-MM..YYYY-MM, not {text!r}")
+    first, last = match.group(1), match.group(2) or match.group(1)
+    if first > last:
+        raise ValueError(f"range {text!r} ends before it starts")
+    return month_range(first, month_span(first, last))
+
+def filter_tokens(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = FILTER_TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError(f"unexpected {text[pos:].strip()[:12]!r}")
+        symbol, quoted, word = match.groups()
+        if symbol:
+            tokens.append(("symbol", symbol))
+        elif quoted is not None:
+            tokens.append(("text", quoted))
+        else:
+            tokens.append(("word", word))
+        pos = match.end()
+    return tokens
+
+def series_matrix(staffing_data, kind, keys, months):
+    default = MONTH_DEFAULTS[kind]
+    if kind == "availability":
+        series = [staffing_data.data["availability"].get(key, {}) for key in keys]
+    else:
+        records, field = staffing_data.records[kind], MONTHLY_FIELDS[kind]
+        series = [records[key].get(field, {}) if key in records else {} for key in keys]
+    matrix = np.empty((len(keys), len(months)))
+    for start in range(0, len(series), FILTER_CHUNK_ROWS):
+        rows = [[s.get(m, default) for m in months] for s in series[start:start + FILTER_CHUNK_ROWS]]
+        try:
+            matrix[start:start + len(rows)] = rows
+        except (TypeError, ValueError):
+            # Text values count as 0 here; the Issues tab reports them
+            matrix[start:start + len(rows)] = [[v if type(v) in (int, float) else 0.0 for v in row] for row in rows]
+    return matrix
+
+def grouped_means(staffing_data, kind, groups, months, weights=None):
+    # Monthly sums of each group of records, averaged over the months
+    keys = [key for group in groups for key in group]
+    totals = np.zeros((len(groups), len(months)))
+    if keys:
+        values = series_matrix(staffing_data, kind, keys, months)
+        if weights is not None:
+            values *= np.array([w for group in weights for w in group], dtype=float)[:, None]
+        np.add.at(totals, np.repeat(np.arange(len(groups)), [len(g) for g in groups]), values)
+    return totals.mean(axis=1)
+
+def filter_edit(callback):
+    edit = QLineEdit()
+    edit.setPlaceholderText("Filter, e.g. domain=HW and manager=Bob and util(2026-01..2026-06) > 1.1")
+    edit.setToolTip(FILTER_HELP)
+    edit.setClearButtonEnabled(True)
+    edit.returnPressed.connect(callback)
+    return edit
+
+def read_filter(parent, edit, subject):
+    # The compiled filter, None when the bar is empty, or False after a warning
+    text = edit.text().strip()
+    if not text:
+        return None
+    try:
+        return PlanFilter(text, subject)
+    except ValueError as e:
+        QMessageBox.warning(parent, "Filter", f"Invalid filter: {e}")
+        return False
+
+class PlanFilter:
+    # An expression such as "domain=HW and util(2026-01..2026-06) > 1.1",
+    # parsed once into a tree of tuples and run against a FilterContext.
+    def __init__(self, text, subject):
+        self.text = text
+        self.subject = subject
+        self.tokens = filter_tokens(text)
+        self.pos = 0
+        if not self.tokens:
+            raise ValueError("empty filter")
+        self.tree = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"unexpected {self.tokens[self.pos][1]!r}")
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, expected=None):
+        kind, value = self.peek()
+        if kind is None:
+            raise ValueError(f"expected {expected} at the end" if expected else "unexpected end")
+        if expected is not None and value != expected:
+            raise ValueError(f"expected {expected!r} before {value!r}")
+        self.pos += 1
+        return kind, value
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == "word" and value.lower() == word:
+            self.pos += 1
+            return True
+        return False
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.keyword("or"):
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.keyword("and"):
+            nodes.append(self.parse_not())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def parse_not(self):
+        if self.keyword("not"):
+            return ("not", self.parse_not())
+        if self.peek() == ("symbol", "("):
+            self.take()
+            node = self.parse_or()
+            self.take(")")
+            return node
+        return self.parse_term()
+
+    def parse_term(self):
+        kind, name = self.take()
+        name = name.lower()
+        if kind != "word":
+            raise ValueError(f"expected a field before {name!r}")
+        if name in FILTER_FIELDS:
+            kind, op = self.take()
+            if op not in ("=", "!=", "~"):
+                raise ValueError(f"{name} takes =, != or ~, not {op!r}")
+            kind, value = self.take()
+            if kind == "symbol":
+                raise ValueError(f"expected a value after {name}{op}")
+            return ("field", name, op, value.lower())
+        if name not in FILTER_METRICS[self.subject]:
+            known = ", ".join(FILTER_FIELDS + FILTER_METRICS[self.subject])
+            raise ValueError(f"unknown field {name!r}; use one of {known}")
+        months = None
+        if self.peek() == ("symbol", "("):
+            self.take()
+            if self.peek() != ("symbol", ")"):
+                months = parse_month_range(self.take()[1])
+            self.take(")")
+        kind, op = self.take()
+        if op not in FILTER_COMPARE:
+            raise ValueError(f"{name} takes < <= > >= = or !=, not {op!r}")
+        kind, value = self.take()
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"{name}{op} needs a number, not {value!r}") from None
+        return ("metric", name, months, op, number)
+
+    def cost(self, node, context):
+        # Index lookups run first so later terms only see their hits
+        if node[0] == "field":
+            return 0 if node[2] != "~" and node[1] in FILTER_INDEXED[context.subject] else 1
+        return 2 if node[0] == "metric" else 3
+
+    def select(self, context):
+        return self.evaluate(self.tree, context, context.all)
+
+    def matches(self, context):
+        return len(self.select(context)) > 0
+
+    def evaluate(self, node, context, rows):
+        op = node[0]
+        if op == "and":
+            for child in sorted(node[1], key=lambda n: self.cost(n, context)):
+                rows = self.evaluate(child, context, rows)
+                if not len(rows):
+                    break
+            return rows
+        if op == "or":
+            hits = []
+            rest = rows
+            for child in sorted(node[1], key=lambda n: self.cost(n, context)):
+                hit = self.evaluate(child, context, rest)
+                hits.append(hit)
+                rest = np.setdiff1d(rest, hit, assume_unique=True)
+            return np.sort(np.concatenate(hits))
+        if op == "not":
+            return np.setdiff1d(rows, self.evaluate(node[1], context, rows), assume_unique=True)
+        if op == "field":
+            _, field, cmp, value = node
+            if cmp != "~" and field in FILTER_INDEXED[context.subject]:
+                hits = context.lookup(field, value)
+                if rows is not context.all:
+                    hits = np.intersect1d(rows, hits, assume_unique=True)
+                return hits if cmp == "=" else np.setdiff1d(rows, hits, assume_unique=True)
+            texts = context.values(field, rows)
+            if cmp == "~":
+                return rows[np.char.find(texts, value) >= 0]
+            return rows[(texts == value) if cmp == "=" else (texts != value)]
+        _, name, months, cmp, number = node
+        return rows[FILTER_COMPARE[cmp](context.metric(name, months, rows), number)]
+
+class FilterContext:
+    # The rows a filter runs over: allocation ids, (project id, domain) pairs
+    # or employee ids. Output tabs pass their result, whose rows line up with
+    # the keys, so metrics over the shown months are slices of its arrays.
+    def __init__(self, staffing_data, subject, keys, months, result=None):
+        self.staffing_data = staffing_data
+        self.subject = subject
+        self.keys = list(keys)
+        self.months = list(months)
+        self.result = result
+        self.positions = {key: i for i, key in enumerate(self.keys)}
+        self.all = np.arange(len(self.keys))
+
+    def positions_of(self, keys):
+        return np.array(sorted({self.positions[k] for k in keys if k in self.positions}), dtype=np.intp)
+
+    def lookup(self, field, value):
+        sd = self.staffing_data
+        if field == "project":
+            pids = {pid for pid, p in sd.records["project"].items() if p["name"].lower() == value}
+            if self.subject == "pair":
+                return self.positions_of(pair for pair in self.keys if pair[0] in pids)
+            allocs = [a for pid in pids for a in sd.allocation_by_project.get(pid, {}).values()]
+            if self.subject == "employee":
+                return self.positions_of(a["employee_id"] for a in allocs)
+            return self.positions_of(a["id"] for a in allocs)
+        attr = "name" if field == "employee" else "manager"
+        allocs = [a for eid, e in sd.records["employee"].items() if e.get(attr, "").lower() == value
+                  for a in sd.allocation_by_employee.get(eid, {}).values()]
+        if self.subject == "pair":
+            return self.positions_of((a["project_id"], a.get("domain", DOMAINS[0])) for a in allocs)
+        return self.positions_of(a["id"] for a in allocs)
+
+    def values(self, field, rows):
+        sd = self.staffing_data
+        keys = [self.keys[i] for i in rows]
+        employee = lambda eid: sd.records["employee"].get(eid, {})
+        if self.subject == "allocation":
+            records = [sd.records["allocation"][k] for k in keys]
+            if field == "project":
+                texts = [sd.project_name(a["project_id"]) for a in records]
+            elif field == "domain":
+                texts = [a.get("domain", DOMAINS[0]) for a in records]
+            else:
+                attr = "name" if field == "employee" else "manager"
+                texts = [employee(a["employee_id"]).get(attr, "") for a in records]
+        elif self.subject == "pair":
+            if field == "project":
+                texts = [sd.project_name(pid) for pid, _ in keys]
+            elif field == "domain":
+                texts = [domain for _, domain in keys]
+            else:
+                # Every employee allocated to the pair, one per line
+                attr = "name" if field == "employee" else "manager"
+                texts = ["\n".join(employee(a["employee_id"]).get(attr, "")
+                                   for a in sd.allocation_by_project.get(pid, {}).values()
+                                   if a.get("domain", DOMAINS[0]) == domain)
+                         for pid, domain in keys]
+        elif field == "project":
+            texts = ["\n".join(sd.project_name(a["project_id"]) for a in sd.allocation_by_employee.get(eid, {}).values())
+                     for eid in keys]
+        elif self.result is not None and field in ("employee", "domain"):
+            texts = [self.result.employees[i][1] if field == "employee" else self.result.employee_domains[i] for i in rows]
+        else:
+            attr = "name" if field == "employee" else field
+            texts = [employee(eid).get(attr, "") for eid in keys]
+        return np.array([t.lower() for t in texts], dtype=str)
+
+    def metric(self, name, months, rows):
+        months = months or self.months
+        result = self.result
+        if result is not None and self.subject != "allocation" and set(months) <= set(result.months):
+            cols = [result.months.index(m) for m in months]
+            if self.subject == "pair":
+                demand = result.demand[rows][:, cols].mean(axis=1)
+                alloc = demand - result.demand_alloc[rows][:, cols].mean(axis=1)
+            else:
+                avail = result.availability[rows][:, cols].mean(axis=1)
+                alloc = avail - result.avail_alloc[rows][:, cols].mean(axis=1)
+        else:
+            sd = self.staffing_data
+            keys = [self.keys[i] for i in rows]
+            if self.subject == "pair":
+                demand_groups = [[d for d in sd.demand_by_project.get(pid, {}).values() if d["domain"] == domain]
+                                 for pid, domain in keys]
+                demand = grouped_means(sd, "demand", [[d["id"] for d in g] for g in demand_groups], months,
+                                       [[d.get("scaling_factor", 1.0) for d in g] for g in demand_groups])
+                alloc = grouped_means(sd, "allocation",
+                                      [[k for k, a in sd.allocation_by_project.get(pid, {}).items()
+                                        if a.get("domain", DOMAINS[0]) == domain] for pid, domain in keys], months)
+            else:
+                if self.subject == "allocation":
+                    if name == "alloc":
+                        return series_matrix(sd, "allocation", keys, months).mean(axis=1)
+                    owners = [sd.records["allocation"][k]["employee_id"] for k in keys]
+                else:
+                    owners = keys
+                employees = list(dict.fromkeys(owners))
+                position = {e: i for i, e in enumerate(employees)}
+                index = np.fromiter((position[e] for e in owners), dtype=np.intp, count=len(owners))
+                avail = series_matrix(sd, "availability", employees, months).mean(axis=1)[index]
+                alloc = grouped_means(sd, "allocation", [list(sd.allocation_by_employee.get(e, {})) for e in employees],
+                                      months)[index]
+        if name == "demand":
+            return demand
+        if name == "gap":
+            return demand - alloc
+        if name == "alloc":
+            return alloc
+        if name == "avail":
+            return avail
+        if name == "free":
+            return avail - alloc
+        return safe_ratio(alloc, demand if self.subject == "pair" else avail)
+
+MINIMAP_WIDTH = 96
+MINIMAP_BACKGROUND = 0xFFD8D8D8
+
+class MinimapView(QWidget):
+    # Whole output matrix drawn as one image from palette indices, one pixel row
+    # per bin of table rows; a bin shows the colour of its earliest-listed band.
+    clicked = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFixedWidth(MINIMAP_WIDTH)
+        self.setToolTip("Overview of all rows; click to jump there")
+        self.codes = np.zeros((0, 0), dtype=np.uint8)
+        self.pixels = np.zeros((0, 0), dtype=np.uint32)
+        self.palette = np.array([MINIMAP_BACKGROUND], dtype=np.uint32)
+        self.image = None
+
+    def set_codes(self, codes, palette):
+        # Uncoloured cells (index 0) rank last when a bin is reduced to one pixel
+        codes = np.where(codes == 0, 255, codes).astype(np.uint8)
+        if codes.shape != self.codes.shape or self.image is None or not np.array_equal(palette, self.palette):
+            self.codes = codes
+            self.palette = palette
+            self.colours = np.full(256, MINIMAP_BACKGROUND, dtype=np.uint32)
+            self.colours[1:len(palette)] = palette[1:]
+            self.rebuild()
+            return
+        rows = np.flatnonzero((codes != self.codes).any(axis=1))
+        self.codes = codes
+        if len(rows) == 0:
+            return
+        bins = np.unique(self.bin_of[rows])
+        for b in bins:
+            self.pixels[b] = self.colours[self.codes[self.bin_start[b]:self.bin_start[b + 1]].min(axis=0)]
+        scale = self.height() / len(self.pixels)
+        for b in bins:
+            self.update(0, int(b * scale), self.width(), int(scale) + 2)
+
+    def rebuild(self):
+        rows, cols = self.codes.shape
+        if rows == 0 or cols == 0:
+            self.image = None
+            self.update()
+            return
+        height = max(1, min(rows, self.height()))
+        self.bin_of = np.arange(rows) * height // rows
+        self.bin_start = np.searchsorted(self.bin_of, np.arange(height + 1))
+        self.pixels = np.ascontiguousarray(self.colours[np.minimum.reduceat(self.codes, self.bin_start[:-1], axis=0)])
+        self.image = QImage(self.pixels.data, cols, height, cols * 4, QImage.Format.Format_RGB32)
+        self.update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if len(self.codes):
+            self.rebuild()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.image is not None:
+            painter.drawImage(self.rect(), self.image)
+        painter.end()
+
+    def mousePressEvent(self, event):
+        rows, cols = self.codes.shape
+        if self.image is None:
+            return
+        pos = event.position()
+        b = min(len(self.pixels) - 1, max(0, int(pos.y() * len(self.pixels) / self.height())))
+        col = min(cols - 1, max(0, int(pos.x() * cols / self.width())))
+        self.clicked.emit(int(self.bin_start[b]), col)
+
+PASTE_ERROR_LIMIT = 10
+
+def parse_tsv(text):
+    # Spreadsheets put a line break after the last row and quote cells that contain tabs
+    return list(csv.reader(io.StringIO(text.rstrip("\r\n")), delimiter="\t"))
+
+class CopyTableWidget(QTableWidget):
+    # Ctrl+C puts the selected rows and columns on the clipboard as TSV; a
+    # full selection also takes the headers so a matrix pastes with its labels.
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Copy):
+            self.copy_block()
+            return
+        super().keyPressEvent(event)
+
+    def cell_text(self, row, col):
+        widget = self.cellWidget(row, col)
+        if isinstance(widget, QComboBox):
+            return widget.currentText()
+        item = self.item(row, col)
+        return item.text() if item else ""
+
+    def selected_rows(self):
+        return sorted({r for rng in self.selectedRanges() for r in range(rng.topRow(), rng.bottomRow() + 1)})
+
+    def copy_block(self):
+        ranges = self.selectedRanges()
+        if not ranges:
+            return
+        rows = self.selected_rows()
+        left = min(rng.leftColumn() for rng in ranges)
+        right = max(rng.rightColumn() for rng in ranges)
+        cols = range(left, right + 1)
+        lines = []
+        everything = len(rows) == self.rowCount() and len(cols) == self.columnCount()
+        labels = everything and self.verticalHeaderItem(0) is not None
+        if everything:
+            header = [self.horizontalHeaderItem(c).text() if self.horizontalHeaderItem(c) else "" for c in cols]
+            lines.append("\t".join([""] * labels + header))
+        for r in rows:
+            cells = [self.cell_text(r, c) for c in cols]
+            if labels:
+                cells.insert(0, self.verticalHeaderItem(r).text())
+            lines.append("\t".join(cells))
+        QApplication.clipboard().setText("\n".join(lines) + "\n")
+
+class DragFillTableWidget(CopyTableWidget):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._drag_start_cell = None
         self._drag_value = None
         self._drag_orientation = None
+        self.edit_batch = nullcontext
+        # Tabs apply pasted blocks straight to the plan as [(row, col, value)]
+        self.paste_cells = None
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.StandardKey.Paste):
+            self.paste_block(QApplication.clipboard().text())
+            return
+        super().keyPressEvent(event)
+
+    def paste_block(self, text):
+        # The block lands with its top-left cell on the current cell; name
+        # columns and cells past the table edge are skipped, blanks left alone.
+        r0, c0 = self.currentRow(), self.currentColumn()
+        if r0 < 0 or c0 < 0 or not text:
+            return
+        # Columns are uniform, so the anchor row decides which ones take values
+        editable = set()
+        for col in range(c0, self.columnCount()):
+            item = self.item(r0, col)
+            if item is not None and self.cellWidget(r0, col) is None and item.flags() & Qt.ItemFlag.ItemIsEditable:
+                editable.add(col)
+        cells = []
+        errors = []
+        for i, line in enumerate(parse_tsv(text)[:self.rowCount() - r0]):
+            row = r0 + i
+            for j, cell in enumerate(line[:self.columnCount() - c0]):
+                col = c0 + j
+                if col not in editable or not cell.strip():
+                    continue
+                try:
+                    value = float(cell)
+                except ValueError:
+                    value = None
+                if value is None or bad_month_value(value):
+                    errors.append(f"row {row + 1}, {self.horizontalHeaderItem(col).text()}: {cell!r}")
+                else:
+                    cells.append((row, col, value))
+        if errors:
+            more = f"\n... and {len(errors) - PASTE_ERROR_LIMIT} more" if len(errors) > PASTE_ERROR_LIMIT else ""
+            QMessageBox.warning(self, "Paste", "Nothing was pasted; these cells are not valid values:\n"
+                                + "\n".join(errors[:PASTE_ERROR_LIMIT]) + more)
+            return
+        if self.paste_cells is not None:
+            self.paste_cells(cells)
+            return
+        with self.edit_batch():
+            for row, col, value in cells:
+                self.item(row, col).setText(str(value))
 
     def mousePressEvent(self, event):
         super().mousePressEvent(event)
@@ -127,42 +1872,57 @@ class DragFillTableWidget(QTableWidget):
             idx = self.indexAt(event.pos())
             if idx.isValid():
                 r1, c1 = idx.row(), idx.column()
-                if self._drag_orientation == "horizontal":
-                    row = r0
-                    cmin, cmax = sorted([c0, c1])
-                    for col in range(cmin, cmax + 1):
-                        item = self.item(row, col)
-                        if item and (item.flags() & Qt.ItemFlag.ItemIsEditable):
-                            item.setText(self._drag_value)
-                else:
-                    col = c0
-                    rmin, rmax = sorted([r0, r1])
-                    for row in range(rmin, rmax + 1):
-                        item = self.item(row, col)
-                        if item and (item.flags() & Qt.ItemFlag.ItemIsEditable):
-                            item.setText(self._drag_value)
+                with self.edit_batch():
+                    if self._drag_orientation == "horizontal":
+                        row = r0
+                        cmin, cmax = sorted([c0, c1])
+                        for col in range(cmin, cmax + 1):
+                            item = self.item(row, col)
+                            if item and (item.flags() & Qt.ItemFlag.ItemIsEditable):
+                                item.setText(self._drag_value)
+                    else:
+                        col = c0
+                        rmin, rmax = sorted([r0, r1])
+                        for row in range(rmin, rmax + 1):
+                            item = self.item(row, col)
+                            if item and (item.flags() & Qt.ItemFlag.ItemIsEditable):
+                                item.setText(self._drag_value)
         self._drag_start_cell = None
         self._drag_value = None
         self._drag_orientation = None
 
 class ThresholdConfigDialog(QDialog):
-    def __init__(self, thresholds, parent=None):
+    def __init__(self, rules, projects, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Configure Thresholds")
-        self.thresholds = thresholds.copy()
+        self.resize(640, 360)
+        self.scopes = [("all", "", "All rows")]
+        self.scopes += [("domain", d, f"Domain: {d}") for d in DOMAINS]
+        self.scopes += [("project", pid, f"Project: {name}") for pid, name in sorted(projects.items(), key=lambda p: p[1])]
         layout = QVBoxLayout()
-        self.spins = {}
-        for key, val in thresholds.items():
-            row = QHBoxLayout()
-            label = QLabel(key)
-            spin = QDoubleSpinBox()
-            spin.setDecimals(2)
-            spin.setRange(-100, 100)
-            spin.setValue(val)
-            row.addWidget(label)
-            row.addWidget(spin)
-            layout.addLayout(row)
-            self.spins[key] = spin
+        layout.addWidget(QLabel(
+            "Bands are checked top to bottom and the first match colours the cell.\n"
+            "Domain and project bands replace the 'All rows' bands for those rows.\n"
+            "'% of base' compares against availability (employees) or demand (projects)."))
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["Applies to", "Test", "Value", "Unit", "Colour"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        layout.addWidget(self.table)
+        edit_btns = QHBoxLayout()
+        add_btn = QPushButton("Add Band")
+        remove_btn = QPushButton("Remove Band")
+        up_btn = QPushButton("Move Up")
+        down_btn = QPushButton("Move Down")
+        add_btn.clicked.connect(self.add_band)
+        remove_btn.clicked.connect(self.remove_band)
+        up_btn.clicked.connect(lambda: self.move_band(-1))
+        down_btn.clicked.connect(lambda: self.move_band(1))
+        edit_btns.addWidget(add_btn)
+        edit_btns.addWidget(remove_btn)
+        edit_btns.addWidget(up_btn)
+        edit_btns.addWidget(down_btn)
+        layout.addLayout(edit_btns)
         btns = QHBoxLayout()
         save_btn = QPushButton("Save")
         cancel_btn = QPushButton("Cancel")
@@ -172,26 +1932,118 @@ class ThresholdConfigDialog(QDialog):
         btns.addWidget(cancel_btn)
         layout.addLayout(btns)
         self.setLayout(layout)
+        self.fill(rules)
+
+    def fill(self, rules):
+        self.table.setRowCount(0)
+        for rule in rules:
+            self.insert_band(self.table.rowCount(), rule)
 
-    def get_thresholds(self):
-        return {k: self.spins[k].value() for k in self.spins}
+    def insert_band(self, row, rule):
+        self.table.insertRow(row)
+        scope = QComboBox()
+        for key, target, label in self.scopes:
+            scope.addItem(label, (key, target))
+        idx = scope.findData((rule["scope"], rule.get("target", "")))
+        scope.setCurrentIndex(max(idx, 0))
+        op = QComboBox()
+        op.addItems(list(FORMAT_OPS))
+        op.setCurrentText(rule["op"])
+        value = QDoubleSpinBox()
+        value.setDecimals(2)
+        value.setRange(-1000, 1000)
+        value.setValue(rule["value"])
+        unit = QComboBox()
+        for key, label in FORMAT_UNITS.items():
+            unit.addItem(label, key)
+        unit.setCurrentIndex(max(unit.findData(rule.get("unit", "fte")), 0))
+        colour = QComboBox()
+        colour.addItems(list(FORMAT_COLOURS))
+        colour.setCurrentText(rule["colour"])
+        for col, widget in enumerate([scope, op, value, unit, colour]):
+            self.table.setCellWidget(row, col, widget)
 
-class EmployeeTab(QWidget):
-    def __init__(self, staffing_data, parent=None):
+    def band(self, row):
+        scope, target = self.table.cellWidget(row, 0).currentData()
+        return {
+            "scope": scope,
+            "target": target,
+            "op": self.table.cellWidget(row, 1).currentText(),
+            "value": self.table.cellWidget(row, 2).value(),
+            "unit": self.table.cellWidget(row, 3).currentData(),
+            "colour": self.table.cellWidget(row, 4).currentText()
+        }
+
+    def add_band(self):
+        self.insert_band(self.table.rowCount(), {"scope": "all", "op": ">", "value": 1.0, "colour": "red"})
+
+    def remove_band(self):
+        row = self.table.currentRow()
+        if row >= 0:
+            self.table.removeRow(row)
+
+    def move_band(self, delta):
+        row = self.table.currentRow()
+        rules = self.get_rules()
+        if row < 0 or not 0 <= row + delta < len(rules):
+            return
+        rules[row], rules[row + delta] = rules[row + delta], rules[row]
+        self.fill(rules)
+        self.table.selectRow(row + delta)
+
+    def get_rules(self):
+        return [self.band(row) for row in range(self.table.rowCount())]
+
+class HistoryDialog(QDialog):
+    def __init__(self, history, parent=None):
         super().__init__(parent)
-        self.staffing_data = staffing_data
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["ID", "Name", "Domain", "Manager"])
+        self.setWindowTitle("Plan History")
+        self.resize(600, 400)
+        self.history = history
+        self.versions = list(reversed(history.versions()))
+        layout = QVBoxLayout()
+        self.table = QTableWidget(len(self.versions), 3)
+        self.table.setHorizontalHeaderLabels(["Version", "Saved", "Message"])
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.table.hideColumn(0)
-        self.load_data()
-        layout = QVBoxLayout()
+        for row, (version, saved, message) in enumerate(self.versions):
+            self.table.setItem(row, 0, QTableWidgetItem(version[:10]))
+            self.table.setItem(row, 1, QTableWidgetItem(saved))
+            self.table.setItem(row, 2, QTableWidgetItem(message))
         layout.addWidget(self.table)
         btns = QHBoxLayout()
-        add_btn = QPushButton("Add")
+        restore_btn = QPushButton("Restore")
+        close_btn = QPushButton("Close")
+        restore_btn.clicked.connect(self.accept)
+        close_btn.clicked.connect(self.reject)
+        btns.addWidget(restore_btn)
+        btns.addWidget(close_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def selected_version(self):
+        row = self.table.currentRow()
+        return self.versions[row][0] if row >= 0 else None
+
+class EmployeeTab(QWidget):
+    def __init__(self, staffing_data, parent=None):
+        super().__init__(parent)
+        self.staffing_data = staffing_data
+        self.table = QTableWidget()
+        self.table.setColumnCount(4)
+        self.table.setHorizontalHeaderLabels(["ID", "Name", "Domain", "Manager"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.hideColumn(0)
+        self.load_data()
+        self.staffing_data.subscribe(self.on_events, ["employee"])
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        btns = QHBoxLayout()
+        add_btn = QPushButton("Add")
         edit_btn = QPushButton("Edit")
         remove_btn = QPushButton("Remove")
         save_btn = QPushButton("Save")
@@ -211,20 +2063,22 @@ class EmployeeTab(QWidget):
         for emp in self.staffing_data.data["employees"]:
             row = self.table.rowCount()
             self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(emp["id"]))
-            self.table.setItem(row, 1, QTableWidgetItem(emp["name"]))
-            domain_item = QTableWidgetItem(emp["domain"])
-            self.table.setItem(row, 2, domain_item)
-            self.table.setItem(row, 3, QTableWidgetItem(emp["manager"]))
+            self.fill_row(row, emp)
+
+    def fill_row(self, row, emp):
+        self.table.setItem(row, 0, QTableWidgetItem(emp["id"]))
+        self.table.setItem(row, 1, QTableWidgetItem(emp["name"]))
+        domain_item = QTableWidgetItem(emp["domain"])
+        self.table.setItem(row, 2, domain_item)
+        self.table.setItem(row, 3, QTableWidgetItem(emp["manager"]))
+
+    def employee_row(self, emp_id):
+        return next((r for r in range(self.table.rowCount()) if self.table.item(r, 0).text() == emp_id), -1)
 
     def add_employee(self):
         dialog = EmployeeEditDialog(None, self)
         if dialog.exec():
-            emp = dialog.get_employee()
-            emp["id"] = str(max([int(e["id"]) for e in self.staffing_data.data["employees"]] + [0]) + 1)
-            self.staffing_data.data["employees"].append(emp)
-            self.staffing_data.ensure_availability()
-            self.load_data()
+            self.staffing_data.add_record("employee", dialog.get_employee())
 
     def edit_employee(self):
         row = self.table.currentRow()
@@ -237,9 +2091,9 @@ class EmployeeTab(QWidget):
             return
         dialog = EmployeeEditDialog(emp.copy(), self)
         if dialog.exec():
-            new_emp = dialog.get_employee()
-            emp.update(new_emp)
-            self.load_data()
+            with self.staffing_data.transaction():
+                for field, value in dialog.get_employee().items():
+                    self.staffing_data.set_field("employee", emp_id, field, value)
 
     def remove_employee(self):
         row = self.table.currentRow()
@@ -247,16 +2101,28 @@ class EmployeeTab(QWidget):
             QMessageBox.warning(self, "Remove Employee", "Select an employee to remove.")
             return
         emp_id = self.table.item(row, 0).text()
-        self.staffing_data.data["employees"] = [e for e in self.staffing_data.data["employees"] if e["id"] != emp_id]
-        if emp_id in self.staffing_data.data["availability"]:
-            del self.staffing_data.data["availability"][emp_id]
-        self.staffing_data.data["allocation"] = [a for a in self.staffing_data.data["allocation"] if a["employee_id"] != emp_id]
-        self.load_data()
+        self.staffing_data.remove_record("employee", emp_id)
 
     def save(self):
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Employee data saved.")
 
+    def on_events(self, events):
+        columns = {"name": 1, "domain": 2, "manager": 3}
+        for event in events:
+            if isinstance(event, RecordAdded):
+                row = min(event.position, self.table.rowCount())
+                self.table.insertRow(row)
+                self.fill_row(row, event.record)
+                continue
+            row = self.employee_row(event.key)
+            if row < 0:
+                continue
+            if isinstance(event, RecordRemoved):
+                self.table.removeRow(row)
+            elif isinstance(event, RecordUpdated) and event.field in columns:
+                self.table.item(row, columns[event.field]).setText(event.new)
+
 class EmployeeEditDialog(QDialog):
     def __init__(self, emp, parent=None):
         super().__init__(parent)
@@ -266,18 +2132,24 @@ class EmployeeEditDialog(QDialog):
         self.domain_combo = QComboBox()
         self.domain_combo.addItems(DOMAINS)
         self.manager_edit = QLineEdit()
+        self.rates_edit = QLineEdit()
+        self.rates_edit.setPlaceholderText("e.g. 2026-01=12000, 2027-01=12500")
+        self.had_rates = bool(emp and "rates" in emp)
         if emp:
             self.name_edit.setText(emp["name"])
             idx = self.domain_combo.findText(emp["domain"])
             if idx >= 0:
                 self.domain_combo.setCurrentIndex(idx)
             self.manager_edit.setText(emp["manager"])
+            self.rates_edit.setText(format_rates(emp.get("rates")))
         layout.addWidget(QLabel("Name:"))
         layout.addWidget(self.name_edit)
         layout.addWidget(QLabel("Domain:"))
         layout.addWidget(self.domain_combo)
         layout.addWidget(QLabel("Manager:"))
         layout.addWidget(self.manager_edit)
+        layout.addWidget(QLabel("Monthly Rate History (blank for the domain rate):"))
+        layout.addWidget(self.rates_edit)
         btns = QHBoxLayout()
         save_btn = QPushButton("Save")
         cancel_btn = QPushButton("Cancel")
@@ -288,22 +2160,34 @@ class EmployeeEditDialog(QDialog):
         layout.addLayout(btns)
         self.setLayout(layout)
 
+    def accept(self):
+        try:
+            parse_rates(self.rates_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, self.windowTitle(), f"Rate history: {e}")
+            return
+        super().accept()
+
     def get_employee(self):
-        return {
+        employee = {
             "name": self.name_edit.text(),
             "domain": self.domain_combo.currentText(),
             "manager": self.manager_edit.text()
         }
+        rates = parse_rates(self.rates_edit.text())
+        if rates or self.had_rates:
+            employee["rates"] = rates
+        return employee
 
 class AvailabilityTab(QWidget):
-    def __init__(self, staffing_data, months, set_months_callback, parent=None):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.months = months
+        self.periods = periods
         self.set_months_callback = set_months_callback
 
-        self.table = DragFillTableWidget(0, len(self.months) + 1)
-        headers = ["Employee"] + [format_month(m) for m in self.months]
+        self.table = DragFillTableWidget(0, len(self.periods) + 1)
+        headers = ["Employee"] + [p.label for p in self.periods]
         self.table.setHorizontalHeaderLabels(headers)
         self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
@@ -312,6 +2196,8 @@ class AvailabilityTab(QWidget):
             QTableWidget.EditTrigger.SelectedClicked |
             QTableWidget.EditTrigger.EditKeyPressed
         )
+        self.table.edit_batch = self.staffing_data.transaction
+        self.table.paste_cells = self.paste_cells
         for i in range(1, len(headers)):
             self.table.setColumnWidth(i, 50)
 
@@ -344,31 +2230,84 @@ class AvailabilityTab(QWidget):
         self.setLayout(layout)
 
         self.load_data()
+        self.table.cellChanged.connect(self.on_cell_changed)
+        self.staffing_data.subscribe(self.on_events, ["employee", "availability"])
 
     def load_data(self):
         employees = self.staffing_data.data["employees"]
-        availability = self.staffing_data.data.get("availability", {})
 
+        self.table.blockSignals(True)
         self.table.setRowCount(0)
         for emp in employees:
-            emp_id = emp["id"]
             row = self.table.rowCount()
             self.table.insertRow(row)
+            self.fill_row(row, emp["id"])
+        self.table.blockSignals(False)
 
-            emp_combo = QComboBox()
-            emp_names = [e["name"] for e in employees]
-            emp_combo.addItems(emp_names)
-            emp_combo.setCurrentText(emp["name"])
-            emp_combo.setEnabled(True)
-            self.table.setCellWidget(row, 0, emp_combo)
+    def fill_row(self, row, emp_id):
+        self.table.setCellWidget(row, 0, self.employee_combo(emp_id))
+        values = period_values(self.staffing_data, "availability", emp_id, self.periods)
+        for c, (period, val) in enumerate(zip(self.periods, values)):
+            item = QTableWidgetItem(period_text(val, period))
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, c + 1, item)
 
-            emp_avail = availability.get(emp_id, {})
-            for c, m in enumerate(self.months):
-                mkey = json_month(m)
-                val = emp_avail.get(mkey, 1.0)
-                item = QTableWidgetItem(str(val))
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, c + 1, item)
+    def refresh_row(self, row, emp_id):
+        values = period_values(self.staffing_data, "availability", emp_id, self.periods)
+        for c, (period, val) in enumerate(zip(self.periods, values)):
+            set_cell_text(self.table, row, c + 1, period_text(val, period))
+
+    def employee_combo(self, emp_id=None):
+        emp_combo = QComboBox()
+        fill_employee_combo(emp_combo, self.staffing_data, emp_id)
+        emp_combo.setEnabled(True)
+        emp_combo.currentIndexChanged.connect(lambda _, c=emp_combo: self.on_employee_changed(c))
+        return emp_combo
+
+    def row_employee(self, row):
+        emp_combo = self.table.cellWidget(row, 0)
+        return emp_combo.currentData() if emp_combo else None
+
+    def employee_rows(self, emp_id):
+        return [r for r in range(self.table.rowCount()) if self.row_employee(r) == emp_id]
+
+    def rows_by_employee(self):
+        rows = {}
+        for r in range(self.table.rowCount()):
+            rows.setdefault(self.row_employee(r), []).append(r)
+        return rows
+
+    def on_cell_changed(self, row, col):
+        emp_id = self.row_employee(row)
+        if col == 0 or not emp_id:
+            return
+        period = self.periods[col - 1]
+        val = parse_cell(self.table.item(row, col))
+        if val is None:
+            set_cell_text(self.table, row, col, period_text(period_value(self.staffing_data, "availability", emp_id, period), period))
+            return
+        set_period(self.staffing_data, "availability", emp_id, period, val)
+
+    def paste_cells(self, cells):
+        emp_ids = {}
+        with self.staffing_data.transaction():
+            for row, col, val in cells:
+                if row not in emp_ids:
+                    emp_ids[row] = self.row_employee(row)
+                if col > 0 and emp_ids[row]:
+                    set_period(self.staffing_data, "availability", emp_ids[row], self.periods[col - 1], val)
+
+    def on_employee_changed(self, emp_combo):
+        # Re-pointing a row at another employee gives them the row's values
+        row = next((r for r in range(self.table.rowCount()) if self.table.cellWidget(r, 0) is emp_combo), -1)
+        emp_id = emp_combo.currentData()
+        if row < 0 or not emp_id:
+            return
+        with self.staffing_data.transaction():
+            for c, period in enumerate(self.periods):
+                val = parse_cell(self.table.item(row, c + 1))
+                if val is not None:
+                    set_period(self.staffing_data, "availability", emp_id, period, val)
 
     def add_availability(self):
         employees = self.staffing_data.data["employees"]
@@ -377,18 +2316,15 @@ class AvailabilityTab(QWidget):
             return
 
         row = self.table.rowCount()
+        self.table.blockSignals(True)
         self.table.insertRow(row)
+        self.table.setCellWidget(row, 0, self.employee_combo())
 
-        emp_combo = QComboBox()
-        emp_names = [e["name"] for e in employees]
-        emp_combo.addItems(emp_names)
-        emp_combo.setEnabled(True)
-        self.table.setCellWidget(row, 0, emp_combo)
-
-        for c in range(len(self.months)):
+        for c in range(len(self.periods)):
             item = QTableWidgetItem("1.0")
             item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
             self.table.setItem(row, c + 1, item)
+        self.table.blockSignals(False)
 
         self.table.selectRow(row)
 
@@ -413,87 +2349,110 @@ class AvailabilityTab(QWidget):
             QMessageBox.warning(self, "Remove Availability", "Select a row to remove.")
             return
 
-        emp_combo = self.table.cellWidget(row, 0)
-        if emp_combo:
-            emp_name = emp_combo.currentText()
-            emp = next((e for e in self.staffing_data.data["employees"] if e["name"] == emp_name), None)
-            if emp and emp["id"] in self.staffing_data.data.get("availability", {}):
-                del self.staffing_data.data["availability"][emp["id"]]
-
-        self.table.removeRow(row)
+        emp_id = self.row_employee(row)
+        if emp_id:
+            self.staffing_data.remove_record("availability", emp_id)
 
     def save(self):
-        employees = self.staffing_data.data["employees"]
-        emp_name_to_id = {e["name"]: e["id"] for e in employees}
-        availability = {}
-
-        for r in range(self.table.rowCount()):
-            emp_combo = self.table.cellWidget(r, 0)
-            if not emp_combo:
-                continue
-            emp_name = emp_combo.currentText()
-            emp_id = emp_name_to_id.get(emp_name)
-            if not emp_id:
-                continue
-
-            monthly_avail = {}
-            for c, m in enumerate(self.months):
-                item = self.table.item(r, c + 1)
-                try:
-                    val = float(item.text())
-                except Exception:
-                    val = 1.0
-                monthly_avail[json_month(m)] = val
-
-            availability[emp_id] = monthly_avail
-
-        self.staffing_data.data["availability"] = availability
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Availability data saved.")
 
-    def update_months(self, months):
-        self.months = months
-        headers = ["Employee"] + [format_month(m) for m in months]
-        self.table.setColumnCount(len(months) + 1)
+    def combos(self):
+        return [self.table.cellWidget(r, 0) for r in range(self.table.rowCount()) if self.table.cellWidget(r, 0)]
+
+    def on_events(self, events):
+        month_cols = {m: c + 1 for c, p in enumerate(self.periods) for m in p.months}
+        # Looked up once per batch; a pasted block brings thousands of cell events
+        rows = None
+        for event in events:
+            if event.kind == "employee":
+                rows = None
+                if isinstance(event, RecordAdded):
+                    for combo in self.combos():
+                        if combo.findData(event.key) >= 0:
+                            continue
+                        combo.blockSignals(True)
+                        combo.insertItem(event.position, event.record["name"], event.key)
+                        combo.blockSignals(False)
+                    row = min(event.position, self.table.rowCount())
+                    self.table.blockSignals(True)
+                    self.table.insertRow(row)
+                    self.fill_row(row, event.key)
+                    self.table.blockSignals(False)
+                elif isinstance(event, RecordRemoved):
+                    for row in reversed(self.employee_rows(event.key)):
+                        self.table.removeRow(row)
+                    for combo in self.combos():
+                        combo.blockSignals(True)
+                        combo.removeItem(combo.findData(event.key))
+                        combo.blockSignals(False)
+                elif event.field == "name":
+                    for combo in self.combos():
+                        combo.setItemText(combo.findData(event.key), event.new)
+            elif isinstance(event, CellChanged):
+                col = month_cols.get(event.month)
+                if col is not None:
+                    if rows is None:
+                        rows = self.rows_by_employee()
+                    period = self.periods[col - 1]
+                    text = period_text(period_value(self.staffing_data, "availability", event.key, period), period)
+                    for row in rows.get(event.key, []):
+                        set_cell_text(self.table, row, col, text)
+            else:
+                for row in self.employee_rows(event.key):
+                    self.refresh_row(row, event.key)
+
+    def update_months(self, periods):
+        self.periods = periods
+        headers = ["Employee"] + [p.label for p in periods]
+        self.table.setColumnCount(len(periods) + 1)
         self.table.setHorizontalHeaderLabels(headers)
         self.load_data()
 
 class DemandTab(QWidget):
-    def __init__(self, staffing_data, months, set_months_callback, parent=None):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.months = months
+        self.periods = periods
         self.set_months_callback = set_months_callback
-        self.table = DragFillTableWidget(0, len(self.months) + 3)
-        headers = ["Project", "Domain", "Scaling"] + [format_month(m) for m in self.months]
+        self.row_keys = []
+        self.table = DragFillTableWidget(0, len(self.periods) + 3)
+        headers = ["Project", "Domain", "Scaling"] + [p.label for p in self.periods]
         self.table.setHorizontalHeaderLabels(headers)
-        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
         self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         self.table.setEditTriggers(
             QTableWidget.EditTrigger.DoubleClicked |
             QTableWidget.EditTrigger.SelectedClicked |
             QTableWidget.EditTrigger.EditKeyPressed
         )
+        self.table.edit_batch = self.staffing_data.transaction
+        self.table.paste_cells = self.paste_cells
         for i in range(3, len(headers)):
             self.table.setColumnWidth(i, 50)
         self.load_data()
+        self.table.cellChanged.connect(self.on_cell_changed)
+        self.staffing_data.subscribe(self.on_events, ["project", "demand"])
         layout = QVBoxLayout()
         layout.addWidget(self.table)
         btns = QHBoxLayout()
         add_btn = QPushButton("Add")
         edit_btn = QPushButton("Edit")
+        bulk_btn = QPushButton("Bulk Edit...")
         remove_btn = QPushButton("Remove")
         save_btn = QPushButton("Save")
         prev_btn = QPushButton("<<")
         next_btn = QPushButton(">>")
         add_btn.clicked.connect(self.add_entry)
         edit_btn.clicked.connect(self.edit_entry)
+        bulk_btn.clicked.connect(self.bulk_edit)
         remove_btn.clicked.connect(self.remove_entry)
         save_btn.clicked.connect(self.save)
         prev_btn.clicked.connect(lambda: self.set_months_callback(-1))
         next_btn.clicked.connect(lambda: self.set_months_callback(1))
         btns.addWidget(add_btn)
         btns.addWidget(edit_btn)
+        btns.addWidget(bulk_btn)
         btns.addWidget(remove_btn)
         btns.addWidget(prev_btn)
         btns.addWidget(next_btn)
@@ -503,58 +2462,94 @@ class DemandTab(QWidget):
 
     def load_data(self):
         demand_list = self.staffing_data.data["demand"]
+        self.row_keys = [entry["id"] for entry in demand_list]
+        self.rows = {key: r for r, key in enumerate(self.row_keys)}
+        self.table.blockSignals(True)
         self.table.setRowCount(len(demand_list))
         for r, entry in enumerate(demand_list):
-            proj_combo = QComboBox()
-            projects = sorted({d["project"] for d in demand_list})
-            proj_combo.addItems(projects)
-            proj_combo.setCurrentText(entry["project"])
-            proj_combo.setEnabled(True)
-            self.table.setCellWidget(r, 0, proj_combo)
-
-            domain_combo = QComboBox()
-            domain_combo.addItems(DOMAINS)
-            domain_combo.setCurrentText(entry.get("domain", DOMAINS[0]))
-            domain_combo.setEnabled(True)
-            self.table.setCellWidget(r, 1, domain_combo)
-
-            scaling_item = QTableWidgetItem(str(entry.get("scaling_factor", 1.0)))
-            scaling_item.setFlags(scaling_item.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(r, 2, scaling_item)
-
-            monthly = entry.get("monthly_demand", {})
-            for c, m in enumerate(self.months):
-                mkey = json_month(m)
-                val = monthly.get(mkey, 0.0)
-                item = QTableWidgetItem(str(val))
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-                if val == 0.0:
-                    item.setBackground(Qt.GlobalColor.lightGray)
-                    item.setForeground(Qt.GlobalColor.gray)
-                self.table.setItem(r, c + 3, item)
+            self.fill_row(r, entry)
+        self.table.blockSignals(False)
 
-    def add_entry(self):
-        row = self.table.rowCount()
-        self.table.insertRow(row)
+    def fill_row(self, r, entry):
+        key = entry["id"]
         proj_combo = QComboBox()
-        projects = sorted({d["project"] for d in self.staffing_data.data["demand"]})
-        proj_combo.addItems(projects)
-        proj_combo.setEditable(True)
-        self.table.setCellWidget(row, 0, proj_combo)
+        fill_project_combo(proj_combo, self.staffing_data, entry["project_id"])
+        proj_combo.setEnabled(True)
+        proj_combo.currentIndexChanged.connect(lambda _, k=key, c=proj_combo: self.on_project_changed(k, c))
+        self.table.setCellWidget(r, 0, proj_combo)
 
         domain_combo = QComboBox()
         domain_combo.addItems(DOMAINS)
-        self.table.setCellWidget(row, 1, domain_combo)
+        domain_combo.setCurrentText(entry.get("domain", DOMAINS[0]))
+        domain_combo.setEnabled(True)
+        domain_combo.currentTextChanged.connect(
+            lambda text, k=key: self.staffing_data.set_field("demand", k, "domain", text))
+        self.table.setCellWidget(r, 1, domain_combo)
 
-        scaling_item = QTableWidgetItem("1.0")
+        scaling_item = QTableWidgetItem(str(entry.get("scaling_factor", 1.0)))
         scaling_item.setFlags(scaling_item.flags() | Qt.ItemFlag.ItemIsEditable)
-        self.table.setItem(row, 2, scaling_item)
+        self.table.setItem(r, 2, scaling_item)
 
-        for c in range(len(self.months)):
-            item = QTableWidgetItem("0.0")
+        values = period_values(self.staffing_data, "demand", key, self.periods)
+        for c, (period, val) in enumerate(zip(self.periods, values)):
+            item = QTableWidgetItem(period_text(val, period))
             item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(row, c + 3, item)
+            if val == 0.0:
+                style_demand_item(item, val)
+            self.table.setItem(r, c + 3, item)
+
+    def on_cell_changed(self, row, col):
+        if row >= len(self.row_keys) or col < 2:
+            return
+        key = self.row_keys[row]
+        val = parse_cell(self.table.item(row, col))
+        if col == 2:
+            if val is None:
+                entry = self.staffing_data.get_record("demand", key)
+                set_cell_text(self.table, row, col, str(entry.get("scaling_factor", 1.0)))
+                return
+            self.staffing_data.set_field("demand", key, "scaling_factor", val)
+            return
+        period = self.periods[col - 3]
+        if val is None:
+            set_cell_text(self.table, row, col, period_text(period_value(self.staffing_data, "demand", key, period), period))
+            return
+        style_demand_item(self.table.item(row, col), val)
+        set_period(self.staffing_data, "demand", key, period, val)
+
+    def paste_cells(self, cells):
+        with self.staffing_data.transaction():
+            for row, col, val in cells:
+                if row >= len(self.row_keys) or col < 2:
+                    continue
+                if col == 2:
+                    self.staffing_data.set_field("demand", self.row_keys[row], "scaling_factor", val)
+                else:
+                    set_period(self.staffing_data, "demand", self.row_keys[row], self.periods[col - 3], val)
+
+    def on_project_changed(self, key, proj_combo):
+        with self.staffing_data.transaction():
+            proj_id = combo_project_id(proj_combo, self.staffing_data)
+            if proj_id:
+                self.staffing_data.set_field("demand", key, "project_id", proj_id)
 
+    def add_entry(self):
+        projects = self.staffing_data.project_names()
+        if not projects:
+            QMessageBox.warning(self, "Add Demand", "No projects available. Please add a project first.")
+            return
+        key = self.staffing_data.add_record("demand", {
+            "project_id": self.staffing_data.project_id(projects[0]),
+            "domain": DOMAINS[0],
+            "scaling_factor": 1.0,
+            "monthly_demand": {}
+        })
+        row = self.rows.get(key)
+        if row is None:
+            return
+        proj_combo = self.table.cellWidget(row, 0)
+        proj_combo.setEditable(True)
+        proj_combo.lineEdit().editingFinished.connect(lambda k=key, c=proj_combo: self.on_project_changed(k, c))
         self.table.selectRow(row)
 
     def edit_entry(self):
@@ -576,67 +2571,81 @@ class DemandTab(QWidget):
             if item:
                 item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
 
+    def bulk_edit(self):
+        rows = self.table.selected_rows()
+        if not rows:
+            QMessageBox.warning(self, "Bulk Edit", "Select the demand rows to edit.")
+            return
+        refs = [("demand", self.row_keys[r]) for r in rows]
+        run_bulk_edit(self, self.staffing_data, refs, f"{len(refs)} selected demand row(s)", self.periods)
+
     def remove_entry(self):
         row = self.table.currentRow()
         if row < 0:
             QMessageBox.warning(self, "Remove Demand", "Select a row to remove.")
             return
-        self.table.removeRow(row)
+        self.staffing_data.remove_record("demand", self.row_keys[row])
 
     def save(self):
-        new_demand = []
-        for r in range(self.table.rowCount()):
-            proj_combo = self.table.cellWidget(r, 0)
-            domain_combo = self.table.cellWidget(r, 1)
-            if not proj_combo or not domain_combo:
-                continue
-            proj = proj_combo.currentText()
-            domain = domain_combo.currentText()
-            try:
-                scaling = float(self.table.item(r, 2).text())
-            except Exception:
-                scaling = 1.0
-            monthly = {}
-            for c, m in enumerate(self.months):
-                try:
-                    val = float(self.table.item(r, c + 3).text())
-                except Exception:
-                    val = 0.0
-                monthly[json_month(m)] = val
-            new_demand.append({
-                "project": proj,
-                "domain": domain,
-                "scaling_factor": scaling,
-                "monthly_demand": monthly
-            })
-        self.staffing_data.data["demand"] = new_demand
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Demand data saved.")
 
-    def update_months(self, months):
-        self.months = months
-        headers = ["Project", "Domain", "Scaling"] + [format_month(m) for m in months]
-        self.table.setColumnCount(len(months) + 3)
+    def on_events(self, events):
+        month_cols = {m: c + 3 for c, p in enumerate(self.periods) for m in p.months}
+        for event in events:
+            if event.kind == "project" and lists_names(event):
+                for combo in self.combos(0):
+                    update_name_combo(combo, event, True)
+            if event.kind != "demand":
+                continue
+            if isinstance(event, RecordAdded):
+                row = min(event.position, len(self.row_keys))
+                self.row_keys.insert(row, event.key)
+                self.rows = {key: r for r, key in enumerate(self.row_keys)}
+                self.table.blockSignals(True)
+                self.table.insertRow(row)
+                self.fill_row(row, event.record)
+                self.table.blockSignals(False)
+                continue
+            row = self.rows.get(event.key)
+            if row is None:
+                continue
+            if isinstance(event, RecordRemoved):
+                del self.row_keys[row]
+                self.rows = {key: r for r, key in enumerate(self.row_keys)}
+                self.table.removeRow(row)
+            elif isinstance(event, CellChanged):
+                col = month_cols.get(event.month)
+                if col is not None:
+                    period = self.periods[col - 3]
+                    val = period_value(self.staffing_data, "demand", event.key, period)
+                    style_demand_item(set_cell_text(self.table, row, col, period_text(val, period)), val)
+            elif event.field == "scaling_factor":
+                set_cell_text(self.table, row, 2, str(event.new))
+            elif event.field == "domain":
+                set_combo_text(self.table.cellWidget(row, 1), event.new)
+            elif event.field == "project_id":
+                fill_project_combo(self.table.cellWidget(row, 0), self.staffing_data, event.new)
+
+    def update_months(self, periods):
+        self.periods = periods
+        headers = ["Project", "Domain", "Scaling"] + [p.label for p in periods]
+        self.table.setColumnCount(len(periods) + 3)
         self.table.setHorizontalHeaderLabels(headers)
         self.load_data()
 
-    def refresh_project_dropdowns(self):
-        projects = sorted({d["project"] for d in self.staffing_data.data["demand"]})
-        for r in range(self.table.rowCount()):
-            proj_combo = self.table.cellWidget(r, 0)
-            if proj_combo:
-                current = proj_combo.currentText()
-                proj_combo.clear()
-                proj_combo.addItems(projects)
-                if current in projects:
-                    proj_combo.setCurrentText(current)
+    def combos(self, col):
+        return [self.table.cellWidget(r, col) for r in range(self.table.rowCount()) if self.table.cellWidget(r, col)]
 
 class AllocationTab(QWidget):
-    def __init__(self, staffing_data, months, set_months_callback, parent=None):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.months = months
+        self.periods = periods
         self.set_months_callback = set_months_callback
+        self.row_keys = []
+        # Set by the window: returns the free capacity index, brought up to date
+        self.free_capacity = None
 
         # Filtering controls
         self.filter_project = QComboBox()
@@ -645,6 +2654,8 @@ class AllocationTab(QWidget):
         self.filter_project.currentIndexChanged.connect(self.load_data)
         self.filter_employee.currentIndexChanged.connect(self.load_data)
         self.filter_domain.currentIndexChanged.connect(self.load_data)
+        self.expression = None
+        self.filter_edit = filter_edit(self.set_expression)
 
         filter_layout = QHBoxLayout()
         filter_layout.addWidget(QLabel("Project:"))
@@ -653,10 +2664,10 @@ class AllocationTab(QWidget):
         filter_layout.addWidget(self.filter_employee)
         filter_layout.addWidget(QLabel("Domain:"))
         filter_layout.addWidget(self.filter_domain)
-        filter_layout.addStretch()
+        filter_layout.addWidget(self.filter_edit, 1)
 
-        self.table = DragFillTableWidget(0, len(self.months) + 3)
-        headers = ["Employee", "Project", "Domain"] + [format_month(m) for m in self.months]
+        self.table = DragFillTableWidget(0, len(self.periods) + 3)
+        headers = ["Employee", "Project", "Domain"] + [p.label for p in self.periods]
         self.table.setHorizontalHeaderLabels(headers)
         self.table.setSelectionMode(QTableWidget.SelectionMode.ExtendedSelection)
         self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
@@ -665,24 +2676,34 @@ class AllocationTab(QWidget):
             QTableWidget.EditTrigger.SelectedClicked |
             QTableWidget.EditTrigger.EditKeyPressed
         )
+        self.table.edit_batch = self.staffing_data.transaction
+        self.table.paste_cells = self.paste_cells
         for i in range(3, len(headers)):
             self.table.setColumnWidth(i, 50)
         self.load_data()
+        self.table.cellChanged.connect(self.on_cell_changed)
+        self.staffing_data.subscribe(self.on_events, ["project", "employee", "allocation"])
         layout = QVBoxLayout()
         layout.addLayout(filter_layout)
         layout.addWidget(self.table)
         btns = QHBoxLayout()
         add_btn = QPushButton("Add")
+        find_btn = QPushButton("Find Available...")
+        bulk_btn = QPushButton("Bulk Edit...")
         remove_btn = QPushButton("Remove")
         save_btn = QPushButton("Save")
         prev_btn = QPushButton("<<")
         next_btn = QPushButton(">>")
         add_btn.clicked.connect(self.add_allocation)
+        find_btn.clicked.connect(self.find_available)
+        bulk_btn.clicked.connect(self.bulk_edit)
         remove_btn.clicked.connect(self.remove_allocation)
         save_btn.clicked.connect(self.save)
         prev_btn.clicked.connect(lambda: self.set_months_callback(-1))
         next_btn.clicked.connect(lambda: self.set_months_callback(1))
         btns.addWidget(add_btn)
+        btns.addWidget(find_btn)
+        btns.addWidget(bulk_btn)
         btns.addWidget(remove_btn)
         btns.addWidget(prev_btn)
         btns.addWidget(next_btn)
@@ -692,7 +2713,7 @@ class AllocationTab(QWidget):
 
     def update_filters(self):
         emps = self.staffing_data.data["employees"]
-        projects = sorted({a["project"] for a in self.staffing_data.data["allocation"]} | {d["project"] for d in self.staffing_data.data["demand"]})
+        projects = self.staffing_data.project_names()
         # Use all possible domains, not just those in the data
         domains = DOMAINS[:]
         current_proj = self.filter_project.currentText() if self.filter_project.count() else "All"
@@ -720,166 +2741,280 @@ class AllocationTab(QWidget):
         self.filter_employee.blockSignals(False)
         self.filter_domain.blockSignals(False)
 
-    def load_data(self):
-        self.update_filters()
-        allocations = self.staffing_data.data["allocation"]
-        emps = self.staffing_data.data["employees"]
-        emp_names = {e["id"]: e["name"] for e in emps}
-        emp_ids = {e["name"]: e["id"] for e in emps}
-        projects = sorted({a["project"] for a in allocations} | {d["project"] for d in self.staffing_data.data["demand"]})
+    def set_expression(self):
+        expression = read_filter(self, self.filter_edit, "allocation")
+        if expression is not False:
+            self.expression = expression
+            self.load_data()
+
+    def is_filtered(self):
+        return self.expression is not None or \
+            any(f.currentText() not in ("", "All") for f in (self.filter_project, self.filter_employee, self.filter_domain))
 
+    def filter_context(self, keys):
+        return FilterContext(self.staffing_data, "allocation", keys, [m for p in self.periods for m in p.months])
+
+    def matches_filter(self, alloc):
+        if not self.matches_combos(alloc):
+            return False
+        return self.expression is None or self.expression.matches(self.filter_context([alloc["id"]]))
+
+    def matches_combos(self, alloc):
         proj_filter = self.filter_project.currentText()
         emp_filter = self.filter_employee.currentText()
         domain_filter = self.filter_domain.currentText()
+        emp = self.staffing_data.get_record("employee", alloc["employee_id"])
+        emp_name = emp["name"] if emp else ""
+        proj = self.staffing_data.project_name(alloc["project_id"])
+        domain = alloc.get("domain", DOMAINS[0])
+        return (proj_filter in ("", "All") or proj == proj_filter) and \
+               (emp_filter in ("", "All") or emp_name == emp_filter) and \
+               (domain_filter in ("", "All") or domain == domain_filter)
 
-        filtered_allocs = []
-        for alloc in allocations:
-            emp_name = emp_names.get(alloc["employee_id"], "")
-            proj = alloc["project"]
-            domain = alloc.get("domain", DOMAINS[0])
-            if (proj_filter == "All" or proj == proj_filter) and \
-               (emp_filter == "All" or emp_name == emp_filter) and \
-               (domain_filter == "All" or domain == domain_filter):
-                filtered_allocs.append(alloc)
+    def load_data(self):
+        self.update_filters()
+        filtered_allocs = [a for a in self.staffing_data.data["allocation"] if self.matches_combos(a)]
+        if self.expression is not None:
+            rows = self.expression.select(self.filter_context([a["id"] for a in filtered_allocs]))
+            filtered_allocs = [filtered_allocs[i] for i in rows]
 
+        self.row_keys = [alloc["id"] for alloc in filtered_allocs]
+        self.rows = {key: r for r, key in enumerate(self.row_keys)}
+        self.table.blockSignals(True)
         self.table.setRowCount(len(filtered_allocs))
         for r, alloc in enumerate(filtered_allocs):
-            emp_id = alloc["employee_id"]
-            emp_name = emp_names.get(emp_id, "")
-            emp_combo = QComboBox()
-            emp_combo.addItems([e["name"] for e in emps])
-            if emp_name in [e["name"] for e in emps]:
-                emp_combo.setCurrentIndex([e["name"] for e in emps].index(emp_name))
-            self.table.setCellWidget(r, 0, emp_combo)
-
-            proj_combo = QComboBox()
-            proj_combo.addItems(projects)
-            if alloc["project"] in projects:
-                proj_combo.setCurrentIndex(projects.index(alloc["project"]))
-            self.table.setCellWidget(r, 1, proj_combo)
-
-            domain_combo = QComboBox()
-            domain_combo.addItems(DOMAINS)
-            domain_combo.setCurrentText(alloc.get("domain", DOMAINS[0]))
-            self.table.setCellWidget(r, 2, domain_combo)
-
-            monthly = alloc.get("monthly_allocation", {})
-            for c, m in enumerate(self.months):
-                mkey = json_month(m)
-                val = monthly.get(mkey, 0.0)
-                item = QTableWidgetItem(str(val))
-                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(r, c + 3, item)
+            self.fill_row(r, alloc)
+        self.table.blockSignals(False)
 
-    def add_allocation(self):
-        self.table.insertRow(self.table.rowCount())
-        emps = self.staffing_data.data["employees"]
+    def fill_row(self, r, alloc):
+        key = alloc["id"]
         emp_combo = QComboBox()
-        emp_combo.addItems([e["name"] for e in emps])
-        self.table.setCellWidget(self.table.rowCount() - 1, 0, emp_combo)
-        projects = sorted({d["project"] for d in self.staffing_data.data["demand"]})
+        fill_employee_combo(emp_combo, self.staffing_data, alloc["employee_id"])
+        emp_combo.currentIndexChanged.connect(
+            lambda _, k=key, c=emp_combo: self.staffing_data.set_field("allocation", k, "employee_id", c.currentData()))
+        self.table.setCellWidget(r, 0, emp_combo)
+
         proj_combo = QComboBox()
-        proj_combo.addItems(projects)
-        self.table.setCellWidget(self.table.rowCount() - 1, 1, proj_combo)
+        fill_project_combo(proj_combo, self.staffing_data, alloc["project_id"])
+        proj_combo.currentIndexChanged.connect(
+            lambda _, k=key, c=proj_combo: self.staffing_data.set_field("allocation", k, "project_id", c.currentData()))
+        self.table.setCellWidget(r, 1, proj_combo)
+
         domain_combo = QComboBox()
         domain_combo.addItems(DOMAINS)
-        domain_combo.setCurrentText(DOMAINS[0])
-        self.table.setCellWidget(self.table.rowCount() - 1, 2, domain_combo)
-        for c in range(3, self.table.columnCount()):
-            item = QTableWidgetItem("0.0")
+        domain_combo.setCurrentText(alloc.get("domain", DOMAINS[0]))
+        domain_combo.currentTextChanged.connect(
+            lambda text, k=key: self.staffing_data.set_field("allocation", k, "domain", text))
+        self.table.setCellWidget(r, 2, domain_combo)
+
+        values = period_values(self.staffing_data, "allocation", key, self.periods)
+        for c, (period, val) in enumerate(zip(self.periods, values)):
+            item = QTableWidgetItem(period_text(val, period))
             item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-            self.table.setItem(self.table.rowCount() - 1, c, item)
+            self.table.setItem(r, c + 3, item)
+
+    def insert_row(self, alloc):
+        # Keep visible rows in the same order as the allocation list
+        row = 0
+        for a in self.staffing_data.data["allocation"]:
+            if a is alloc:
+                break
+            if a["id"] in self.rows:
+                row += 1
+        self.row_keys.insert(row, alloc["id"])
+        self.rows = {key: r for r, key in enumerate(self.row_keys)}
+        self.table.blockSignals(True)
+        self.table.insertRow(row)
+        self.fill_row(row, alloc)
+        self.table.blockSignals(False)
+
+    def remove_row(self, key):
+        row = self.rows[key]
+        del self.row_keys[row]
+        self.rows = {k: r for r, k in enumerate(self.row_keys)}
+        self.table.removeRow(row)
+
+    def on_cell_changed(self, row, col):
+        if row >= len(self.row_keys) or col < 3:
+            return
+        key = self.row_keys[row]
+        period = self.periods[col - 3]
+        val = parse_cell(self.table.item(row, col))
+        if val is None:
+            set_cell_text(self.table, row, col, period_text(period_value(self.staffing_data, "allocation", key, period), period))
+            return
+        set_period(self.staffing_data, "allocation", key, period, val)
+
+    def paste_cells(self, cells):
+        with self.staffing_data.transaction():
+            for row, col, val in cells:
+                if row < len(self.row_keys) and col >= 3:
+                    set_period(self.staffing_data, "allocation", self.row_keys[row], self.periods[col - 3], val)
+
+    def add_allocation(self):
+        emps = self.staffing_data.data["employees"]
+        projects = self.staffing_data.project_names()
+        if not emps or not projects:
+            QMessageBox.warning(self, "Add Allocation", "Add employees and projects first.")
+            return
+        # Start the new row inside the current filter so it stays visible
+        emp_ids = {e["name"]: e["id"] for e in emps}
+        emp_id = emp_ids.get(self.filter_employee.currentText(), emps[0]["id"])
+        proj_id = self.staffing_data.project_id(self.filter_project.currentText()) or self.staffing_data.project_id(projects[0])
+        domain = self.filter_domain.currentText()
+        key = self.staffing_data.add_record("allocation", {
+            "employee_id": emp_id,
+            "project_id": proj_id,
+            "domain": domain if domain in DOMAINS else DOMAINS[0],
+            "monthly_allocation": {}
+        })
+        row = self.rows.get(key)
+        if row is not None:
+            self.table.selectRow(row)
+
+    def find_available(self):
+        project = self.filter_project.currentText()
+        if self.staffing_data.project_id(project) is None:
+            QMessageBox.warning(self, "Find Available", "Pick the project to staff in the Project filter first.")
+            return
+        index = self.free_capacity() if self.free_capacity else None
+        if index is None:
+            return
+        dialog = AvailabilitySearchDialog(index, self.filter_domain.currentText(), f"Allocate to {project}", self)
+        if not dialog.exec():
+            return
+        emp_id, domain, fte, months = dialog.get_pick()
+        key = self.staffing_data.add_record("allocation", {
+            "employee_id": emp_id,
+            "project_id": self.staffing_data.project_id(project),
+            "domain": domain if domain in DOMAINS else DOMAINS[0],
+            "monthly_allocation": {m: fte for m in months}
+        })
+        row = self.rows.get(key)
+        if row is not None:
+            self.table.selectRow(row)
+
+    def bulk_edit(self):
+        rows = self.table.selected_rows()
+        if not rows:
+            QMessageBox.warning(self, "Bulk Edit", "Select the allocations to edit.")
+            return
+        refs = [("allocation", self.row_keys[r]) for r in rows]
+        run_bulk_edit(self, self.staffing_data, refs, f"{len(refs)} selected allocation(s)", self.periods)
 
     def remove_allocation(self):
         row = self.table.currentRow()
         if row < 0:
             QMessageBox.warning(self, "Remove Allocation", "Select an allocation to remove.")
             return
-        self.table.removeRow(row)
+        self.staffing_data.remove_record("allocation", self.row_keys[row])
 
     def save(self):
-        emps = self.staffing_data.data["employees"]
-        emp_names = {e["name"]: e["id"] for e in emps}
-        allocations = []
-        for r in range(self.table.rowCount()):
-            emp_combo = self.table.cellWidget(r, 0)
-            proj_combo = self.table.cellWidget(r, 1)
-            domain_combo = self.table.cellWidget(r, 2)
-            if not emp_combo or not proj_combo or not domain_combo:
-                continue
-            emp_name = emp_combo.currentText()
-            proj = proj_combo.currentText()
-            domain = domain_combo.currentText()
-            emp_id = emp_names.get(emp_name)
-            if not emp_id:
-                continue
-            monthly = {}
-            for c, m in enumerate(self.months):
-                item = self.table.item(r, c + 3)
-                try:
-                    val = float(item.text())
-                except Exception:
-                    val = 0.0
-                monthly[json_month(m)] = val
-            allocations.append({
-                "employee_id": emp_id,
-                "project": proj,
-                "domain": domain,
-                "monthly_allocation": monthly
-            })
-        self.staffing_data.data["allocation"] = allocations
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Allocation data saved.")
 
-    def update_months(self, months):
-        self.months = months
-        headers = ["Employee", "Project", "Domain"] + [format_month(m) for m in months]
-        self.table.setColumnCount(len(months) + 3)
+    def on_events(self, events):
+        named = [e for e in events if e.kind in ("project", "employee") and lists_names(e)]
+        if named:
+            filters = (self.filter_project, self.filter_employee, self.filter_domain)
+            before = [f.currentText() for f in filters]
+            self.update_filters()
+            if [f.currentText() for f in filters] != before:
+                self.load_data()
+                return
+            for event in named:
+                for combo in self.combos(1 if event.kind == "project" else 0):
+                    update_name_combo(combo, event, event.kind == "project")
+        month_cols = {m: c + 3 for c, p in enumerate(self.periods) for m in p.months}
+        for event in events:
+            if event.kind != "allocation":
+                continue
+            if isinstance(event, RecordAdded):
+                if self.matches_filter(event.record):
+                    self.insert_row(event.record)
+                continue
+            if isinstance(event, RecordRemoved):
+                if event.key in self.rows:
+                    self.remove_row(event.key)
+                continue
+            if isinstance(event, CellChanged):
+                row, col = self.rows.get(event.key), month_cols.get(event.month)
+                if row is not None and col is not None:
+                    period = self.periods[col - 3]
+                    val = period_value(self.staffing_data, "allocation", event.key, period)
+                    set_cell_text(self.table, row, col, period_text(val, period))
+                continue
+            alloc = self.staffing_data.get_record("allocation", event.key)
+            if alloc is None:
+                continue
+            if isinstance(event, RecordUpdated) and self.is_filtered():
+                shown, visible = event.key in self.rows, self.matches_filter(alloc)
+                if shown and not visible:
+                    self.remove_row(event.key)
+                elif visible and not shown:
+                    self.insert_row(alloc)
+            row = self.rows.get(event.key)
+            if row is None:
+                continue
+            if event.field == "employee_id":
+                fill_employee_combo(self.table.cellWidget(row, 0), self.staffing_data, event.new)
+            elif event.field == "project_id":
+                fill_project_combo(self.table.cellWidget(row, 1), self.staffing_data, event.new)
+            elif event.field == "domain":
+                set_combo_text(self.table.cellWidget(row, 2), event.new)
+
+    def update_months(self, periods):
+        self.periods = periods
+        headers = ["Employee", "Project", "Domain"] + [p.label for p in periods]
+        self.table.setColumnCount(len(periods) + 3)
         self.table.setHorizontalHeaderLabels(headers)
         self.load_data()
 
-    def refresh_project_dropdowns(self):
-        projects = sorted({d["project"] for d in self.staffing_data.data["demand"]})
-        for r in range(self.table.rowCount()):
-            proj_combo = self.table.cellWidget(r, 1)
-            if proj_combo:
-                current = proj_combo.currentText()
-                proj_combo.clear()
-                proj_combo.addItems(projects)
-                if current in projects:
-                    proj_combo.setCurrentText(current)
+    def combos(self, col):
+        return [self.table.cellWidget(r, col) for r in range(self.table.rowCount()) if self.table.cellWidget(r, col)]
 
 
 class DemandAllocationOutputTab(QWidget):
-    def __init__(self, staffing_data, months, set_months_callback, parent=None):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.months = months
+        self.periods = periods
         self.set_months_callback = set_months_callback
+        self.result = None
+        self.row_labels = None
+        self.shown = None
 
         # Filters
         self.filter_project = QComboBox()
         self.filter_domain = QComboBox()
         self.filter_project.currentIndexChanged.connect(self.load_data)
         self.filter_domain.currentIndexChanged.connect(self.load_data)
+        self.expression = None
+        self.filter_edit = filter_edit(self.set_expression)
 
         filter_layout = QHBoxLayout()
         filter_layout.addWidget(QLabel("Project:"))
         filter_layout.addWidget(self.filter_project)
         filter_layout.addWidget(QLabel("Domain:"))
         filter_layout.addWidget(self.filter_domain)
-        filter_layout.addStretch()
+        filter_layout.addWidget(self.filter_edit, 1)
 
-        self.table = QTableWidget(0, len(self.months) + 3)  # Project, Domain, Scaling + months
-        headers = ["Project", "Domain", "Scaling"] + [format_month(m) for m in self.months]
+        self.table = CopyTableWidget(0, len(self.periods) + 3)  # Project, Domain, Scaling + periods
+        headers = ["Project", "Domain", "Scaling"] + [p.label for p in self.periods]
         self.table.setHorizontalHeaderLabels(headers)
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
         for i in range(3, len(headers)):
             self.table.setColumnWidth(i, 50)
 
+        self.minimap = MinimapView()
+        self.minimap.clicked.connect(lambda row, col: self.jump_to(row, col + 3))
+        body = QHBoxLayout()
+        body.addWidget(self.table)
+        body.addWidget(self.minimap)
+
         layout = QVBoxLayout()
         layout.addLayout(filter_layout)
-        layout.addWidget(self.table)
+        layout.addLayout(body)
         btns = QHBoxLayout()
         config_btn = QPushButton("Config")
         save_btn = QPushButton("Save")
@@ -900,9 +3035,8 @@ class DemandAllocationOutputTab(QWidget):
         self.load_data()
 
     def update_filters(self):
-        demand_list = self.staffing_data.data["demand"]
-        projects = sorted({d["project"] for d in demand_list})
-        domains = sorted({d["domain"] for d in demand_list})
+        projects = sorted(set(self.result.pair_projects)) if self.result else []
+        domains = sorted({d for (_, d) in self.result.pairs}) if self.result else []
         current_proj = self.filter_project.currentText() if self.filter_project.count() else "All"
         current_domain = self.filter_domain.currentText() if self.filter_domain.count() else "All"
         self.filter_project.blockSignals(True)
@@ -920,90 +3054,112 @@ class DemandAllocationOutputTab(QWidget):
         self.filter_project.blockSignals(False)
         self.filter_domain.blockSignals(False)
 
+    def apply_result(self, result):
+        self.result = result
+        self.load_data()
+
     def load_data(self):
         self.update_filters()
-        demand_list = self.staffing_data.data["demand"]
-        allocation_list = self.staffing_data.data["allocation"]
-        thresholds = self.staffing_data.data["thresholds"]
-
-        projects = sorted({d["project"] for d in demand_list})
-        domains = sorted({d["domain"] for d in demand_list})
-        pairs = [(p, d) for p in projects for d in domains]
-
+        if not result_covers(self.result, self.periods):
+            return
+        result = self.result
+        rules = CompiledRules(format_rules(self.staffing_data.data, "output1"))
         proj_filter = self.filter_project.currentText()
         domain_filter = self.filter_domain.currentText()
-        filtered_pairs = [
-            (p, d) for (p, d) in pairs
-            if (proj_filter == "All" or p == proj_filter) and (domain_filter == "All" or d == domain_filter)
+        rows = [
+            i for i, (_, d) in enumerate(result.pairs)
+            if (proj_filter == "All" or result.pair_projects[i] == proj_filter)
+            and (domain_filter == "All" or d == domain_filter)
         ]
+        if self.expression is not None:
+            context = FilterContext(self.staffing_data, "pair", result.pairs, result.months, result)
+            rows = np.intersect1d(rows, self.expression.select(context)).astype(np.intp).tolist()
+        labels = [f"{result.pair_projects[i]} / {result.pairs[i][1]}" for i in rows]
+        values = period_means(result.demand_alloc[rows], self.periods)
+        scaling = result.pair_scaling[rows]
+        codes = rules.classify(values, period_means(result.demand[rows], self.periods),
+                               [result.pairs[i][1] for i in rows], [result.pairs[i][0] for i in rows])
 
-        self.table.setRowCount(len(filtered_pairs))
-        self.table.setVerticalHeaderLabels([f"{p} / {d}" for (p, d) in filtered_pairs])
+        # Only cells whose value moved are repainted when the row layout is unchanged
+        self.table.setUpdatesEnabled(False)
+        if labels != self.row_labels or self.shown is None or self.shown.shape != values.shape:
+            self.table.setRowCount(len(rows))
+            self.table.setVerticalHeaderLabels(labels)
+            for r, i in enumerate(rows):
+                self.table.setItem(r, 0, QTableWidgetItem(result.pair_projects[i]))
+                self.table.setItem(r, 1, QTableWidgetItem(result.pairs[i][1]))
+            changed_scaling = range(len(rows))
+            changed = np.argwhere(np.ones(values.shape, dtype=bool))
+        else:
+            changed_scaling = np.flatnonzero(scaling != self.shown_scaling)
+            changed = np.argwhere((values != self.shown) | (codes != self.shown_codes))
+        for r in changed_scaling:
+            self.table.setItem(r, 2, QTableWidgetItem(str(float(scaling[r]))))
+        for r, c in changed:
+            set_output_cell(self.table, r, c + 3, values[r, c], rules.colour(codes[r, c]))
+        self.table.setUpdatesEnabled(True)
+        self.minimap.set_codes(codes, rules.palette)
+        self.row_labels = labels
+        self.shown = values
+        self.shown_codes = codes
+        self.shown_scaling = scaling
 
-        for r, (proj, domain) in enumerate(filtered_pairs):
-            scaling = 1.0
-            for entry in demand_list:
-                if entry["project"] == proj and entry["domain"] == domain:
-                    scaling = entry.get("scaling_factor", 1.0)
-                    break
-            self.table.setItem(r, 0, QTableWidgetItem(proj))
-            self.table.setItem(r, 1, QTableWidgetItem(domain))
-            self.table.setItem(r, 2, QTableWidgetItem(str(scaling)))
-
-            for c, m in enumerate(self.months):
-                mkey = json_month(m)
-                total_demand = sum(
-                    entry.get("scaling_factor", 1.0) * entry.get("monthly_demand", {}).get(mkey, 0.0)
-                    for entry in demand_list
-                    if entry["project"] == proj and entry["domain"] == domain
-                )
-                total_alloc = sum(
-                    alloc.get("monthly_allocation", {}).get(mkey, 0.0)
-                    for alloc in allocation_list
-                    if alloc["project"] == proj and alloc["domain"] == domain
-                )
-                val = total_demand - total_alloc
-                item = QTableWidgetItem(f"{val:.2f}")
-                if val > thresholds["output1_red"]:
-                    item.setBackground(Qt.GlobalColor.red)
-                elif val < thresholds["output1_blue"]:
-                    item.setBackground(Qt.GlobalColor.blue)
-                self.table.setItem(r, c + 3, item)
+    def set_expression(self):
+        expression = read_filter(self, self.filter_edit, "pair")
+        if expression is not False:
+            self.expression = expression
+            self.load_data()
+
+    def jump_to(self, row, col):
+        item = self.table.item(row, col)
+        if item is not None:
+            self.table.scrollToItem(item, QTableWidget.ScrollHint.PositionAtCenter)
+            self.table.setCurrentItem(item)
 
     def config(self):
-        dialog = ThresholdConfigDialog(self.staffing_data.data["thresholds"], self)
+        data = self.staffing_data.data
+        projects = {p["id"]: p["name"] for p in data["projects"]}
+        dialog = ThresholdConfigDialog(format_rules(data, "output1"), projects, self)
         if dialog.exec():
-            self.staffing_data.data["thresholds"].update(dialog.get_thresholds())
-            self.staffing_data.save()
+            self.staffing_data.set_setting("format_rules", dict(data.get("format_rules", {}), output1=dialog.get_rules()))
+            self.shown = None
             self.load_data()
 
     def save(self):
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Output data saved.")
 
-    def update_months(self, months):
-        self.months = months
-        headers = ["Project", "Domain", "Scaling"] + [format_month(m) for m in months]
-        self.table.setColumnCount(len(months) + 3)
+    def update_months(self, periods):
+        self.periods = periods
+        headers = ["Project", "Domain", "Scaling"] + [p.label for p in periods]
+        self.table.setColumnCount(len(periods) + 3)
         self.table.setHorizontalHeaderLabels(headers)
-        self.load_data()
+        self.shown = None
 
 class AvailabilityAllocationOutputTab(QWidget):
-    def __init__(self, staffing_data, months, set_months_callback, parent=None):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.months = months
+        self.periods = periods
         self.set_months_callback = set_months_callback
-        self.emps = self.staffing_data.data["employees"]
-        self.table = QTableWidget(len(self.emps), len(self.months))
-        self.table.setHorizontalHeaderLabels([format_month(m) for m in self.months])
-        self.table.setVerticalHeaderLabels([e["name"] for e in self.emps])
+        self.result = None
+        self.row_labels = None
+        self.shown = None
+        self.table = CopyTableWidget(0, len(self.periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in self.periods])
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        for i in range(len(self.months)):
+        for i in range(len(self.periods)):
             self.table.setColumnWidth(i, 50)
-        self.load_data()
+        self.minimap = MinimapView()
+        self.minimap.clicked.connect(self.jump_to)
+        self.expression = None
+        self.filter_edit = filter_edit(self.set_expression)
+        body = QHBoxLayout()
+        body.addWidget(self.table)
+        body.addWidget(self.minimap)
         layout = QVBoxLayout()
-        layout.addWidget(self.table)
+        layout.addWidget(self.filter_edit)
+        layout.addLayout(body)
         btns = QHBoxLayout()
         config_btn = QPushButton("Config")
         save_btn = QPushButton("Save")
@@ -1020,165 +3176,557 @@ class AvailabilityAllocationOutputTab(QWidget):
         layout.addLayout(btns)
         self.setLayout(layout)
 
+    def apply_result(self, result):
+        self.result = result
+        self.load_data()
+
     def load_data(self):
-        self.emps = self.staffing_data.data["employees"]
-        self.table.setRowCount(len(self.emps))
-        self.table.setVerticalHeaderLabels([e["name"] for e in self.emps])
-        allocations = self.staffing_data.data["allocation"]
-        thresholds = self.staffing_data.data["thresholds"]
-        avail = self.staffing_data.data["availability"]
-        for r, emp in enumerate(self.emps):
-            emp_id = emp["id"]
-            emp_avail = avail.get(emp_id, {})
-            alloc_by_month = {json_month(m): 0.0 for m in self.months}
-            for alloc in allocations:
-                if alloc["employee_id"] == emp_id:
-                    for m in self.months:
-                        mkey = json_month(m)
-                        alloc_by_month[mkey] += alloc.get("monthly_allocation", {}).get(mkey, 0.0)
-            for c, m in enumerate(self.months):
-                mkey = json_month(m)
-                val = emp_avail.get(mkey, 1.0) - alloc_by_month.get(mkey, 0.0)
-                item = QTableWidgetItem(f"{val:.2f}")
-                if val > thresholds["output2_red"]:
-                    item.setBackground(Qt.GlobalColor.red)
-                elif val < thresholds["output2_blue"]:
-                    item.setBackground(Qt.GlobalColor.blue)
-                self.table.setItem(r, c, item)
+        if not result_covers(self.result, self.periods):
+            return
+        rules = CompiledRules(format_rules(self.staffing_data.data, "output2"))
+        result = self.result
+        rows = np.arange(len(result.employees))
+        if self.expression is not None:
+            context = FilterContext(self.staffing_data, "employee", [e for (e, _) in result.employees], result.months, result)
+            rows = self.expression.select(context)
+        labels = [result.employees[i][1] for i in rows]
+        values = period_means(result.avail_alloc[rows], self.periods)
+        codes = rules.classify(values, period_means(result.availability[rows], self.periods),
+                               [result.employee_domains[i] for i in rows])
+        self.table.setUpdatesEnabled(False)
+        if labels != self.row_labels or self.shown is None or self.shown.shape != values.shape:
+            self.table.setRowCount(len(labels))
+            self.table.setVerticalHeaderLabels(labels)
+            changed = np.argwhere(np.ones(values.shape, dtype=bool))
+        else:
+            changed = np.argwhere((values != self.shown) | (codes != self.shown_codes))
+        for r, c in changed:
+            set_output_cell(self.table, r, c, values[r, c], rules.colour(codes[r, c]))
+        self.table.setUpdatesEnabled(True)
+        self.minimap.set_codes(codes, rules.palette)
+        self.row_labels = labels
+        self.shown = values
+        self.shown_codes = codes
+
+    def set_expression(self):
+        expression = read_filter(self, self.filter_edit, "employee")
+        if expression is not False:
+            self.expression = expression
+            self.load_data()
+
+    def jump_to(self, row, col):
+        item = self.table.item(row, col)
+        if item is not None:
+            self.table.scrollToItem(item, QTableWidget.ScrollHint.PositionAtCenter)
+            self.table.setCurrentItem(item)
 
     def config(self):
-        dialog = ThresholdConfigDialog(self.staffing_data.data["thresholds"], self)
+        data = self.staffing_data.data
+        projects = {p["id"]: p["name"] for p in data["projects"]}
+        dialog = ThresholdConfigDialog(format_rules(data, "output2"), projects, self)
         if dialog.exec():
-            self.staffing_data.data["thresholds"].update(dialog.get_thresholds())
-            self.staffing_data.save()
+            self.staffing_data.set_setting("format_rules", dict(data.get("format_rules", {}), output2=dialog.get_rules()))
+            self.shown = None
             self.load_data()
 
     def save(self):
         self.staffing_data.save()
         QMessageBox.information(self, "Save", "Output data saved.")
 
-    def update_months(self, months):
-        self.months = months
-        self.table.setColumnCount(len(months))
-        self.table.setHorizontalHeaderLabels([format_month(m) for m in months])
-        self.load_data()
+    def update_months(self, periods):
+        self.periods = periods
+        self.table.setColumnCount(len(periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in periods])
+        self.shown = None
 
-class ProjectsTab(QWidget):
-    def __init__(self, staffing_data, parent=None):
+class MetricsOutputTab(QWidget):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
         super().__init__(parent)
         self.staffing_data = staffing_data
-        self.parent_main = None
-        self.table = QTableWidget()
-        self.table.setColumnCount(2)
-        self.table.setHorizontalHeaderLabels(["Project Name", "Scaling Factor"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.periods = periods
+        self.set_months_callback = set_months_callback
+        self.result = None
+        # Set by the window: reruns the output job after the metric set changes
+        self.recompute = None
+        self.metric_combo = QComboBox()
+        self.metric_combo.currentIndexChanged.connect(self.load_data)
+        metric_layout = QHBoxLayout()
+        metric_layout.addWidget(QLabel("Metric:"))
+        metric_layout.addWidget(self.metric_combo)
+        metric_layout.addStretch()
+        self.table = CopyTableWidget(0, len(self.periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in self.periods])
         self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-        self.load_data()
+        for i in range(len(self.periods)):
+            self.table.setColumnWidth(i, 50)
         layout = QVBoxLayout()
+        layout.addLayout(metric_layout)
         layout.addWidget(self.table)
         btns = QHBoxLayout()
-        add_btn = QPushButton("Add")
-        edit_btn = QPushButton("Edit")
-        remove_btn = QPushButton("Remove")
+        config_btn = QPushButton("Config")
         save_btn = QPushButton("Save")
-        add_btn.clicked.connect(self.add_project)
-        edit_btn.clicked.connect(self.edit_project)
-        remove_btn.clicked.connect(self.remove_project)
+        prev_btn = QPushButton("<<")
+        next_btn = QPushButton(">>")
+        config_btn.clicked.connect(self.config)
         save_btn.clicked.connect(self.save)
-        btns.addWidget(add_btn)
-        btns.addWidget(edit_btn)
-        btns.addWidget(remove_btn)
+        prev_btn.clicked.connect(lambda: self.set_months_callback(-1))
+        next_btn.clicked.connect(lambda: self.set_months_callback(1))
+        btns.addWidget(config_btn)
+        btns.addWidget(prev_btn)
+        btns.addWidget(next_btn)
         btns.addWidget(save_btn)
         layout.addLayout(btns)
         self.setLayout(layout)
+        self.update_metrics()
 
-    def set_parent_main(self, parent_main):
-        self.parent_main = parent_main
-
-    def load_data(self):
-        self.table.setRowCount(0)
-        for entry in self.staffing_data.data["demand"]:
-            proj = entry["project"]
-            scaling = entry.get("scaling_factor", 1.0)
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(proj))
-            self.table.setItem(row, 1, QTableWidgetItem(str(scaling)))
+    def update_metrics(self):
+        current = self.metric_combo.currentData()
+        self.metric_combo.blockSignals(True)
+        self.metric_combo.clear()
+        for name in plan_metrics(self.staffing_data.data):
+            self.metric_combo.addItem(OUTPUT_METRICS[name][0], name)
+        idx = self.metric_combo.findData(current)
+        self.metric_combo.setCurrentIndex(idx if idx != -1 else 0)
+        self.metric_combo.blockSignals(False)
 
-    def add_project(self):
-        dialog = ProjectEditDialog(None, self)
-        if dialog.exec():
-            proj, scaling = dialog.get_project()
-            # Add a new entry for each domain
-            for domain in DOMAINS:
-                self.staffing_data.data["demand"].append({
-                    "project": proj,
-                    "domain": domain,
-                    "scaling_factor": scaling,
-                    "monthly_demand": {}
-                })
-            self.load_data()
-            if self.parent_main:
-                self.parent_main.demand_tab.refresh_project_dropdowns()
-                self.parent_main.allocation_tab.refresh_project_dropdowns()
-                self.parent_main.reload_outputs()
+    def apply_result(self, result):
+        self.result = result
+        self.load_data()
 
-    def edit_project(self):
-        row = self.table.currentRow()
-        if row < 0:
-            QMessageBox.warning(self, "Edit Project", "Select a project to edit.")
+    def load_data(self):
+        self.update_metrics()
+        name = self.metric_combo.currentData()
+        if not result_covers(self.result, self.periods) or name not in self.result.metrics:
             return
-        proj = self.table.item(row, 0).text()
-        scaling = float(self.table.item(row, 1).text())
-        dialog = ProjectEditDialog((proj, scaling), self)
-        if dialog.exec():
-            new_proj, new_scaling = dialog.get_project()
-            # Update all entries with this project name
-            for entry in self.staffing_data.data["demand"]:
-                if entry["project"] == proj:
-                    entry["project"] = new_proj
-                    entry["scaling_factor"] = new_scaling
-            self.load_data()
-            if self.parent_main:
-                self.parent_main.demand_tab.refresh_project_dropdowns()
-                self.parent_main.allocation_tab.refresh_project_dropdowns()
-                self.parent_main.reload_outputs()
+        labels, matrix = self.result.metrics[name]
+        values = period_means(matrix, self.periods)
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(labels))
+        self.table.setVerticalHeaderLabels(labels)
+        for r, c in np.ndindex(values.shape):
+            set_output_cell(self.table, r, c, values[r, c], None)
+        self.table.setUpdatesEnabled(True)
 
-    def remove_project(self):
-        row = self.table.currentRow()
-        if row < 0:
-            QMessageBox.warning(self, "Remove Project", "Select a project to remove.")
-            return
-        proj = self.table.item(row, 0).text()
-        reply = QMessageBox.question(self, "Remove Project", f"Remove all entries for project '{proj}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        if reply == QMessageBox.StandardButton.Yes:
-            self.staffing_data.data["demand"] = [d for d in self.staffing_data.data["demand"] if d["project"] != proj]
-            self.staffing_data.data["allocation"] = [a for a in self.staffing_data.data["allocation"] if a["project"] != proj]
-            self.load_data()
-            if self.parent_main:
-                self.parent_main.demand_tab.refresh_project_dropdowns()
-                self.parent_main.allocation_tab.refresh_project_dropdowns()
-                self.parent_main.reload_outputs()
+    def config(self):
+        dialog = MetricsConfigDialog(plan_metrics(self.staffing_data.data), self)
+        if dialog.exec():
+            self.staffing_data.set_setting("output_metrics", dialog.get_metrics())
+            self.update_metrics()
+            if self.recompute:
+                self.recompute()
 
     def save(self):
         self.staffing_data.save()
-        QMessageBox.information(self, "Save", "Project data saved.")
+        QMessageBox.information(self, "Save", "Output data saved.")
 
-class ProjectEditDialog(QDialog):
-    def __init__(self, project, parent=None):
+    def update_months(self, periods):
+        self.periods = periods
+        self.table.setColumnCount(len(periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in periods])
+
+class MetricsConfigDialog(QDialog):
+    def __init__(self, enabled, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Edit Project" if project else "Add Project")
+        self.setWindowTitle("Metrics")
         layout = QVBoxLayout()
-        self.name_edit = QLineEdit()
-        self.scaling_spin = QDoubleSpinBox()
-        self.scaling_spin.setDecimals(2)
-        self.scaling_spin.setRange(0, 100)
-        if project:
-            self.name_edit.setText(project[0])
-            self.scaling_spin.setValue(project[1])
-        layout.addWidget(QLabel("Project Name:"))
-        layout.addWidget(self.name_edit)
+        layout.addWidget(QLabel("Metrics computed with the outputs:"))
+        self.checks = {}
+        for name, (title, _) in OUTPUT_METRICS.items():
+            check = QCheckBox(title)
+            check.setChecked(name in enabled)
+            layout.addWidget(check)
+            self.checks[name] = check
+        btns = QHBoxLayout()
+        save_btn = QPushButton("Save")
+        cancel_btn = QPushButton("Cancel")
+        save_btn.clicked.connect(self.accept)
+        cancel_btn.clicked.connect(self.reject)
+        btns.addWidget(save_btn)
+        btns.addWidget(cancel_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def get_metrics(self):
+        return [name for name, check in self.checks.items() if check.isChecked()]
+
+class CostOutputTab(QWidget):
+    def __init__(self, staffing_data, periods, set_months_callback, parent=None):
+        super().__init__(parent)
+        self.staffing_data = staffing_data
+        self.periods = periods
+        self.set_months_callback = set_months_callback
+        self.result = None
+        # Set by the window: reruns the output job after the domain rates change
+        self.recompute = None
+        self.group_combo = QComboBox()
+        for group, label in COST_GROUPS.items():
+            self.group_combo.addItem(label, group)
+        self.group_combo.currentIndexChanged.connect(self.load_data)
+        self.hint = QLabel("No rates yet: add a rate history to employees or set domain rates.")
+        group_layout = QHBoxLayout()
+        group_layout.addWidget(QLabel("Cost by:"))
+        group_layout.addWidget(self.group_combo)
+        group_layout.addWidget(self.hint)
+        group_layout.addStretch()
+        self.table = CopyTableWidget(0, len(self.periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in self.periods])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        for i in range(len(self.periods)):
+            self.table.setColumnWidth(i, 70)
+        layout = QVBoxLayout()
+        layout.addLayout(group_layout)
+        layout.addWidget(self.table)
+        btns = QHBoxLayout()
+        rates_btn = QPushButton("Domain Rates...")
+        save_btn = QPushButton("Save")
+        prev_btn = QPushButton("<<")
+        next_btn = QPushButton(">>")
+        rates_btn.clicked.connect(self.edit_domain_rates)
+        save_btn.clicked.connect(self.save)
+        prev_btn.clicked.connect(lambda: self.set_months_callback(-1))
+        next_btn.clicked.connect(lambda: self.set_months_callback(1))
+        btns.addWidget(rates_btn)
+        btns.addWidget(prev_btn)
+        btns.addWidget(next_btn)
+        btns.addWidget(save_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def apply_result(self, result):
+        self.result = result
+        self.load_data()
+
+    def load_data(self):
+        if not result_covers(self.result, self.periods):
+            return
+        costs = self.result.costs.get(self.group_combo.currentData())
+        self.hint.setVisible(costs is None)
+        if costs is None:
+            self.table.setRowCount(0)
+            return
+        labels, matrix = costs
+        # Costs add up over a quarter or year rather than averaging
+        lengths = np.array([len(p.months) for p in self.periods])
+        values = period_means(np.vstack([matrix, matrix.sum(axis=0)]), self.periods) * lengths
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(labels) + 1)
+        self.table.setVerticalHeaderLabels(labels + ["Total"])
+        for r, c in np.ndindex(values.shape):
+            item = self.table.item(r, c)
+            if item is None:
+                item = QTableWidgetItem()
+                item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(r, c, item)
+            item.setText(f"{values[r, c]:,.0f}")
+        self.table.setUpdatesEnabled(True)
+
+    def edit_domain_rates(self):
+        data = self.staffing_data.data
+        dialog = DomainRatesDialog(data.get("domain_rates", {}), self)
+        if dialog.exec():
+            self.staffing_data.set_setting("domain_rates", dialog.get_rates() or None)
+            if self.recompute:
+                self.recompute()
+
+    def save(self):
+        self.staffing_data.save()
+        QMessageBox.information(self, "Save", "Output data saved.")
+
+    def update_months(self, periods):
+        self.periods = periods
+        self.table.setColumnCount(len(periods))
+        self.table.setHorizontalHeaderLabels([p.label for p in periods])
+
+class DomainRatesDialog(QDialog):
+    def __init__(self, domain_rates, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Domain Rates")
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Monthly rate used for employees without their own, as YYYY-MM=rate, ..."))
+        self.edits = {}
+        for domain in DOMAINS:
+            edit = QLineEdit(format_rates(domain_rates.get(domain)))
+            layout.addWidget(QLabel(f"{domain}:"))
+            layout.addWidget(edit)
+            self.edits[domain] = edit
+        btns = QHBoxLayout()
+        save_btn = QPushButton("Save")
+        cancel_btn = QPushButton("Cancel")
+        save_btn.clicked.connect(self.accept)
+        cancel_btn.clicked.connect(self.reject)
+        btns.addWidget(save_btn)
+        btns.addWidget(cancel_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def accept(self):
+        for domain, edit in self.edits.items():
+            try:
+                parse_rates(edit.text())
+            except ValueError as e:
+                QMessageBox.warning(self, "Domain Rates", f"{domain}: {e}")
+                return
+        super().accept()
+
+    def get_rates(self):
+        rates = {domain: parse_rates(edit.text()) for domain, edit in self.edits.items()}
+        return {domain: history for domain, history in rates.items() if history}
+
+class AvailabilitySearchDialog(QDialog):
+    # Searches the free capacity index; with a pick label it doubles as the
+    # allocation picker and returns the chosen employee
+    def __init__(self, index, domain=None, pick=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Find Available Staff")
+        self.resize(560, 480)
+        self.index = index
+        self.found = []
+        self.domain_combo = QComboBox()
+        self.domain_combo.addItem("All", None)
+        for name in sorted(set(DOMAINS) | set(index.domains())):
+            self.domain_combo.addItem(name or "(none)", name)
+        if domain in DOMAINS:
+            self.domain_combo.setCurrentIndex(self.domain_combo.findData(domain))
+        self.minimum_spin = QDoubleSpinBox()
+        self.minimum_spin.setDecimals(2)
+        self.minimum_spin.setRange(0, 10)
+        self.minimum_spin.setSingleStep(0.1)
+        self.minimum_spin.setValue(0.5)
+        self.first_combo = QComboBox()
+        self.last_combo = QComboBox()
+        for month in index.months:
+            label = format_month(datetime.strptime(month, MONTH_JSON_FORMAT))
+            self.first_combo.addItem(label, month)
+            self.last_combo.addItem(label, month)
+        self.last_combo.setCurrentIndex(self.last_combo.count() - 1)
+        for widget in (self.domain_combo, self.first_combo, self.last_combo):
+            widget.currentIndexChanged.connect(self.search)
+        self.minimum_spin.valueChanged.connect(self.search)
+        form = QHBoxLayout()
+        form.addWidget(QLabel("Domain:"))
+        form.addWidget(self.domain_combo)
+        form.addWidget(QLabel("Free FTE at least:"))
+        form.addWidget(self.minimum_spin)
+        form.addWidget(QLabel("From:"))
+        form.addWidget(self.first_combo)
+        form.addWidget(QLabel("To:"))
+        form.addWidget(self.last_combo)
+        self.table = CopyTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Employee", "Domain", "Lowest Free", "Mean Free"])
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.count_label = QLabel()
+        layout = QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.table)
+        layout.addWidget(self.count_label)
+        btns = QHBoxLayout()
+        if pick:
+            pick_btn = QPushButton(pick)
+            pick_btn.clicked.connect(self.accept)
+            self.table.cellDoubleClicked.connect(lambda row, col: self.accept())
+            btns.addWidget(pick_btn)
+        close_btn = QPushButton("Cancel" if pick else "Close")
+        close_btn.clicked.connect(self.reject)
+        btns.addWidget(close_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+        self.search()
+
+    def search(self):
+        first, last = self.first_combo.currentData(), self.last_combo.currentData()
+        if first is None or last is None:
+            self.count_label.setText("No computed outputs to search yet.")
+            return
+        if first > last:
+            self.table.setRowCount(0)
+            self.count_label.setText("The range ends before it starts.")
+            return
+        self.found = self.index.query(self.domain_combo.currentData(), self.minimum_spin.value(), first, last)
+        self.table.setUpdatesEnabled(False)
+        self.table.setRowCount(len(self.found))
+        for r, (_, name, domain, lowest, mean) in enumerate(self.found):
+            for c, text in enumerate([name, domain, f"{lowest:.2f}", f"{mean:.2f}"]):
+                item = QTableWidgetItem(text)
+                if c >= 2:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.table.setItem(r, c, item)
+        self.table.setUpdatesEnabled(True)
+        if self.found:
+            self.table.selectRow(0)
+        self.count_label.setText(f"{len(self.found)} employee(s) free for every month in the range")
+
+    def accept(self):
+        if self.table.currentRow() < 0:
+            QMessageBox.warning(self, "Find Available Staff", "Select an employee.")
+            return
+        super().accept()
+
+    def get_pick(self):
+        # Employee id, domain, FTE and the months it was found free for
+        employee_id, _, domain, _, _ = self.found[self.table.currentRow()]
+        first, last = self.first_combo.currentData(), self.last_combo.currentData()
+        return employee_id, domain, self.minimum_spin.value(), self.index.months[
+            self.index.months.index(first):self.index.months.index(last) + 1]
+
+class ProjectsTab(QWidget):
+    def __init__(self, staffing_data, parent=None):
+        super().__init__(parent)
+        self.staffing_data = staffing_data
+        self.table = QTableWidget()
+        self.table.setColumnCount(3)
+        self.table.setHorizontalHeaderLabels(["ID", "Project Name", "Scaling Factor"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.hideColumn(0)
+        self.load_data()
+        self.staffing_data.subscribe(self.on_events, ["project", "demand"])
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        btns = QHBoxLayout()
+        add_btn = QPushButton("Add")
+        edit_btn = QPushButton("Edit")
+        bulk_btn = QPushButton("Bulk Edit...")
+        remove_btn = QPushButton("Remove")
+        save_btn = QPushButton("Save")
+        add_btn.clicked.connect(self.add_project)
+        edit_btn.clicked.connect(self.edit_project)
+        bulk_btn.clicked.connect(self.bulk_edit)
+        remove_btn.clicked.connect(self.remove_project)
+        save_btn.clicked.connect(self.save)
+        btns.addWidget(add_btn)
+        btns.addWidget(edit_btn)
+        btns.addWidget(bulk_btn)
+        btns.addWidget(remove_btn)
+        btns.addWidget(save_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def load_data(self):
+        self.table.setRowCount(0)
+        projects = sorted(self.staffing_data.data["projects"], key=lambda p: p["name"])
+        for project in projects:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            self.fill_row(row, project)
+
+    def fill_row(self, row, project):
+        scaling = self.staffing_data.project_scaling(project["id"])
+        self.table.setItem(row, 0, QTableWidgetItem(project["id"]))
+        self.table.setItem(row, 1, QTableWidgetItem(project["name"]))
+        self.table.setItem(row, 2, QTableWidgetItem(str(scaling)))
+
+    def project_row(self, project_id):
+        return next((r for r in range(self.table.rowCount()) if self.table.item(r, 0).text() == project_id), -1)
+
+    def add_project(self):
+        dialog = ProjectEditDialog(None, self)
+        if dialog.exec():
+            proj, scaling = dialog.get_project()
+            if self.staffing_data.project_id(proj):
+                QMessageBox.warning(self, "Add Project", f"Project '{proj}' already exists.")
+                return
+            with self.staffing_data.transaction():
+                pid = self.staffing_data.add_project(proj)
+                # Add a new entry for each domain
+                for domain in DOMAINS:
+                    self.staffing_data.add_record("demand", {
+                        "project_id": pid,
+                        "domain": domain,
+                        "scaling_factor": scaling,
+                        "monthly_demand": {}
+                    })
+
+    def edit_project(self):
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Edit Project", "Select a project to edit.")
+            return
+        pid = self.table.item(row, 0).text()
+        proj = self.table.item(row, 1).text()
+        scaling = float(self.table.item(row, 2).text())
+        dialog = ProjectEditDialog((proj, scaling), self)
+        if dialog.exec():
+            new_proj, new_scaling = dialog.get_project()
+            other = self.staffing_data.project_id(new_proj)
+            if other and other != pid:
+                QMessageBox.warning(self, "Edit Project", f"Project '{new_proj}' already exists.")
+                return
+            with self.staffing_data.transaction():
+                self.staffing_data.rename_project(pid, new_proj)
+                self.staffing_data.set_project_scaling(pid, new_scaling)
+
+    def bulk_edit(self):
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Bulk Edit", "Select a project to edit.")
+            return
+        pid = self.table.item(row, 0).text()
+        refs = project_series_refs(self.staffing_data, pid)
+        demand = sum(kind == "demand" for kind, _ in refs)
+        scope = f"Project '{self.table.item(row, 1).text()}': {demand} demand and {len(refs) - demand} allocation rows"
+        run_bulk_edit(self, self.staffing_data, refs, scope)
+
+    def remove_project(self):
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Remove Project", "Select a project to remove.")
+            return
+        pid = self.table.item(row, 0).text()
+        proj = self.table.item(row, 1).text()
+        reply = QMessageBox.question(self, "Remove Project", f"Remove all entries for project '{proj}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.staffing_data.remove_project(pid)
+
+    def save(self):
+        self.staffing_data.save()
+        QMessageBox.information(self, "Save", "Project data saved.")
+
+    def on_events(self, events):
+        touched = set()
+        for event in events:
+            if event.kind == "project":
+                if isinstance(event, RecordAdded):
+                    names = [self.table.item(r, 1).text() for r in range(self.table.rowCount())]
+                    row = bisect.bisect(names, event.record["name"])
+                    self.table.insertRow(row)
+                    self.fill_row(row, event.record)
+                elif isinstance(event, RecordRemoved):
+                    row = self.project_row(event.key)
+                    if row >= 0:
+                        self.table.removeRow(row)
+                elif event.field == "name":
+                    row = self.project_row(event.key)
+                    if row >= 0:
+                        self.table.item(row, 1).setText(event.new)
+            elif not isinstance(event, CellChanged):
+                record = self.staffing_data.event_record(event)
+                if record is not None:
+                    touched.add(record["project_id"])
+                if isinstance(event, RecordUpdated) and event.field == "project_id":
+                    touched.add(event.old)
+        for project_id in touched:
+            row = self.project_row(project_id)
+            if row >= 0:
+                self.table.item(row, 2).setText(str(self.staffing_data.project_scaling(project_id)))
+
+class ProjectEditDialog(QDialog):
+    def __init__(self, project, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Project" if project else "Add Project")
+        layout = QVBoxLayout()
+        self.name_edit = QLineEdit()
+        self.scaling_spin = QDoubleSpinBox()
+        self.scaling_spin.setDecimals(2)
+        self.scaling_spin.setRange(0, 100)
+        if project:
+            self.name_edit.setText(project[0])
+            self.scaling_spin.setValue(project[1])
+        layout.addWidget(QLabel("Project Name:"))
+        layout.addWidget(self.name_edit)
         layout.addWidget(QLabel("Scaling Factor:"))
         layout.addWidget(self.scaling_spin)
         btns = QHBoxLayout()
@@ -1194,24 +3742,233 @@ class ProjectEditDialog(QDialog):
     def get_project(self):
         return self.name_edit.text(), self.scaling_spin.value()
 
+BULK_OPERATIONS = {"shift": "Shift by months", "scale": "Scale a month range", "zero": "Zero a month range"}
+BULK_SHIFT_LIMIT = 120
+
+def project_series_refs(staffing_data, project_id):
+    return ([("demand", key) for key in staffing_data.demand_by_project.get(project_id, {})] +
+            [("allocation", key) for key in staffing_data.allocation_by_project.get(project_id, {})])
+
+def plain_series(series):
+    return all(type(v) in (int, float) and len(m) == 7 and m[4] == "-" and m[:4].isdigit() and m[5:].isdigit()
+               for m, v in series.items())
+
+def bulk_edit(staffing_data, refs, operation, amount, first=None, last=None):
+    # The series become one dense matrix over the months in play, so shifting,
+    # scaling and zeroing are array slices; only the cells that differ are
+    # committed, in one transaction, so it is one undo step and one recompute.
+    # Series with text values or odd month keys are left for the Issues tab.
+    targets = [((kind, key), staffing_data.series(kind, key)) for kind, key in refs]
+    skipped = len(targets)
+    targets = [(ref, series) for ref, series in targets if plain_series(series)]
+    skipped -= len(targets)
+    if operation == "shift":
+        months = {m for _, series in targets for m in series}
+        if not months or not amount:
+            return 0, skipped
+        first, last = min(months), max(months)
+        first, last = min(first, add_months(first, amount)), max(last, add_months(last, amount))
+    elif first > last:
+        return 0, skipped
+    axis = month_range(first, month_span(first, last))
+    column = {m: c for c, m in enumerate(axis)}
+    sizes = [len(series) for _, series in targets]
+    total = sum(sizes)
+    rows = np.repeat(np.arange(len(targets)), sizes)
+    cols = np.fromiter((column.get(m, -1) for _, series in targets for m in series), np.intp, total)
+    values = np.fromiter((v for _, series in targets for v in series.values()), float, total)
+    inside = cols >= 0
+    old = np.zeros((len(targets), len(axis)))
+    present = np.zeros(old.shape, bool)
+    old[rows[inside], cols[inside]] = values[inside]
+    present[rows[inside], cols[inside]] = True
+    if operation == "shift":
+        # The axis is padded by the shift, so nothing falls off either end
+        new = np.zeros_like(old)
+        kept = np.zeros_like(present)
+        if amount > 0:
+            new[:, amount:], kept[:, amount:] = old[:, :-amount], present[:, :-amount]
+        else:
+            new[:, :amount], kept[:, :amount] = old[:, -amount:], present[:, -amount:]
+        sources = [dict(series) for _, series in targets]
+    elif operation == "scale":
+        new = np.round(old * amount, 9)
+        # Cells scaled onto the month default are dropped rather than stored
+        defaults = np.array([MONTH_DEFAULTS[kind] for (kind, _), _ in targets]).reshape(-1, 1)
+        kept = present & ((new != defaults) | (old == defaults))
+    else:
+        # Zeroed months are dropped, leaving the default of 0
+        new, kept = np.zeros_like(old), np.zeros_like(present)
+    changed = np.argwhere((kept != present) | (new != old)).tolist()
+    with staffing_data.transaction():
+        for r, c in changed:
+            (kind, key), series = targets[r]
+            month = axis[c]
+            if not kept[r, c]:
+                value = None
+            elif operation == "shift":
+                value = sources[r][axis[c - amount]]
+            else:
+                value = float(new[r, c])
+            staffing_data.commit(Change(kind, key, MONTHLY_FIELDS[kind], month, series.get(month), value))
+    return len(changed), skipped
+
+class BulkEditDialog(QDialog):
+    def __init__(self, scope, periods=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Bulk Edit")
+        if periods:
+            first, last = periods[0].months[0], periods[-1].months[-1]
+        else:
+            first = get_current_month()
+            last = add_months(first, 11)
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(scope))
+        self.operation_combo = QComboBox()
+        for operation, label in BULK_OPERATIONS.items():
+            self.operation_combo.addItem(label, operation)
+        self.shift_spin = QSpinBox()
+        self.shift_spin.setRange(-BULK_SHIFT_LIMIT, BULK_SHIFT_LIMIT)
+        self.shift_spin.setValue(1)
+        self.factor_spin = QDoubleSpinBox()
+        self.factor_spin.setDecimals(3)
+        self.factor_spin.setRange(0, 100)
+        self.factor_spin.setValue(1.0)
+        self.first_edit = QLineEdit(first)
+        self.last_edit = QLineEdit(last)
+        layout.addWidget(QLabel("Operation:"))
+        layout.addWidget(self.operation_combo)
+        layout.addWidget(QLabel("Shift (months, negative pulls in):"))
+        layout.addWidget(self.shift_spin)
+        layout.addWidget(QLabel("Scale Factor:"))
+        layout.addWidget(self.factor_spin)
+        layout.addWidget(QLabel("From Month (YYYY-MM):"))
+        layout.addWidget(self.first_edit)
+        layout.addWidget(QLabel("To Month (YYYY-MM):"))
+        layout.addWidget(self.last_edit)
+        self.operation_combo.currentIndexChanged.connect(self.update_fields)
+        self.update_fields()
+        btns = QHBoxLayout()
+        apply_btn = QPushButton("Apply")
+        cancel_btn = QPushButton("Cancel")
+        apply_btn.clicked.connect(self.accept)
+        cancel_btn.clicked.connect(self.reject)
+        btns.addWidget(apply_btn)
+        btns.addWidget(cancel_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def update_fields(self):
+        operation = self.operation_combo.currentData()
+        self.shift_spin.setEnabled(operation == "shift")
+        self.factor_spin.setEnabled(operation == "scale")
+        self.first_edit.setEnabled(operation != "shift")
+        self.last_edit.setEnabled(operation != "shift")
+
+    def accept(self):
+        operation = self.operation_combo.currentData()
+        if operation != "shift":
+            first, last = parse_month_key(self.first_edit.text()), parse_month_key(self.last_edit.text())
+            if first is None or last is None or first > last:
+                QMessageBox.warning(self, "Bulk Edit", "Enter a month range as YYYY-MM, earliest first.")
+                return
+        super().accept()
+
+    def get_edit(self):
+        operation = self.operation_combo.currentData()
+        if operation == "shift":
+            return operation, self.shift_spin.value(), None, None
+        amount = self.factor_spin.value() if operation == "scale" else 0.0
+        return operation, amount, parse_month_key(self.first_edit.text()), parse_month_key(self.last_edit.text())
+
+def run_bulk_edit(parent, staffing_data, refs, scope, periods=None):
+    dialog = BulkEditDialog(scope, periods, parent)
+    if not dialog.exec():
+        return
+    changed, skipped = bulk_edit(staffing_data, refs, *dialog.get_edit())
+    if skipped:
+        QMessageBox.warning(parent, "Bulk Edit",
+                            f"Skipped {skipped} row(s) with text values or malformed months; fix them in the Issues tab first.")
+    elif not changed:
+        QMessageBox.information(parent, "Bulk Edit", "Nothing to change.")
+
+ISSUE_REFRESH_MS = 200
+ISSUE_LIST_LIMIT = 2000
+
+class IssuesTab(QWidget):
+    counts_changed = pyqtSignal(int)
+
+    def __init__(self, staffing_data, validator, parent=None):
+        super().__init__(parent)
+        self.staffing_data = staffing_data
+        self.validator = validator
+        layout = QVBoxLayout()
+        top = QHBoxLayout()
+        self.rule_filter = QComboBox()
+        self.rule_filter.currentIndexChanged.connect(self.load_data)
+        self.summary = QLabel()
+        top.addWidget(self.rule_filter)
+        top.addWidget(self.summary, 1)
+        layout.addLayout(top)
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Rule", "Record", "Month", "Detail"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+        # Edits arrive in bursts; the list is rebuilt once they settle
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(ISSUE_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.load_data)
+        self.staffing_data.subscribe(lambda events: self.refresh_timer.start())
+        self.load_data()
+
+    def load_data(self):
+        counts = self.validator.counts
+        rule = self.rule_filter.currentData()
+        self.rule_filter.blockSignals(True)
+        self.rule_filter.clear()
+        self.rule_filter.addItem(f"All rules ({sum(counts.values())})", None)
+        for name, title in VALIDATION_RULES.items():
+            self.rule_filter.addItem(f"{title} ({counts[name]})", name)
+        self.rule_filter.setCurrentIndex(max(self.rule_filter.findData(rule), 0))
+        self.rule_filter.blockSignals(False)
+        self.summary.setText(self.validator.summary())
+        order = list(VALIDATION_RULES)
+        issues = [i for i in self.validator.all_issues() if rule is None or i.rule == rule]
+        issues.sort(key=lambda i: (order.index(i.rule), i.kind, i.key, i.month or ""))
+        shown = issues[:ISSUE_LIST_LIMIT]
+        self.table.setRowCount(len(shown))
+        for row, issue in enumerate(shown):
+            self.table.setItem(row, 0, QTableWidgetItem(VALIDATION_RULES[issue.rule]))
+            self.table.setItem(row, 1, QTableWidgetItem(self.validator.describe(issue)))
+            self.table.setItem(row, 2, QTableWidgetItem(issue.month or ""))
+            self.table.setItem(row, 3, QTableWidgetItem(issue.message))
+        if len(issues) > len(shown):
+            self.summary.setText(f"{self.validator.summary()} (showing first {len(shown)})")
+        self.counts_changed.emit(sum(counts.values()))
+
 class StaffingApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, filename="staffing_data.json", publish=None):
         super().__init__()
         self.setWindowTitle("Staffing Demand vs Availability Tracker")
         self.resize(1200, 700)
-        self.staffing_data = StaffingData()
+        self.staffing_data = StaffingData(filename, stream=True)
         self.current_month = get_current_month()
-        self.month_window = 12
-        self.months = get_next_months(self.current_month, self.month_window)
+        self.month_window = HORIZONS[0]
+        self.resolution = "month"
+        self.build_periods()
         self.tabs = QTabWidget()
         self.projects_tab = ProjectsTab(self.staffing_data)
         self.employee_tab = EmployeeTab(self.staffing_data)
-        self.availability_tab = AvailabilityTab(self.staffing_data, self.months, self.shift_months)
-        self.demand_tab = DemandTab(self.staffing_data, self.months, self.shift_months)
-        self.allocation_tab = AllocationTab(self.staffing_data, self.months, self.shift_months)
-        self.demand_alloc_output_tab = DemandAllocationOutputTab(self.staffing_data, self.months, self.shift_months)
-        self.avail_alloc_output_tab = AvailabilityAllocationOutputTab(self.staffing_data, self.months, self.shift_months)
-        self.projects_tab.set_parent_main(self)
+        self.availability_tab = AvailabilityTab(self.staffing_data, self.periods, self.shift_months)
+        self.demand_tab = DemandTab(self.staffing_data, self.periods, self.shift_months)
+        self.allocation_tab = AllocationTab(self.staffing_data, self.periods, self.shift_months)
+        self.demand_alloc_output_tab = DemandAllocationOutputTab(self.staffing_data, self.periods, self.shift_months)
+        self.avail_alloc_output_tab = AvailabilityAllocationOutputTab(self.staffing_data, self.periods, self.shift_months)
+        self.metrics_tab = MetricsOutputTab(self.staffing_data, self.periods, self.shift_months)
+        self.cost_tab = CostOutputTab(self.staffing_data, self.periods, self.shift_months)
         self.tabs.addTab(self.projects_tab, "Projects")
         self.tabs.addTab(self.employee_tab, "Employees")
         self.tabs.addTab(self.availability_tab, "Availability")
@@ -1219,49 +3976,2461 @@ class StaffingApp(QMainWindow):
         self.tabs.addTab(self.allocation_tab, "Allocation")
         self.tabs.addTab(self.demand_alloc_output_tab, "Out: Demand-Allocation")
         self.tabs.addTab(self.avail_alloc_output_tab, "Out: Availability-Allocation")
+        self.tabs.addTab(self.metrics_tab, "Out: Metrics")
+        self.tabs.addTab(self.cost_tab, "Out: Cost")
+        self.validator = PlanValidator(self.staffing_data)
+        self.issues_tab = IssuesTab(self.staffing_data, self.validator)
+        self.issues_tab.counts_changed.connect(self.update_issue_count)
+        self.tabs.addTab(self.issues_tab, "Issues")
+        self.update_issue_count(sum(self.validator.counts.values()))
         self.setCentralWidget(self.tabs)
-        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self.mark_current_period()
+
+        file_menu = self.menuBar().addMenu("&File")
+        import_action = QAction("&Import CSV...", self)
+        import_action.triggered.connect(self.import_csv)
+        file_menu.addAction(import_action)
+        history_action = QAction("&History...", self)
+        history_action.triggered.connect(self.show_history)
+        file_menu.addAction(history_action)
+        dashboard_action = QAction("Export &Dashboard...", self)
+        dashboard_action.triggered.connect(self.export_dashboard)
+        file_menu.addAction(dashboard_action)
+        self.compact_action = QAction("&Compact Save", self, checkable=True)
+        self.compact_action.setChecked(self.staffing_data.save_format == "compact")
+        self.compact_action.setEnabled(self.staffing_data.save_format != "columnar")
+        self.compact_action.toggled.connect(self.set_compact_save)
+        file_menu.addAction(self.compact_action)
+
+        edit_menu = self.menuBar().addMenu("&Edit")
+        self.undo_action = QAction("&Undo", self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(self.staffing_data.undo)
+        self.redo_action = QAction("&Redo", self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(self.staffing_data.redo)
+        edit_menu.addAction(self.undo_action)
+        edit_menu.addAction(self.redo_action)
+        self.update_undo_actions()
+
+        view_menu = self.menuBar().addMenu("&View")
+        resolution_group = QActionGroup(self)
+        for resolution, label in [("month", "&Months"), ("quarter", "&Quarters"), ("year", "Fiscal &Years")]:
+            action = QAction(label, self, checkable=True, checked=resolution == self.resolution)
+            action.triggered.connect(lambda _, r=resolution: self.set_view(resolution=r))
+            resolution_group.addAction(action)
+            view_menu.addAction(action)
+        view_menu.addSeparator()
+        horizon_group = QActionGroup(self)
+        for months in HORIZONS:
+            action = QAction(f"{months} Month Horizon", self, checkable=True, checked=months == self.month_window)
+            action.triggered.connect(lambda _, m=months: self.set_view(window=m))
+            horizon_group.addAction(action)
+            view_menu.addAction(action)
+        view_menu.addSeparator()
+        fiscal_action = QAction("Fiscal Year Start...", self)
+        fiscal_action.triggered.connect(self.edit_fiscal_start)
+        view_menu.addAction(fiscal_action)
+        view_menu.addSeparator()
+        available_action = QAction("Find &Available Staff...", self)
+        available_action.triggered.connect(self.find_available)
+        view_menu.addAction(available_action)
+        memory_action = QAction("Memory &Report...", self)
+        memory_action.triggered.connect(lambda: MemoryDialog(self, self).exec())
+        view_menu.addAction(memory_action)
+
+        self.staffing_data.subscribe(lambda events: self.update_undo_actions())
+        self.staffing_data.subscribe(self.on_settings, ["plan"])
+
+        self.output_scheduler = OutputScheduler(self.staffing_data, self.months, self)
+        self.output_scheduler.results_ready.connect(self.demand_alloc_output_tab.apply_result)
+        self.output_scheduler.results_ready.connect(self.avail_alloc_output_tab.apply_result)
+        self.output_scheduler.results_ready.connect(self.metrics_tab.apply_result)
+        self.metrics_tab.recompute = lambda: self.output_scheduler.schedule(0)
+        self.output_scheduler.results_ready.connect(self.cost_tab.apply_result)
+        self.cost_tab.recompute = lambda: self.output_scheduler.schedule(0)
+        self.free_capacity = FreeCapacityIndex()
+        self.output_scheduler.results_ready.connect(self.free_capacity.update)
+        self.allocation_tab.free_capacity = self.current_free_capacity
+        self.output_scheduler.schedule(0)
+        self.publisher = None
+        if publish:
+            try:
+                self.publisher = OutputPublisher(publish)
+            except OSError as e:
+                QMessageBox.warning(self, "Publish Outputs", f"Could not share outputs as {publish}: {e}")
+            else:
+                self.output_scheduler.results_ready.connect(self.publish_outputs)
+                self.statusBar().showMessage(f"Publishing outputs as {publish}", 5000)
+
+        self.file_watcher = QFileSystemWatcher([os.path.abspath(self.staffing_data.filename)], self)
+        self.file_watcher.fileChanged.connect(self.on_file_changed)
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(RELOAD_DEBOUNCE_MS)
+        self.reload_timer.timeout.connect(self.reload_from_disk)
+
+        if self.staffing_data.loading:
+            self.start_loading()
+
+    def start_loading(self):
+        # Tabs open as soon as the sections they show have arrived
+        self.tab_sections = {
+            self.employee_tab: {"employees"},
+            self.projects_tab: {"projects"},
+            self.availability_tab: {"employees", "availability"},
+            self.demand_tab: {"projects", "demand"},
+            self.allocation_tab: {"employees", "projects", "allocation"},
+        }
+        self.loaded_sections = set()
+        for i in range(self.tabs.count()):
+            self.tabs.setTabEnabled(i, False)
+        self.load_label = QLabel("Loading plan...")
+        self.load_progress = QProgressBar()
+        self.load_progress.setRange(0, 100)
+        self.statusBar().addPermanentWidget(self.load_label)
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.load_signals = PlanLoadSignals()
+        self.load_signals.section.connect(self.on_section_loaded)
+        self.load_signals.progress.connect(self.load_progress.setValue)
+        self.load_signals.finished.connect(self.on_load_finished)
+        self.load_signals.failed.connect(self.on_load_failed)
+        self.load_job = PlanLoadJob(self.staffing_data.filename, self.load_signals)
+        QThreadPool.globalInstance().start(self.load_job)
+
+    def on_section_loaded(self, section, items, complete):
+        sd = self.staffing_data
+        sd.load_section(section, items, complete)
+        self.load_label.setText(f"Loading {section}...")
+        if not complete:
+            return
+        self.loaded_sections.add(section)
+        for tab, sections in list(self.tab_sections.items()):
+            if sections <= self.loaded_sections and all(sd.section_ready(key) for key in RECORD_LISTS.values()):
+                del self.tab_sections[tab]
+                tab.load_data()
+                self.tabs.setTabEnabled(self.tabs.indexOf(tab), True)
+
+    def on_load_finished(self, payload):
+        sd = self.staffing_data
+        sd.finish_loading(*payload)
+        for tab in list(self.tab_sections) + [self.projects_tab]:
+            tab.load_data()
+        self.tab_sections = {}
+        for i in range(self.tabs.count()):
+            self.tabs.setTabEnabled(i, True)
+        self.validator.check_all()
+        self.issues_tab.load_data()
+        self.output_scheduler.vectors.clear()
+        self.output_scheduler.schedule(0)
+        self.statusBar().removeWidget(self.load_label)
+        self.statusBar().removeWidget(self.load_progress)
+        self.statusBar().showMessage(f"Loaded {sd.filename}", 3000)
+
+    def on_load_failed(self, message):
+        # The plan stays in loading state so the partial copy is never saved over the file
+        self.load_label.setText("Load failed; saving is disabled")
+        QMessageBox.critical(self, "Open Plan", f"Could not read {self.staffing_data.filename}: {message}")
+
+    def on_file_changed(self, path):
+        # Editors and sync tools often replace the file, which drops the watch
+        if path not in self.file_watcher.files() and os.path.exists(path):
+            self.file_watcher.addPath(path)
+        self.reload_timer.start()
+
+    def reload_from_disk(self):
+        path = os.path.abspath(self.staffing_data.filename)
+        if not os.path.exists(path) or self.staffing_data.loading:
+            return
+        if path not in self.file_watcher.files():
+            self.file_watcher.addPath(path)
+        try:
+            conflicts = self.staffing_data.sync_from_disk()
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, "Reload Failed", f"Could not read {path}: {e}")
+            return
+        if conflicts:
+            lines = [" / ".join(str(part) for part in c if part is not None) for c in conflicts[:20]]
+            QMessageBox.warning(
+                self, "Reload Conflicts",
+                "The file changed on disk where you have unsaved edits; your values were kept:\n"
+                + "\n".join(lines))
+
+    def import_csv(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import CSV", "", "CSV files (*.csv);;All files (*)")
+        if not path:
+            return
+        kind, ok = QInputDialog.getItem(self, "Import CSV", "The file contains:", list(IMPORT_KEYS), 0, False)
+        if not ok:
+            return
+        try:
+            feed = CsvImport(self.staffing_data, kind).read(path)
+        except (OSError, ValueError, csv.Error) as e:
+            QMessageBox.warning(self, "Import CSV", str(e))
+            return
+        reply = QMessageBox.question(
+            self, "Import CSV", feed.describe() + "\n\nApply this import?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            feed.apply()
+
+    def show_history(self):
+        sd = self.staffing_data
+        if sd.history is None:
+            reply = QMessageBox.question(
+                self, "Plan History", "History is not enabled for this plan. Start recording a version on every save?",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+            sd.history = PlanHistory.init(history_dir(sd.filename))
+            sd.history.attach(sd)
+            sd.save("history enabled")
+        dialog = HistoryDialog(sd.history, self)
+        if dialog.exec() and dialog.selected_version():
+            version = dialog.selected_version()
+            sd.restore(sd.history.read(version))
+
+    def publish_outputs(self, result):
+        if result_covers(result, self.periods):
+            self.publisher.publish(result, self.staffing_data.data, self.periods)
+
+    def closeEvent(self, event):
+        if self.publisher is not None:
+            self.publisher.close()
+        super().closeEvent(event)
+
+    def memory_report(self):
+        return MemoryReport(self.staffing_data, {
+            "output vectors": lambda: self.output_scheduler.vectors,
+            "output result": lambda: self.output_scheduler.result,
+            "validation issues": lambda: self.validator.issues,
+        }, {self.tabs.tabText(i).split(" (")[0]: self.tabs.widget(i) for i in range(self.tabs.count())})
+
+    def reload_tabs(self):
+        for i in range(self.tabs.count()):
+            self.tabs.widget(i).load_data()
+
+    def settle(self, action):
+        # Outputs are recomputed and replaced widgets deleted in place so measurements include them
+        action()
+        self.output_scheduler.compute_now()
+        QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete.value)
+
+    def update_issue_count(self, count):
+        self.tabs.setTabText(self.tabs.indexOf(self.issues_tab), f"Issues ({count})" if count else "Issues")
+
+    def set_compact_save(self, compact):
+        self.staffing_data.save_format = "compact" if compact else "json"
+        self.staffing_data.save()
+
+    def update_undo_actions(self):
+        self.undo_action.setEnabled(self.staffing_data.undo_stack.can_undo())
+        self.redo_action.setEnabled(self.staffing_data.undo_stack.can_redo())
 
-        self.availability_tab.table.cellChanged.connect(self.reload_outputs)
-        self.demand_tab.table.cellChanged.connect(self.reload_outputs)
-        self.allocation_tab.table.cellChanged.connect(self.reload_outputs)
+    def build_periods(self):
+        fiscal_start = self.staffing_data.data.get("fiscal_year_start", 1)
+        self.periods = build_periods(self.current_month, self.month_window, self.resolution, fiscal_start)
+        self.months = [datetime.strptime(m, MONTH_JSON_FORMAT) for p in self.periods for m in p.months]
 
     def shift_months(self, delta):
-        dt = datetime.strptime(self.current_month, MONTH_JSON_FORMAT)
-        month = dt.month + delta
-        year = dt.year
-        if month < 1:
-            month = 12
-            year -= 1
-        elif month > 12:
-            month = 1
-            year += 1
-        dt = dt.replace(year=year, month=month)
-        self.current_month = dt.strftime(MONTH_JSON_FORMAT)
-        self.months = get_next_months(self.current_month, self.month_window)
-        self.availability_tab.update_months(self.months)
-        self.demand_tab.update_months(self.months)
-        self.allocation_tab.update_months(self.months)
-        self.demand_alloc_output_tab.update_months(self.months)
-        self.avail_alloc_output_tab.update_months(self.months)
-        self.reload_outputs()
-
-    def on_tab_changed(self, idx):
-        widget = self.tabs.widget(idx)
-        if widget == self.demand_tab:
-            self.demand_tab.refresh_project_dropdowns()
-        elif widget == self.allocation_tab:
-            self.allocation_tab.refresh_project_dropdowns()
-
-    def reload_outputs(self):
-        self.demand_alloc_output_tab.load_data()
-        self.avail_alloc_output_tab.load_data()
+        # The arrows move by one column at the current resolution
+        self.current_month = add_months(self.current_month, delta * RESOLUTIONS[self.resolution])
+        self.update_periods()
+
+    def set_view(self, resolution=None, window=None):
+        self.resolution = resolution or self.resolution
+        self.month_window = window or self.month_window
+        self.update_periods()
+
+    def current_outputs(self, title):
+        # Catch up on edits still waiting for the idle recompute
+        scheduler = self.output_scheduler
+        if self.staffing_data.loading:
+            QMessageBox.warning(self, title, "Wait for the plan to finish loading.")
+            return None
+        if scheduler.timer.isActive() or scheduler.job is not None or scheduler.result is None:
+            try:
+                scheduler.compute_now()
+            except ValueError as e:
+                QMessageBox.warning(self, title, f"Could not compute the outputs: {e}. Fix it in the Issues tab.")
+                return None
+        return scheduler.result
+
+    def current_free_capacity(self):
+        return self.free_capacity if self.current_outputs("Find Available") is not None else None
+
+    def export_dashboard(self):
+        directory = QFileDialog.getExistingDirectory(self, "Export Dashboard")
+        if not directory:
+            return
+        result = self.current_outputs("Export Dashboard")
+        if result is None:
+            return
+        try:
+            files, size = export_site(self.staffing_data, result, self.periods, directory)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Export Dashboard", str(e))
+            return
+        QMessageBox.information(self, "Export Dashboard",
+                                f"Wrote {files} files ({format_bytes(size)}). The page fetches its data, so open it "
+                                "from GitHub Pages or any web server rather than straight from disk.")
+
+    def find_available(self):
+        index = self.current_free_capacity()
+        if index is not None:
+            AvailabilitySearchDialog(index, parent=self).exec()
+
+    def edit_fiscal_start(self):
+        data = self.staffing_data.data
+        month, ok = QInputDialog.getInt(self, "Fiscal Year Start", "First month of the fiscal year (1-12):",
+                                        data.get("fiscal_year_start", 1), 1, 12)
+        if ok:
+            # The periods follow through on_settings, as they do on undo
+            self.staffing_data.set_setting("fiscal_year_start", month)
+
+    def on_settings(self, events):
+        if any(event.key == "fiscal_year_start" for event in events):
+            self.update_periods()
+
+    def update_periods(self):
+        self.build_periods()
+        self.availability_tab.update_months(self.periods)
+        self.demand_tab.update_months(self.periods)
+        self.allocation_tab.update_months(self.periods)
+        self.demand_alloc_output_tab.update_months(self.periods)
+        self.avail_alloc_output_tab.update_months(self.periods)
+        self.metrics_tab.update_months(self.periods)
+        self.cost_tab.update_months(self.periods)
+        self.mark_current_period()
+        self.output_scheduler.set_months(self.months)
+
+    def mark_current_period(self):
+        # Quarter and year views can open a few months before the current one
+        index = period_index(self.periods, self.current_month)
+        label = self.periods[index].label if index is not None else None
+        for tab in (self.availability_tab, self.demand_tab, self.allocation_tab, self.demand_alloc_output_tab,
+                    self.avail_alloc_output_tab, self.metrics_tab, self.cost_tab):
+            mark_period_header(tab.table, label)
+
+IMPORT_CHUNK_ROWS = 20000
+IMPORT_KEYS = {
+    "availability": ["employee"],
+    "demand": ["project", "domain"],
+    "allocation": ["employee", "project", "domain"]
+}
+IMPORT_VALUE_COLUMNS = ["fte", "value", "allocation", "demand", "availability"]
+IMPORT_MONTH_FORMATS = [MONTH_JSON_FORMAT, "%Y-%m-%d", "%Y/%m", "%m/%Y", MONTH_FORMAT, "%B %Y"]
+
+def parse_month_key(text):
+    text = text.strip()
+    for fmt in IMPORT_MONTH_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime(MONTH_JSON_FORMAT)
+        except ValueError:
+            pass
+    return None
+
+def coerce_values(texts):
+    try:
+        values = np.asarray(texts, dtype=np.float64)
+    except ValueError:
+        values = np.empty(len(texts))
+        for i, text in enumerate(texts):
+            try:
+                values[i] = float(text)
+            except ValueError:
+                values[i] = np.nan
+    return values, np.isfinite(values) & (values >= 0)
+
+class CsvImport:
+    # Reads availability/demand/allocation feeds in either long form
+    # (one row per key and month) or wide form (one column per month)
+    def __init__(self, staffing_data, kind, chunk_rows=IMPORT_CHUNK_ROWS):
+        if kind not in IMPORT_KEYS:
+            raise ValueError(f"cannot import {kind!r}; expected one of {', '.join(IMPORT_KEYS)}")
+        self.staffing_data = staffing_data
+        self.kind = kind
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.rejected = []
+        self.values = {}
+        sd = staffing_data
+        self.employee_ids = {e["name"].casefold(): e["id"] for e in sd.data["employees"]}
+        self.employee_ids.update({key.casefold(): key for key in sd.records["employee"]})
+        self.project_ids = {name.casefold(): pid for name, pid in sd.project_ids_by_name.items()}
+        self.project_ids.update({key.casefold(): key for key in sd.records["project"]})
+        self.domains = {d.casefold(): d for d in DOMAINS}
+        self.months = {}
+
+    def read(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            header = [h.strip().casefold() for h in next(reader, [])]
+            missing = [c for c in IMPORT_KEYS[self.kind] if c not in header]
+            if missing:
+                raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+            key_cols = [header.index(c) for c in IMPORT_KEYS[self.kind]]
+            value_col = next((header.index(c) for c in IMPORT_VALUE_COLUMNS if c in header), None)
+            if "month" in header:
+                if value_col is None:
+                    raise ValueError(f"{path}: missing value column ({' or '.join(IMPORT_VALUE_COLUMNS)})")
+                month_cols = None
+                month_col = header.index("month")
+            else:
+                month_cols = [(i, parse_month_key(h)) for i, h in enumerate(header) if parse_month_key(h)]
+                if not month_cols:
+                    raise ValueError(f"{path}: no month column and no month-named columns")
+            line = 1
+            while True:
+                chunk = list(islice(reader, self.chunk_rows))
+                if not chunk:
+                    break
+                if month_cols is None:
+                    self.read_long(chunk, line + 1, key_cols, month_col, value_col)
+                else:
+                    self.read_wide(chunk, line + 1, key_cols, month_cols)
+                line += len(chunk)
+                self.rows += len(chunk)
+        return self
+
+    def resolve(self, rows, first_line, key_cols):
+        # One lookup per distinct key in the chunk instead of one per row
+        keys = [tuple(row[c].strip() if c < len(row) else "" for c in key_cols) for row in rows]
+        resolved = {}
+        for key in set(keys):
+            resolved[key] = self.resolve_key(key)
+        targets = []
+        for i, key in enumerate(keys):
+            target = resolved[key]
+            if isinstance(target, str):
+                self.rejected.append((first_line + i, target))
+                targets.append(None)
+            else:
+                targets.append(target)
+        return targets
+
+    def resolve_key(self, key):
+        names = dict(zip(IMPORT_KEYS[self.kind], key))
+        target = []
+        if "employee" in names:
+            emp_id = self.employee_ids.get(names["employee"].casefold())
+            if emp_id is None:
+                return f"unknown employee {names['employee']!r}"
+            target.append(emp_id)
+        if "project" in names:
+            pid = self.project_ids.get(names["project"].casefold())
+            if pid is None:
+                return f"unknown project {names['project']!r}"
+            target.append(pid)
+        if "domain" in names:
+            domain = self.domains.get(names["domain"].casefold())
+            if domain is None:
+                return f"unknown domain {names['domain']!r}"
+            target.append(domain)
+        return tuple(target)
+
+    def month_key(self, text):
+        if text not in self.months:
+            self.months[text] = parse_month_key(text)
+        return self.months[text]
+
+    def read_long(self, rows, first_line, key_cols, month_col, value_col):
+        targets = self.resolve(rows, first_line, key_cols)
+        months = [self.month_key(row[month_col]) if month_col < len(row) else None for row in rows]
+        values, valid = coerce_values([row[value_col] if value_col < len(row) else "" for row in rows])
+        for i, target in enumerate(targets):
+            if target is None:
+                continue
+            if months[i] is None:
+                self.rejected.append((first_line + i, f"bad month {rows[i][month_col] if month_col < len(rows[i]) else ''!r}"))
+            elif not valid[i]:
+                self.rejected.append((first_line + i, f"bad value {rows[i][value_col] if value_col < len(rows[i]) else ''!r}"))
+            else:
+                self.values.setdefault(target, {})[months[i]] = float(values[i])
+
+    def read_wide(self, rows, first_line, key_cols, month_cols):
+        targets = self.resolve(rows, first_line, key_cols)
+        width = max(i for i, _ in month_cols) + 1
+        cells = [row + [""] * (width - len(row)) if len(row) < width else row for row in rows]
+        for col, month in month_cols:
+            texts = [row[col].strip() for row in cells]
+            present = np.array([bool(t) for t in texts])
+            values, valid = coerce_values([t if t else "0" for t in texts])
+            for i in np.flatnonzero(present & ~valid):
+                if targets[i] is not None:
+                    self.rejected.append((first_line + i, f"bad value {texts[i]!r} for {month}"))
+            for i in np.flatnonzero(present & valid):
+                if targets[i] is not None:
+                    self.values.setdefault(targets[i], {})[month] = float(values[i])
+
+    def record_ids(self):
+        sd = self.staffing_data
+        if self.kind == "availability":
+            return {(emp_id,): emp_id for emp_id in sd.records["employee"]}
+        if self.kind == "demand":
+            return {(d["project_id"], d["domain"]): d["id"] for d in reversed(sd.data["demand"])}
+        return {(a["employee_id"], a["project_id"], a["domain"]): a["id"] for a in reversed(sd.data["allocation"])}
+
+    def report(self):
+        sd = self.staffing_data
+        ids = self.record_ids()
+        counts = {"records_added": 0, "cells_added": 0, "cells_updated": 0, "unchanged": 0}
+        for target, months in self.values.items():
+            key = ids.get(target)
+            if key is None:
+                counts["records_added"] += 1
+                counts["cells_added"] += len(months)
+                continue
+            record = sd.get_record(self.kind, key) or {}
+            series = record if self.kind == "availability" else record.get(MONTHLY_FIELDS[self.kind], {})
+            for month, value in months.items():
+                old = series.get(month)
+                if old is None:
+                    counts["cells_added"] += 1
+                elif old != value:
+                    counts["cells_updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+        counts["rejected"] = len(self.rejected)
+        counts["rows"] = self.rows
+        return counts
+
+    def describe(self, limit=20):
+        counts = self.report()
+        lines = [
+            f"{counts['rows']} rows read",
+            f"{counts['records_added']} new {self.kind} records",
+            f"{counts['cells_added']} months added, {counts['cells_updated']} updated, {counts['unchanged']} unchanged",
+            f"{counts['rejected']} rows rejected"
+        ]
+        lines += [f"  line {line}: {reason}" for line, reason in self.rejected[:limit]]
+        if len(self.rejected) > limit:
+            lines.append(f"  ... {len(self.rejected) - limit} more")
+        return "\n".join(lines)
+
+    def apply(self):
+        sd = self.staffing_data
+        ids = self.record_ids()
+        monthly = MONTHLY_FIELDS[self.kind]
+        with sd.transaction():
+            for target, months in self.values.items():
+                key = ids.get(target)
+                if key is None and self.kind == "demand":
+                    sd.add_record("demand", {"project_id": target[0], "domain": target[1],
+                                             "scaling_factor": 1.0, monthly: dict(months)})
+                elif key is None:
+                    sd.add_record("allocation", {"employee_id": target[0], "project_id": target[1],
+                                                 "domain": target[2], monthly: dict(months)})
+                else:
+                    # A missing series is created as an edit of its own so undo removes it again
+                    record = sd.get_record(self.kind, key)
+                    if record is None:
+                        sd.add_record("availability", {"id": key})
+                    elif self.kind != "availability" and monthly not in record:
+                        sd.set_field(self.kind, key, monthly, {})
+                    series = sd.series(self.kind, key)
+                    for month, value in months.items():
+                        old = series.get(month)
+                        if old != value:
+                            sd.commit(Change(self.kind, key, monthly, month, old, value))
+
+COLUMNAR_MAGIC = b"SPLNCOL1"
+COLUMNAR_SUFFIX = ".plancol"
+COLUMNAR_ALIGN = 64
+COLUMNAR_BLOCKS = {"availability": "availability", "demand": "demand", "allocation": "allocation"}
+
+COMPACT_FORMAT = "staffplanner-compact"
+COMPACT_VERSION = 1
+# Moderate levels: the top presets cost several times the save for a few percent
+COMPRESSORS = {
+    ".gz": lambda f: gzip.open(f, "wb", compresslevel=6),
+    ".xz": lambda f: lzma.open(f, "wb", preset=2),
+}
+COMPRESSED_MAGIC = {b"\x1f\x8b": gzip, b"\xfd7zXZ\x00": lzma}
+
+def plan_save_format(filename):
+    if filename.endswith(COLUMNAR_SUFFIX):
+        return "columnar"
+    return "compact" if os.path.splitext(filename)[1] in COMPRESSORS else "json"
+
+def decode_plan(raw):
+    # Any saved form of a plan -> (plan dict, format it was saved in)
+    for magic, module in COMPRESSED_MAGIC.items():
+        if raw.startswith(magic):
+            raw = module.decompress(raw)
+            break
+    if raw.startswith(COLUMNAR_MAGIC):
+        return ColumnarPlan(raw).to_plan(), "columnar"
+    data = json.loads(raw)
+    if isinstance(data, dict) and data.get("format") == COMPACT_FORMAT:
+        return expand_compact(data), "compact"
+    return data, "json"
+
+def read_plan_bytes(raw):
+    return decode_plan(raw)[0]
+
+def compact_series(series, default, next_month):
+    # Sorted months with defaults dropped; consecutive equal values become one
+    # [start, count, value] run, lone values stay [month, value].
+    runs = []
+    run = end = None
+    for month in sorted(series):
+        value = series[month]
+        if value == default and type(value) in (int, float):
+            continue
+        if run is not None and value == run[-1] and type(value) is type(run[-1]) and month == next_month(end):
+            if len(run) == 2:
+                run.insert(1, 2)
+            else:
+                run[1] += 1
+        else:
+            run = [month, value]
+            runs.append(run)
+        end = month
+    return runs
+
+def expand_series(runs, month_range):
+    series = {}
+    for run in runs:
+        if len(run) == 2:
+            series[run[0]] = run[1]
+        else:
+            for month in month_range(run[0], run[1]):
+                series[month] = run[2]
+    return series
+
+def write_compact(out, data):
+    # One record per line so the uncompressed file stays readable and diffable
+    successors = {}
+    def next_month(month):
+        if month not in successors:
+            successors[month] = add_months(month, 1) if parse_month_key(month) == month else None
+        return successors[month]
+    out.write(json.dumps({"format": COMPACT_FORMAT, "version": COMPACT_VERSION})[:-1].encode())
+    for key, value in data.items():
+        out.write(f",\n{json.dumps(key)}: ".encode())
+        if key in RECORD_LISTS.values() and isinstance(value, list):
+            kind = next(k for k, v in RECORD_LISTS.items() if v == key)
+            monthly = MONTHLY_FIELDS.get(kind)
+            lines = []
+            for record in value:
+                if monthly and isinstance(record.get(monthly), dict):
+                    record = dict(record)
+                    record[monthly] = compact_series(record[monthly], MONTH_DEFAULTS[kind], next_month)
+                lines.append(json.dumps(record))
+            out.write(("[\n" + ",\n".join(lines) + "\n]" if lines else "[]").encode())
+        elif key == "availability" and isinstance(value, dict):
+            lines = [f"{json.dumps(emp_id)}: {json.dumps(compact_series(series, MONTH_DEFAULTS['availability'], next_month))}"
+                     for emp_id, series in value.items()]
+            out.write(("{\n" + ",\n".join(lines) + "\n}" if lines else "{}").encode())
+        else:
+            out.write(json.dumps(value).encode())
+    out.write(b"\n}\n")
+
+def encode_compact(data, compression=None):
+    buf = io.BytesIO()
+    with (compression(buf) if compression else nullcontext(buf)) as out:
+        write_compact(out, data)
+    return buf.getvalue()
+
+def expand_compact(data):
+    if data.get("version", 0) > COMPACT_VERSION:
+        raise ValueError(f"plan was saved by a newer version (compact format {data['version']})")
+    ranges = {}
+    def cached_range(start, count):
+        if (start, count) not in ranges:
+            ranges[(start, count)] = month_range(start, count)
+        return ranges[(start, count)]
+    plan = {k: v for k, v in data.items() if k not in ("format", "version")}
+    for kind, key in RECORD_LISTS.items():
+        monthly = MONTHLY_FIELDS.get(kind)
+        for record in plan.get(key, []) if monthly else []:
+            if isinstance(record.get(monthly), list):
+                record[monthly] = expand_series(record[monthly], cached_range)
+    if isinstance(plan.get("availability"), dict):
+        plan["availability"] = {emp_id: expand_series(runs, cached_range) for emp_id, runs in plan["availability"].items()}
+    return plan
+
+STREAM_READ_BYTES = 1 << 20
+STREAM_BATCH = 2000
+# Sections are saved in this order so the cheap, independent ones load first
+STREAM_ORDER = ["employees", "projects", "availability", "demand", "allocation"]
+
+def stream_order(data):
+    return {**{k: data[k] for k in STREAM_ORDER if k in data}, **data}
+
+class JsonStream:
+    # Reads a JSON document from a (possibly gzip/xz) file a chunk at a time
+    # and decodes one value at a time from a sliding text buffer.
+    def __init__(self, f):
+        self.f = f
+        self.size = os.fstat(f.fileno()).st_size
+        self.read = 0
+        self.raw = []
+        self.digest = hashlib.sha1()
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        # Keys are shared across values, as they are within a single json.loads()
+        self.keys = {}
+        self.decoder = json.JSONDecoder(object_pairs_hook=lambda pairs: {self.keys.setdefault(k, k): v for k, v in pairs})
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        head = f.read(8)
+        f.seek(0)
+        self.inflate = None
+        if head.startswith(b"\x1f\x8b"):
+            self.inflate = zlib.decompressobj(wbits=31)
+        elif head.startswith(b"\xfd7zXZ\x00"):
+            self.inflate = lzma.LZMADecompressor()
+
+    def more(self):
+        chunk = self.f.read(STREAM_READ_BYTES)
+        if not chunk:
+            self.eof = True
+            return False
+        self.read += len(chunk)
+        self.raw.append(chunk)
+        self.digest.update(chunk)
+        if self.inflate is not None:
+            chunk = self.inflate.decompress(chunk)
+        self.buf = self.buf[self.pos:] + self.text.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at byte {self.read} of the plan file")
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+
+    def value(self):
+        # A value that runs to the end of the buffer may be cut short
+        # (a number, say), so it's only taken once more text follows it.
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.more()
+
+def stream_plan(f, batch=STREAM_BATCH):
+    # Yields (section, items, complete) as the file is read: record lists in
+    # batches, availability as (employee id, series) pairs, other keys whole.
+    stream = JsonStream(f)
+    compact = False
+    stream.expect("{")
+    while stream.peek() != "}":
+        key = stream.value()
+        stream.expect(":")
+        opener = stream.peek()
+        if (key in RECORD_LISTS.values() and opener == "[") or (key == "availability" and opener == "{"):
+            closer = "]" if opener == "[" else "}"
+            stream.expect(opener)
+            items = []
+            while stream.peek() != closer:
+                if closer == "}":
+                    emp_id = stream.value()
+                    stream.expect(":")
+                    items.append((emp_id, stream.value()))
+                else:
+                    items.append(stream.value())
+                stream.skip(",")
+                if len(items) >= batch:
+                    yield key, expand_compact({key: dict(items) if closer == "}" else items})[key] if compact else items, False
+                    items = []
+            stream.expect(closer)
+            yield key, expand_compact({key: dict(items) if closer == "}" else items})[key] if compact else items, True
+        else:
+            value = stream.value()
+            if key == "format" and value == COMPACT_FORMAT:
+                compact = True
+            elif key == "version" and compact:
+                expand_compact({"version": value})
+            else:
+                yield key, value, True
+        stream.skip(",")
+    stream.more()
+    yield None, (stream.digest.hexdigest(), b"".join(stream.raw), "compact" if compact else "json"), True
+
+class PlanLoadSignals(QObject):
+    section = pyqtSignal(object, object, bool)
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class PlanLoadJob(QRunnable):
+    # Parses the plan file on a pool thread; the window applies each batch
+    def __init__(self, filename, signals):
+        super().__init__()
+        self.filename = filename
+        self.signals = signals
+
+    def run(self):
+        try:
+            with open(self.filename, "rb") as f:
+                size = max(os.fstat(f.fileno()).st_size, 1)
+                for section, items, complete in stream_plan(f):
+                    if section is None:
+                        self.signals.finished.emit(items)
+                        return
+                    self.signals.section.emit(section, items, complete)
+                    self.signals.progress.emit(int(100 * f.tell() / size))
+        except (OSError, ValueError, EOFError, lzma.LZMAError, zlib.error) as e:
+            self.signals.failed.emit(str(e))
+
+def columnar_series(data, kind):
+    if kind == "availability":
+        return list(data.get("availability", {}).items())
+    return [(r.get("id"), r.get(MONTHLY_FIELDS[kind])) for r in data.get(RECORD_LISTS[kind], [])]
+
+class ColumnarPlan:
+    # File layout: magic, header length (uint64), JSON header, then for each
+    # monthly kind a float64 (record x month) grid with defaults filled in and a
+    # uint8 grid marking the cells the plan sets (2 for integers). Blocks are 64-byte
+    # aligned so they map straight into numpy arrays. The header holds the
+    # month axis, row keys, the records minus their monthly series (the string
+    # table) and any value that doesn't fit a float column.
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray)):
+            buf = np.frombuffer(source, dtype=np.uint8)
+        else:
+            buf = np.memmap(source, dtype=np.uint8, mode="r")
+        if bytes(buf[:len(COLUMNAR_MAGIC)]) != COLUMNAR_MAGIC:
+            raise ValueError("not a columnar plan file")
+        start = len(COLUMNAR_MAGIC) + 8
+        size = int(buf[len(COLUMNAR_MAGIC):start].view("<u8")[0])
+        self.header = json.loads(bytes(buf[start:start + size]))
+        base = -(-(start + size) // COLUMNAR_ALIGN) * COLUMNAR_ALIGN
+        self.months = self.header["months"]
+        self.month_pos = {m: i for i, m in enumerate(self.months)}
+        self.rows, self.values, self.present = {}, {}, {}
+        for kind, block in self.header["blocks"].items():
+            shape = (len(block["keys"]), len(self.months))
+            cells = shape[0] * shape[1]
+            self.rows[kind] = {key: i for i, key in enumerate(block["keys"])}
+            values, present = base + block["values"], base + block["present"]
+            self.values[kind] = buf[values:values + 8 * cells].view("<f8").reshape(shape)
+            self.present[kind] = buf[present:present + cells].reshape(shape)
+
+    @staticmethod
+    def encode(data):
+        month_keys = set()
+        for kind in COLUMNAR_BLOCKS:
+            for _, series in columnar_series(data, kind):
+                month_keys.update(series or ())
+        month_keys = sorted(m for m in month_keys if isinstance(m, str) and parse_month_key(m) == m)
+        months = []
+        if month_keys:
+            (y0, m0), (y1, m1) = [map(int, m.split("-")) for m in (month_keys[0], month_keys[-1])]
+            months = month_range(month_keys[0], (y1 - y0) * 12 + m1 - m0 + 1)
+        month_pos = {m: i for i, m in enumerate(months)}
+        header = {"version": 1, "months": months, "order": list(data), "blocks": {}, "extras": {}, "records": {},
+                  "meta": {k: v for k, v in data.items() if k not in COLUMNAR_BLOCKS and k not in RECORD_LISTS.values()}}
+        for kind, key in RECORD_LISTS.items():
+            monthly = MONTHLY_FIELDS.get(kind)
+            # The monthly field stays in place (as null) so key order survives
+            header["records"][key] = [{f: (None if f == monthly else v) for f, v in r.items()} for r in data.get(key, [])]
+        columns = {}
+        blocks = []
+        offset = 0
+        for kind in COLUMNAR_BLOCKS:
+            series_list = columnar_series(data, kind)
+            rows, cols, values, kinds = [], [], [], []
+            extras = header["extras"].setdefault(kind, {})
+            for row, (key, series) in enumerate(series_list):
+                if not series:
+                    continue
+                keys = tuple(series)
+                if keys not in columns:
+                    columns[keys] = [month_pos[m] for m in keys] if all(m in month_pos for m in keys) else None
+                types = set(map(type, series.values()))
+                if columns[keys] is not None and types <= {float, int}:
+                    # The usual case: a whole series of plain numbers in one go
+                    rows.append(np.full(len(keys), row))
+                    cols.append(columns[keys])
+                    values.extend(series.values())
+                    kinds.extend([1] * len(keys) if types == {float} else [1 if type(v) is float else 2 for v in series.values()])
+                    continue
+                for month, value in series.items():
+                    col = month_pos.get(month)
+                    if col is None or type(value) not in (float, int):
+                        extras.setdefault(str(row), {})[month] = value
+                    else:
+                        rows.append([row])
+                        cols.append([col])
+                        values.append(value)
+                        kinds.append(1 if type(value) is float else 2)
+            grid = np.full((len(series_list), len(months)), MONTH_DEFAULTS[kind], dtype="<f8")
+            present = np.zeros(grid.shape, dtype=np.uint8)
+            if values:
+                rows, cols = np.concatenate(rows), np.concatenate(cols)
+                grid[rows, cols] = values
+                present[rows, cols] = kinds
+            header["blocks"][kind] = {"keys": [key for key, _ in series_list],
+                                      "missing": [i for i, (_, series) in enumerate(series_list) if series is None]}
+            blocks.append((kind, grid, present))
+        # Block offsets count from the first aligned byte after the header
+        offset = 0
+        for kind, grid, present in blocks:
+            header["blocks"][kind]["values"] = offset
+            offset = -(-(offset + grid.nbytes) // COLUMNAR_ALIGN) * COLUMNAR_ALIGN
+            header["blocks"][kind]["present"] = offset
+            offset = -(-(offset + present.nbytes) // COLUMNAR_ALIGN) * COLUMNAR_ALIGN
+        head = json.dumps(header).encode()
+        base = -(-(len(COLUMNAR_MAGIC) + 8 + len(head)) // COLUMNAR_ALIGN) * COLUMNAR_ALIGN
+        out = bytearray(base + offset)
+        out[:len(COLUMNAR_MAGIC)] = COLUMNAR_MAGIC
+        out[len(COLUMNAR_MAGIC):len(COLUMNAR_MAGIC) + 8] = np.array([len(head)], dtype="<u8").tobytes()
+        out[len(COLUMNAR_MAGIC) + 8:len(COLUMNAR_MAGIC) + 8 + len(head)] = head
+        for kind, grid, present in blocks:
+            block = header["blocks"][kind]
+            out[base + block["values"]:base + block["values"] + grid.nbytes] = grid.tobytes()
+            out[base + block["present"]:base + block["present"] + present.nbytes] = present.tobytes()
+        return bytes(out)
+
+    def series(self, kind):
+        block = self.header["blocks"][kind]
+        result = [{} for _ in block["keys"]]
+        present = self.present[kind]
+        rows, cols = np.nonzero(present)
+        months = self.months
+        for row, col, value in zip(rows.tolist(), cols.tolist(), self.values[kind][rows, cols].tolist()):
+            result[row][months[col]] = value
+        for row, col in zip(*np.nonzero(present == 2)):
+            result[row][months[col]] = int(result[row][months[col]])
+        for row, extra in self.header["extras"].get(kind, {}).items():
+            result[int(row)].update(extra)
+        for row in block["missing"]:
+            result[row] = None
+        return list(zip(block["keys"], result))
+
+    def to_plan(self):
+        header = self.header
+        parts = dict(header["meta"])
+        for kind, key in RECORD_LISTS.items():
+            records = header["records"][key]
+            if kind in COLUMNAR_BLOCKS:
+                monthly = MONTHLY_FIELDS[kind]
+                for record, (_, series) in zip(records, self.series(kind)):
+                    if monthly in record:
+                        record[monthly] = series
+            parts[key] = records
+        if "availability" in header["order"]:
+            parts["availability"] = dict(self.series("availability"))
+        return {key: parts[key] for key in header["order"]}
+
+    def vector(self, kind, key, month_keys):
+        # A zero-copy view of the mapped grid when the window lies inside the month axis
+        row = self.rows.get(kind, {}).get(key)
+        start = self.month_pos.get(month_keys[0]) if month_keys else None
+        if row is None or start is None or start + len(month_keys) > len(self.months):
+            return None
+        if self.header["extras"].get(kind, {}).get(str(row)):
+            return None
+        return self.values[kind][row, start:start + len(month_keys)]
+
+HISTORY_SECTIONS = ["employees", "projects", "demand", "allocation", "availability"]
+HISTORY_CHUNK_MASK = 0x1f
+
+def history_dir(filename):
+    return os.path.splitext(os.path.abspath(filename))[0] + ".history"
+
+def history_entries(data, section):
+    if section == "availability":
+        return [[emp_id, series] for emp_id, series in data["availability"].items()]
+    return data[section]
+
+def history_chunks(hashes):
+    # Content-defined boundaries: a chunk ends after any record whose hash hits
+    # the mask, so inserting or removing a record only rewrites its own chunk.
+    chunks, current = [], []
+    for h in hashes:
+        current.append(h)
+        if int(h[:4], 16) & HISTORY_CHUNK_MASK == 0:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+class PlanHistory:
+    # Save points stored as zlib-compressed JSON objects named by their SHA-1:
+    # one blob per record, chunk lists of blob hashes, and a manifest per version.
+    # Objects are shared between versions whenever their content is unchanged.
+    def __init__(self, path):
+        self.path = path
+        self.objects = os.path.join(path, "objects")
+        self.log = os.path.join(path, "versions")
+        self.known = None
+        self.record_hashes = {}
+
+    @classmethod
+    def init(cls, path):
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        return cls(path)
+
+    def exists(self):
+        return os.path.isdir(self.objects)
+
+    def attach(self, staffing_data):
+        staffing_data.subscribe(self.on_events)
+
+    def on_events(self, events):
+        for event in events:
+            self.record_hashes.pop((event.kind, event.key), None)
+
+    def object_path(self, h):
+        return os.path.join(self.objects, h[:2], h[2:])
+
+    def put(self, obj):
+        raw = json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+        h = hashlib.sha1(raw).hexdigest()
+        if self.known is None:
+            self.known = {d + f for d in os.listdir(self.objects) for f in os.listdir(os.path.join(self.objects, d))}
+        if h not in self.known:
+            os.makedirs(os.path.dirname(self.object_path(h)), exist_ok=True)
+            tmp = self.object_path(h) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(raw))
+            os.replace(tmp, self.object_path(h))
+            self.known.add(h)
+        return h
+
+    def get(self, h):
+        with open(self.object_path(h), "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+
+    def record_hash(self, section, entry):
+        kind = "availability" if section == "availability" else next(k for k, v in RECORD_LISTS.items() if v == section)
+        ref = (kind, entry[0] if section == "availability" else entry["id"])
+        h = self.record_hashes.get(ref)
+        if h is None:
+            h = self.record_hashes[ref] = self.put(entry)
+        return h
+
+    def commit(self, data, message=""):
+        manifest = plan_settings(data)
+        for section in HISTORY_SECTIONS:
+            hashes = [self.record_hash(section, entry) for entry in history_entries(data, section)]
+            # Two levels of chunk lists keep the manifest itself small
+            chunks = [self.put(chunk) for chunk in history_chunks(hashes)]
+            manifest[section] = [self.put(group) for group in history_chunks(chunks)]
+        version = self.put(manifest)
+        versions = self.versions()
+        if versions and versions[-1][0] == version:
+            return version
+        with open(self.log, "a") as f:
+            f.write(f"{version}\t{datetime.now().isoformat(timespec='seconds')}\t{' '.join(message.split())}\n")
+        return version
+
+    def versions(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return [tuple(line.rstrip("\n").split("\t", 2)) for line in f if line.strip()]
+
+    def resolve(self, prefix):
+        matches = [v for v, _, _ in self.versions() if v.startswith(prefix)]
+        if len(set(matches)) != 1:
+            raise KeyError(f"{'ambiguous' if matches else 'unknown'} version {prefix!r}")
+        return matches[0]
+
+    def read(self, version):
+        manifest = self.get(self.resolve(version))
+        data = plan_settings(manifest)
+        for section in HISTORY_SECTIONS:
+            chunks = [chunk for group in manifest[section] for chunk in self.get(group)]
+            entries = [self.get(h) for chunk in chunks for h in self.get(chunk)]
+            data[section] = dict(entries) if section == "availability" else entries
+        return data
+
+    def open(self, version, filename="staffing_data.json"):
+        return StaffingData(filename, data=self.read(version), readonly=True)
+
+DiffEntry = namedtuple("DiffEntry", ["op", "kind", "key", "field", "month", "old", "new"])
+
+def plan_series(data):
+    # Monthly values keyed the way plans are compared: demand by (project,
+    # domain) after scaling, allocation by (employee, project, domain).
+    # Most keys have a single entry, whose series is used as is.
+    demand, allocation = {}, {}
+    for d in data["demand"]:
+        key = (d["project_id"], d["domain"])
+        scaling = d.get("scaling_factor", 1.0)
+        series = d.get("monthly_demand", {})
+        if scaling != 1.0 and numeric_value(scaling):
+            # Text cells are compared as they are
+            series = {month: scaling * value if numeric_value(value) else value for month, value in series.items()}
+        demand[key] = merge_series(demand[key], series) if key in demand else series
+    for a in data["allocation"]:
+        key = (a["employee_id"], a["project_id"], a.get("domain", DOMAINS[0]))
+        series = a.get("monthly_allocation", {})
+        allocation[key] = merge_series(allocation[key], series) if key in allocation else series
+    return {"availability": data["availability"], "demand": demand, "allocation": allocation}
+
+def merge_series(a, b):
+    merged = dict(a)
+    for month, value in b.items():
+        total = merged.get(month, 0.0)
+        merged[month] = total + value if numeric_value(total) and numeric_value(value) else value
+    return merged
+
+def numeric_value(value):
+    return isinstance(value, (int, float))
+
+def diff_value(value):
+    return f"{value:g}" if numeric_value(value) else repr(value)
+
+class PlanDiff:
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.employees = {e["id"]: e for e in old["employees"]}
+        self.employees.update({e["id"]: e for e in new["employees"]})
+        self.projects = {p["id"]: p for p in old["projects"]}
+        self.projects.update({p["id"]: p for p in new["projects"]})
+        self.by_project = {}
+        self.by_manager = {}
+
+    def __iter__(self):
+        for kind, key in [("project", "projects"), ("employee", "employees")]:
+            old = {r["id"]: r for r in self.old[key]}
+            new = {r["id"]: r for r in self.new[key]}
+            for rid, record in old.items():
+                if rid not in new:
+                    yield DiffEntry("removed", kind, rid, None, None, record, None)
+            for rid, record in new.items():
+                if rid not in old:
+                    yield DiffEntry("added", kind, rid, None, None, None, record)
+                    continue
+                for field in record.keys() | old[rid].keys():
+                    if record.get(field) != old[rid].get(field):
+                        yield DiffEntry("changed", kind, rid, field, None, old[rid].get(field), record.get(field))
+        old_series, new_series = plan_series(self.old), plan_series(self.new)
+        for kind in ["availability", "demand", "allocation"]:
+            default = MONTH_DEFAULTS[kind]
+            old, new = old_series[kind], new_series[kind]
+            for key, series in old.items():
+                if key not in new:
+                    self.tally(kind, key, {m: default - v for m, v in series.items() if numeric_value(v)})
+                    yield DiffEntry("removed", kind, key, None, None, series, None)
+            for key, series in new.items():
+                if key not in old:
+                    self.tally(kind, key, {m: v - default for m, v in series.items() if numeric_value(v)})
+                    yield DiffEntry("added", kind, key, None, None, None, series)
+                    continue
+                before = old[key]
+                if before == series:
+                    continue
+                deltas = {}
+                for month in sorted(series.keys() | before.keys()):
+                    a, b = before.get(month, default), series.get(month, default)
+                    if a != b:
+                        if numeric_value(a) and numeric_value(b):
+                            deltas[month] = b - a
+                        yield DiffEntry("changed", kind, key, MONTHLY_FIELDS[kind], month, a, b)
+                self.tally(kind, key, deltas)
+
+    def tally(self, kind, key, deltas):
+        total = sum(deltas.values())
+        if not total:
+            return
+        if kind in ("demand", "allocation"):
+            totals = self.by_project.setdefault(self.project_label(key[-2]), {"demand": 0.0, "allocation": 0.0})
+            totals[kind] += total
+        if kind in ("availability", "allocation"):
+            manager = self.employees.get(key if kind == "availability" else key[0], {}).get("manager", "")
+            totals = self.by_manager.setdefault(manager, {"availability": 0.0, "allocation": 0.0})
+            totals[kind] += total
+
+    def project_label(self, pid):
+        return self.projects.get(pid, {}).get("name", pid)
+
+    def employee_label(self, emp_id):
+        return self.employees.get(emp_id, {}).get("name", emp_id)
+
+    def label(self, entry):
+        if entry.kind == "project":
+            return self.project_label(entry.key)
+        if entry.kind in ("employee", "availability"):
+            return self.employee_label(entry.key)
+        if entry.kind == "demand":
+            return f"{self.project_label(entry.key[0])} / {entry.key[1]}"
+        return f"{self.employee_label(entry.key[0])} / {self.project_label(entry.key[1])} / {entry.key[2]}"
+
+    def format(self, entry):
+        sign = {"added": "+", "removed": "-", "changed": "~"}[entry.op]
+        head = f"{sign} {entry.kind} {self.label(entry)}"
+        if entry.op == "changed" and entry.month is not None:
+            return f"{head} {entry.month}: {diff_value(entry.old)} -> {diff_value(entry.new)}"
+        if entry.op == "changed":
+            return f"{head} {entry.field}: {entry.old!r} -> {entry.new!r}"
+        return f"{head} {json.dumps(entry.new if entry.op == 'added' else entry.old, sort_keys=True)}"
+
+def load_plan_source(source, filename):
+    # A plan file path, or a version id (prefix) from the history of filename
+    if os.path.exists(source):
+        with open(source, "rb") as f:
+            return normalize_plan(read_plan_bytes(f.read()))
+    history = PlanHistory(history_dir(filename))
+    if not history.exists():
+        raise KeyError(f"no such file {source!r} and no history for {filename}")
+    return normalize_plan(history.read(source))
+
+VALIDATION_RULES = {
+    "missing_project": "Allocation to a project/domain with no demand",
+    "missing_employee": "Allocation for an employee not in the plan",
+    "over_allocation": "Allocated above availability",
+    "domain_mismatch": "Allocation domain differs from the employee's",
+    "bad_value": "Negative or non-numeric value",
+}
+
+Issue = namedtuple("Issue", ["rule", "kind", "key", "month", "message"])
+
+def bad_month_value(value):
+    return not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0
+
+def bad_months(series):
+    # Clean series (nearly all of them) pass on min/sum without a per-value test
+    values = series.values()
+    try:
+        if min(values, default=0) >= 0 and math.isfinite(sum(values)):
+            return []
+    except TypeError:
+        pass
+    return [month for month, value in series.items() if bad_month_value(value)]
+
+class PlanValidator:
+    # Issues are kept per record so an edit only re-checks the records it
+    # touches; over-allocation lives on the employee and is re-checked per month.
+    def __init__(self, staffing_data):
+        self.staffing_data = staffing_data
+        self.issues = {}
+        self.counts = dict.fromkeys(VALIDATION_RULES, 0)
+        self.check_all()
+        staffing_data.subscribe(self.on_events, list(RECORD_LISTS) + ["availability"])
+
+    def check_all(self):
+        # Full pass: every monthly value in one array for the bad-value test and
+        # the (employee, month) allocation totals; the per-record rules run once each.
+        sd = self.staffing_data
+        self.issues = {}
+        self.counts = dict.fromkeys(VALIDATION_RULES, 0)
+        demand_domains = {}
+        for entry in sd.records["demand"].values():
+            demand_domains.setdefault(entry["project_id"], set()).add(entry["domain"])
+        records = [(kind, key, record, record.get(MONTHLY_FIELDS[kind], {}))
+                   for kind in ["demand", "allocation"] for key, record in sd.records[kind].items()]
+        records.extend(("availability", key, series, series) for key, series in sd.data["availability"].items())
+        lengths = [len(series) for _, _, _, series in records]
+        values = [v for _, _, _, series in records for v in series.values()]
+        offsets = np.cumsum([0] + lengths)
+        try:
+            flat = np.fromiter(values, dtype=float, count=len(values))
+            bad = np.flatnonzero(~(np.isfinite(flat) & (flat >= 0)))
+            bad_months_by_record = {n: bad_months(records[n][3]) for n in set(np.searchsorted(offsets, bad, side="right") - 1)}
+        except (TypeError, ValueError):
+            # Text in the plan: find the offending series one by one and blank them out
+            bad_months_by_record = {n: bad_months(r[3]) for n, r in enumerate(records)}
+            values = [math.nan if bad_months_by_record[n] and bad_month_value(v) else v
+                      for n, r in enumerate(records) for v in r[3].values()]
+            flat = np.array(values, dtype=float)
+        for n, (kind, key, record, series) in enumerate(records):
+            found = self.record_issues(kind, key, record, demand_domains, bad_months_by_record.get(n, []))
+            if found:
+                self.issues[(kind, key)] = found
+                for rule, _ in found:
+                    self.counts[rule] += 1
+        self.check_over_allocation(records, offsets, flat)
+
+    def check_over_allocation(self, records, offsets, flat):
+        sd = self.staffing_data
+        rows = {emp_id: i for i, emp_id in enumerate(sd.records["employee"])}
+        month_index = {}
+        columns = {}
+        # Row per value: the employee for allocations, -2 - employee for availability
+        record_rows = []
+        column_parts = [np.zeros(0, dtype=np.int64)]
+        for kind, key, record, series in records:
+            months = tuple(series)
+            if months not in columns:
+                columns[months] = np.array([month_index.setdefault(m, len(month_index)) for m in months], dtype=np.int64)
+            column_parts.append(columns[months])
+            row = rows.get(key if kind == "availability" else record.get("employee_id"))
+            record_rows.append(-1 if row is None or kind == "demand" else row if kind == "allocation" else -2 - row)
+        row_ids = np.repeat(np.array(record_rows, dtype=np.int64), np.diff(offsets))
+        cols = np.concatenate(column_parts)
+        # Unreadable allocation counts as nothing; unreadable availability never flags
+        valid = ~np.isnan(flat)
+        shape = (len(rows), len(month_index))
+        allocated = (row_ids >= 0) & valid
+        totals = np.bincount(row_ids[allocated] * shape[1] + cols[allocated], weights=flat[allocated],
+                             minlength=shape[0] * shape[1]).reshape(shape)
+        available = np.full(shape, MONTH_DEFAULTS["availability"])
+        given = row_ids <= -2
+        available[-2 - row_ids[given], cols[given]] = np.where(valid[given] & (flat[given] >= 0), flat[given], np.inf)
+        over_rows, over_cols = np.nonzero(totals > available + 1e-9)
+        emp_ids = list(rows)
+        months = list(month_index)
+        for r, c, total, limit in zip(over_rows.tolist(), over_cols.tolist(),
+                                      totals[over_rows, over_cols].tolist(), available[over_rows, over_cols].tolist()):
+            emp_id, month = emp_ids[r], months[c]
+            self.issues.setdefault(("employee", emp_id), {})[("over_allocation", month)] = Issue(
+                "over_allocation", "employee", emp_id, month, f"{total:g} allocated, {limit:g} available")
+        self.counts["over_allocation"] += len(over_rows)
+
+    def on_events(self, events):
+        sd = self.staffing_data
+        refs = set()
+        employee_months = {}
+        def touch_employee(emp_id, month=None):
+            months = employee_months.setdefault(emp_id, set())
+            if months is not None:
+                employee_months[emp_id] = None if month is None else months | {month}
+        for event in events:
+            kind, key = event.kind, event.key
+            record = sd.event_record(event)
+            refs.add((kind, key))
+            if kind == "allocation" and record is not None:
+                touch_employee(record["employee_id"], event.month if isinstance(event, CellChanged) else None)
+                if isinstance(event, RecordUpdated) and event.field == "employee_id":
+                    touch_employee(event.old)
+            elif kind == "availability":
+                touch_employee(key, event.month if isinstance(event, CellChanged) else None)
+            elif kind == "employee" and not isinstance(event, CellChanged):
+                touch_employee(key)
+                refs.update(("allocation", a) for a in sd.allocation_by_employee.get(key, {}))
+            elif kind in ("project", "demand") and not isinstance(event, CellChanged) and record is not None:
+                pids = {key if kind == "project" else record["project_id"]}
+                if isinstance(event, RecordUpdated) and event.field == "project_id":
+                    pids.add(event.old)
+                for pid in pids:
+                    refs.update(("allocation", a) for a in sd.allocation_by_project.get(pid, {}))
+        for kind, key in refs:
+            if kind != "employee" and kind != "project":
+                self.check(kind, key)
+        for emp_id, months in employee_months.items():
+            self.check_employee(emp_id, months)
+
+    def replace(self, ref, found, keep=lambda issue: False):
+        old = self.issues.pop(ref, {})
+        for issue in old.values():
+            if keep(issue):
+                found.setdefault((issue.rule, issue.month), issue)
+            else:
+                self.counts[issue.rule] -= 1
+        for (rule, month), issue in found.items():
+            if not keep(issue) or (rule, month) not in old:
+                self.counts[rule] += 1
+        if found:
+            self.issues[ref] = found
+
+    def check(self, kind, key):
+        sd = self.staffing_data
+        if kind == "employee":
+            self.check_employee(key)
+            return
+        record = sd.get_record(kind, key)
+        found = {}
+        if record is not None:
+            pid = record.get("project_id")
+            demand_domains = {pid: {d["domain"] for d in sd.demand_by_project.get(pid, {}).values()}}
+            series = record if kind == "availability" else record.get(MONTHLY_FIELDS[kind], {})
+            found = self.record_issues(kind, key, record, demand_domains, bad_months(series))
+        self.replace((kind, key), found)
+
+    def record_issues(self, kind, key, record, demand_domains, bad):
+        sd = self.staffing_data
+        found = {}
+        series = record if kind == "availability" else record.get(MONTHLY_FIELDS[kind], {})
+        for month in bad:
+            found[("bad_value", month)] = Issue("bad_value", kind, key, month, f"{series[month]!r}")
+        if kind != "allocation":
+            return found
+        employee = sd.records["employee"].get(record["employee_id"])
+        domain = record.get("domain", DOMAINS[0])
+        if employee is None:
+            found[("missing_employee", None)] = Issue(
+                "missing_employee", kind, key, None, f"employee id {record['employee_id']}")
+        elif employee.get("domain") and employee["domain"] != domain:
+            found[("domain_mismatch", None)] = Issue(
+                "domain_mismatch", kind, key, None, f"{employee['name']} is {employee['domain']}, allocated as {domain}")
+        if domain not in demand_domains.get(record["project_id"], ()):
+            name = sd.project_name(record["project_id"]) or f"project id {record['project_id']}"
+            found[("missing_project", None)] = Issue("missing_project", kind, key, None, f"{name} has no {domain} demand")
+        return found
+
+    def check_employee(self, emp_id, months=None):
+        # months=None re-checks every month the employee has values for
+        sd = self.staffing_data
+        found = {}
+        if emp_id in sd.records["employee"]:
+            allocations = sd.allocation_by_employee.get(emp_id, {}).values()
+            availability = sd.data["availability"].get(emp_id, {})
+            totals = {}
+            for alloc in allocations:
+                for month, value in alloc.get("monthly_allocation", {}).items():
+                    if (months is None or month in months) and not bad_month_value(value):
+                        totals[month] = totals.get(month, 0.0) + value
+            for month, total in totals.items():
+                available = availability.get(month, MONTH_DEFAULTS["availability"])
+                if not bad_month_value(available) and total > available + 1e-9:
+                    found[("over_allocation", month)] = Issue(
+                        "over_allocation", "employee", emp_id, month, f"{total:g} allocated, {available:g} available")
+        self.replace(("employee", emp_id), found, lambda issue: months is not None and issue.month not in months)
+
+    def all_issues(self):
+        for found in self.issues.values():
+            yield from found.values()
+
+    def describe(self, issue):
+        sd = self.staffing_data
+        if issue.kind == "allocation":
+            alloc = sd.records["allocation"].get(issue.key)
+            if alloc is not None:
+                employee = sd.records["employee"].get(alloc["employee_id"], {}).get("name", alloc["employee_id"])
+                return f"{employee} / {sd.project_name(alloc['project_id'])} ({alloc.get('domain', '')})"
+        if issue.kind == "demand":
+            entry = sd.records["demand"].get(issue.key)
+            if entry is not None:
+                return f"{sd.project_name(entry['project_id'])} ({entry['domain']})"
+        if issue.kind in ("employee", "availability"):
+            employee = sd.records["employee"].get(issue.key)
+            if employee is not None:
+                return employee["name"]
+        return f"{issue.kind} {issue.key}"
+
+    def summary(self):
+        return ", ".join(f"{rule}: {count}" for rule, count in self.counts.items() if count) or "no issues"
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_AUTOSAVE_S = 2.0
+SERVER_QUEUE_LIMIT = 1000
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def event_to_json(event):
+    return dict(event._asdict(), type=type(event).__name__)
+
+class PlanServer:
+    def __init__(self, staffing_data, host=SERVER_HOST, port=SERVER_PORT, autosave=SERVER_AUTOSAVE_S):
+        self.staffing_data = staffing_data
+        self.host = host
+        self.port = port
+        self.autosave = autosave
+        self.version = 0
+        self.output_cache = {}
+        self.clients = set()
+        self.save_handle = None
+        self.staffing_data.subscribe(self.on_events)
+
+    def on_events(self, events):
+        self.version += 1
+        self.output_cache.clear()
+        message = json.dumps({"version": self.version, "events": [event_to_json(e) for e in events]})
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A client this far behind is dropped rather than buffered forever
+                self.clients.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+        if self.autosave is not None:
+            loop = asyncio.get_running_loop()
+            if self.save_handle is not None:
+                self.save_handle.cancel()
+            self.save_handle = loop.call_later(self.autosave, self.save)
+
+    def save(self):
+        self.save_handle = None
+        self.staffing_data.save()
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        print(f"Serving {self.staffing_data.filename} on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                url = urlsplit(target)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if url.path == "/events":
+                    await self.stream_events(writer)
+                    break
+                status, payload = await self.dispatch(method, url.path, params, body)
+                data = payload.encode() if isinstance(payload, str) else json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream_events(self, writer):
+        queue = asyncio.Queue(SERVER_QUEUE_LIMIT)
+        self.clients.add(queue)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+        writer.write(f"data: {json.dumps({'version': self.version, 'events': []})}\n\n".encode())
+        try:
+            await writer.drain()
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                writer.write(f"data: {message}\n\n".encode())
+                await writer.drain()
+        finally:
+            self.clients.discard(queue)
+
+    async def dispatch(self, method, path, params, body):
+        routes = {
+            ("GET", "/plan"): self.get_plan,
+            ("GET", "/window"): self.get_window,
+            ("GET", "/outputs"): self.get_outputs,
+            ("POST", "/edits"): self.post_edits,
+            ("POST", "/save"): self.post_save,
+            ("POST", "/undo"): lambda params, body: self.post_history(self.staffing_data.undo),
+            ("POST", "/redo"): lambda params, body: self.post_history(self.staffing_data.redo),
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            known = any(p == path for (_, p) in routes)
+            return (405 if known else 404), {"error": f"{method} {path} not supported"}
+        try:
+            payload = handler(params, body)
+            if asyncio.iscoroutine(payload):
+                payload = await payload
+            return 200, payload
+        except (KeyError, ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+
+    def window_months(self, params):
+        start = params.get("start", get_current_month())
+        datetime.strptime(start, MONTH_JSON_FORMAT)
+        return month_range(start, int(params.get("months", 12)))
+
+    def get_plan(self, params, body):
+        data = self.staffing_data.data
+        return {
+            "version": self.version,
+            "employees": data["employees"],
+            "projects": data["projects"],
+            "thresholds": data["thresholds"],
+            "format_rules": {output: format_rules(data, output) for output in FORMAT_OUTPUTS},
+        }
+
+    def get_window(self, params, body):
+        kind = params.get("kind", "allocation")
+        if kind not in MONTHLY_FIELDS:
+            raise ValueError(f"unknown kind '{kind}'")
+        months = self.window_months(params)
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 500))
+        if kind == "availability":
+            keys = [e["id"] for e in self.staffing_data.data["employees"][offset:offset + limit]]
+            rows = [{"id": key} for key in keys]
+        else:
+            records = self.staffing_data.data[RECORD_LISTS[kind]][offset:offset + limit]
+            field = MONTHLY_FIELDS[kind]
+            rows = [{k: v for k, v in r.items() if k != field} for r in records]
+        for row in rows:
+            row["values"] = list(month_vector(self.staffing_data, kind, row["id"], months))
+        total = len(self.staffing_data.data["employees"] if kind == "availability" else self.staffing_data.data[RECORD_LISTS[kind]])
+        return {"version": self.version, "kind": kind, "months": months, "offset": offset, "total": total, "rows": rows}
+
+    async def get_outputs(self, params, body):
+        months = self.window_months(params)
+        key = tuple(months)
+        if key in self.output_cache:
+            return self.output_cache[key]
+        version = self.version
+        snapshot = build_snapshot(self.staffing_data, months, version)
+
+        def encode():
+            result = compute_outputs(snapshot)
+            return json.dumps({
+                "version": version,
+                "months": months,
+                "pairs": [[p, d] for (p, d) in result.pairs],
+                "pair_projects": result.pair_projects,
+                "pair_scaling": result.pair_scaling.tolist(),
+                "demand_alloc": result.demand_alloc.round(4).tolist(),
+                "employees": [[e, n] for (e, n) in result.employees],
+                "avail_alloc": result.avail_alloc.round(4).tolist(),
+            })
+        # Computed off the event loop so readers and event streams keep flowing
+        payload = await asyncio.get_running_loop().run_in_executor(None, encode)
+        # An edit landing meanwhile has already cleared the cache for a newer version
+        if self.version == version:
+            self.output_cache[key] = payload
+        return payload
+
+    def post_edits(self, params, body):
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            raise ValueError("expected a JSON object with an edits list")
+        edits = request.get("edits", [])
+        if not isinstance(edits, list):
+            raise ValueError("edits must be a list")
+        added = []
+        # Malformed ops are rejected up front; anything failing later, such as an
+        # unknown key, rolls the whole batch back inside transaction()
+        for edit in edits:
+            if not isinstance(edit, dict):
+                raise ValueError(f"edit {edit!r} is not an object")
+            op, kind = edit.get("op"), edit.get("kind")
+            if op not in ("set_month", "set_field", "add", "remove"):
+                raise ValueError(f"unknown op '{op}'")
+            if kind not in MONTHLY_FIELDS and kind not in RECORD_LISTS:
+                raise ValueError(f"unknown kind '{kind}'")
+            if op == "set_month":
+                float(edit["value"])
+                datetime.strptime(edit["month"], MONTH_JSON_FORMAT)
+        with self.staffing_data.transaction():
+            for edit in edits:
+                op, kind = edit["op"], edit["kind"]
+                if op == "set_month":
+                    self.staffing_data.set_month(kind, edit["key"], edit["month"], float(edit["value"]))
+                elif op == "set_field":
+                    self.staffing_data.set_field(kind, edit["key"], edit["field"], edit["value"])
+                elif op == "add":
+                    added.append(self.staffing_data.add_record(kind, dict(edit["record"])))
+                else:
+                    self.staffing_data.remove_record(kind, edit["key"])
+        return {"version": self.version, "added": added}
+
+    def post_save(self, params, body):
+        self.save()
+        return {"version": self.version, "saved": self.staffing_data.filename}
+
+    def post_history(self, action):
+        return {"version": self.version, "applied": action()}
+
+REPLICA_MAGIC = b"SPLNSHM1"
+REPLICA_CONTROL = struct.Struct("<8sQ")
+REPLICA_ALIGN = 64
+REPLICA_KEEP = 2
+REPLICA_POLL_MS = 500
+REPLICA_ARRAYS = ["pair_scaling", "demand_alloc", "demand", "avail_alloc", "availability"]
+REPLICA_PLAN_KEYS = ["projects", "thresholds", "format_rules", "fiscal_year_start"]
+
+def replica_name(filename):
+    # Short enough for the shared memory name limits on every platform
+    return "spl-" + hashlib.sha1(os.path.abspath(filename).encode()).hexdigest()[:12]
+
+def attach_shared_memory(name):
+    shm = shared_memory.SharedMemory(name)
+    if os.name == "posix":
+        # Attaching registers the segment for cleanup, which would unlink it under the publisher when a viewer exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+class OutputPublisher:
+    # Each result goes into a fresh segment named after its version; a small
+    # control segment holds the current version for viewers to poll.
+    def __init__(self, name):
+        self.name = name
+        self.segments = deque()
+        try:
+            self.control = shared_memory.SharedMemory(name, create=True, size=REPLICA_CONTROL.size)
+            self.version = 0
+        except FileExistsError:
+            # Left behind by a publisher that did not shut down; carry on its version count
+            self.control = shared_memory.SharedMemory(name)
+            magic, version = REPLICA_CONTROL.unpack_from(self.control.buf)
+            self.version = version if magic == REPLICA_MAGIC else 0
+
+    def publish(self, result, data, periods):
+        header = {
+            "months": result.months,
+            "periods": [list(p) for p in periods],
+            "pairs": result.pairs,
+            "pair_projects": result.pair_projects,
+            "employees": result.employees,
+            "employee_domains": result.employee_domains,
+            "plan": {key: data[key] for key in REPLICA_PLAN_KEYS if key in data},
+            "arrays": {},
+        }
+        offset = 0
+        for key in REPLICA_ARRAYS:
+            array = getattr(result, key)
+            header["arrays"][key] = [offset, list(array.shape)]
+            offset += -(-array.nbytes // REPLICA_ALIGN) * REPLICA_ALIGN
+        raw = json.dumps(header).encode()
+        base = -(-(16 + len(raw)) // REPLICA_ALIGN) * REPLICA_ALIGN
+        segment = shared_memory.SharedMemory(f"{self.name}-{self.version + 1}", create=True, size=base + offset)
+        segment.buf[:16] = struct.pack("<8sQ", REPLICA_MAGIC, len(raw))
+        segment.buf[16:16 + len(raw)] = raw
+        for key, (start, shape) in header["arrays"].items():
+            np.ndarray(shape, buffer=segment.buf, offset=base + start)[...] = getattr(result, key)
+        self.version += 1
+        REPLICA_CONTROL.pack_into(self.control.buf, 0, REPLICA_MAGIC, self.version)
+        self.segments.append(segment)
+        # Viewers that read the previous version may still be attaching to it
+        while len(self.segments) > REPLICA_KEEP:
+            old = self.segments.popleft()
+            old.close()
+            old.unlink()
+
+    def close(self):
+        REPLICA_CONTROL.pack_into(self.control.buf, 0, bytes(8), self.version)
+        for segment in [self.control, *self.segments]:
+            segment.close()
+            segment.unlink()
+        self.segments.clear()
+
+class OutputReplica:
+    # Read-only side: the output arrays are numpy views straight onto the publisher's segment
+    def __init__(self, name):
+        self.name = name
+        self.control = None
+        self.version = 0
+        self.segments = []
+
+    def poll(self):
+        if self.control is None:
+            try:
+                self.control = attach_shared_memory(self.name)
+            except FileNotFoundError:
+                return None
+        magic, version = REPLICA_CONTROL.unpack_from(self.control.buf)
+        if magic != REPLICA_MAGIC:
+            # The publisher shut down; keep showing its last outputs until another starts
+            self.control.close()
+            self.control = None
+            return None
+        if version == self.version:
+            return None
+        try:
+            segment = attach_shared_memory(f"{self.name}-{version}")
+        except FileNotFoundError:
+            return None
+        magic, length = struct.unpack_from("<8sQ", segment.buf)
+        header = json.loads(bytes(segment.buf[16:16 + length]))
+        base = -(-(16 + length) // REPLICA_ALIGN) * REPLICA_ALIGN
+        arrays = {}
+        for key, (start, shape) in header["arrays"].items():
+            arrays[key] = np.ndarray(shape, buffer=segment.buf, offset=base + start)
+            arrays[key].flags.writeable = False
+        result = OutputResult(
+            version, header["months"], [tuple(p) for p in header["pairs"]], header["pair_projects"],
+            arrays["pair_scaling"], arrays["demand_alloc"], [tuple(e) for e in header["employees"]],
+            arrays["avail_alloc"], arrays["demand"], arrays["availability"], header["employee_domains"]
+        )
+        self.version = version
+        self.segments.append(segment)
+        periods = [Period(*p) for p in header["periods"]]
+        return result, periods, header["plan"]
+
+    def release(self):
+        # Older segments close once no table shows their arrays any more
+        for segment in self.segments[:-1]:
+            try:
+                segment.close()
+            except BufferError:
+                continue
+            self.segments.remove(segment)
+
+class ReplicaViewer(QMainWindow):
+    def __init__(self, name):
+        super().__init__()
+        self.setWindowTitle("Staffing Outputs (read-only)")
+        self.resize(1200, 700)
+        self.name = name
+        self.replica = OutputReplica(name)
+        self.staffing_data = StaffingData(data={}, readonly=True)
+        self.periods = []
+        self.demand_alloc_output_tab = DemandAllocationOutputTab(self.staffing_data, self.periods, lambda delta: None)
+        self.avail_alloc_output_tab = AvailabilityAllocationOutputTab(self.staffing_data, self.periods, lambda delta: None)
+        self.output_tabs = [self.demand_alloc_output_tab, self.avail_alloc_output_tab]
+        # The publisher owns the plan, the month window and the formatting rules
+        for tab in self.output_tabs:
+            for button in tab.findChildren(QPushButton):
+                button.hide()
+        self.tabs = QTabWidget()
+        self.tabs.addTab(self.demand_alloc_output_tab, "Out: Demand-Allocation")
+        self.tabs.addTab(self.avail_alloc_output_tab, "Out: Availability-Allocation")
+        self.setCentralWidget(self.tabs)
+        self.statusBar().showMessage(f"Waiting for a publisher on {name}...")
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(REPLICA_POLL_MS)
+        self.refresh()
+
+    def refresh(self):
+        update = self.replica.poll()
+        if update is None:
+            if self.replica.control is None and self.replica.version:
+                self.statusBar().showMessage(f"Publisher on {self.name} stopped; showing version {self.replica.version}")
+            return
+        result, periods, plan = update
+        self.staffing_data.data = normalize_plan(plan)
+        self.staffing_data.reindex()
+        if periods != self.periods:
+            self.periods = periods
+            for tab in self.output_tabs:
+                tab.update_months(periods)
+        for tab in self.output_tabs:
+            tab.apply_result(result)
+        self.replica.release()
+        self.statusBar().showMessage(f"Version {self.replica.version} from {self.name}, "
+                                     f"updated {datetime.now().strftime('%H:%M:%S')}")
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        for tab in self.output_tabs:
+            tab.result = tab.shown = None
+        self.replica.release()
+        super().closeEvent(event)
+
+SITE_CHUNK_PERIODS = 12
+SITE_DECIMALS = 3
+SITE_VIEWER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard.html")
+SITE_OUTPUTS = {"pair": "output1", "employee": "output2"}
+
+def site_key(name, taken):
+    key = re.sub(r"[^A-Za-z0-9_-]+", "_", name).strip("_") or "none"
+    while key in taken:
+        key += "_"
+    taken.add(key)
+    return key
+
+def site_matrix(values):
+    return [[v if math.isfinite(v) else None for v in row] for row in np.round(values, SITE_DECIMALS).tolist()]
+
+def write_site_json(path, obj, written):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(obj, f, separators=(",", ":"))
+    written.add(os.path.abspath(path))
+    return os.path.getsize(path)
+
+def export_site(staffing_data, result, periods, directory):
+    # A static dashboard: the viewer page, a manifest, and the summary tables
+    # and output matrices split by domain and block of periods so a browser
+    # only fetches the slices someone opens. Cell colours come from the
+    # plan's format rules here, so the viewer never needs the rules engine.
+    # Returns (files, bytes) written.
+    if os.path.exists(os.path.join(directory, "index.html")) and not os.path.exists(os.path.join(directory, "manifest.json")):
+        raise ValueError(f"{directory} already holds a page that is not a dashboard export")
+    written = set()
+    data = staffing_data.data
+    lengths = np.array([len(p.months) for p in periods])
+    blocks = [(start, min(start + SITE_CHUNK_PERIODS, len(periods))) for start in range(0, len(periods), SITE_CHUNK_PERIODS)]
+    sides = {
+        "pair": (FORMAT_OUTPUTS["output1"], [d for (_, d) in result.pairs], result.pair_projects,
+                 result.demand_alloc, result.demand, [p for (p, _) in result.pairs]),
+        "employee": (FORMAT_OUTPUTS["output2"], result.employee_domains, [name for (_, name) in result.employees],
+                     result.avail_alloc, result.availability, None),
+    }
+    size = 0
+    outputs = {}
+    for output, (title, row_domains, labels, values, base, projects) in sides.items():
+        rules = CompiledRules(format_rules(data, SITE_OUTPUTS[output]))
+        row_domains = np.asarray(row_domains, dtype=object)
+        taken = set()
+        domains = []
+        for domain in sorted(set(row_domains.tolist())):
+            rows = np.flatnonzero(row_domains == domain)
+            key = site_key(domain, taken)
+            folder = os.path.join(directory, "data", output, key)
+            size += write_site_json(os.path.join(folder, "rows.json"), {"labels": [labels[r] for r in rows]}, written)
+            shown = period_means(values[rows], periods)
+            shown_base = period_means(base[rows], periods)
+            codes = rules.classify(shown, shown_base, row_domains[rows].tolist(),
+                                   None if projects is None else [projects[r] for r in rows])
+            for n, (start, stop) in enumerate(blocks):
+                size += write_site_json(os.path.join(folder, f"{n}.json"), {
+                    "values": site_matrix(shown[:, start:stop]),
+                    "base": site_matrix(shown_base[:, start:stop]),
+                    "codes": codes[:, start:stop].tolist(),
+                }, written)
+            domains.append({"name": domain or "(none)", "key": key, "rows": len(rows)})
+        palette = [None] + [f"#{int(c) & 0xFFFFFF:06x}" for c in rules.palette[1:]]
+        outputs[output] = {"title": title, "palette": palette, "domains": domains}
+
+    # Summary tables, split by the same blocks of periods: per domain totals
+    # (staff side by employee domain, demand side by pair domain), metrics and costs
+    summaries = {}
+    domain_rows, domain_labels = [], []
+    for output, (_, row_domains, _, values, base, _) in sides.items():
+        names, groups = np.unique(np.array(row_domains, dtype=str), return_inverse=True)
+        columns = ("demand", "covered") if output == "pair" else ("availability", "allocated")
+        for column, matrix in zip(columns, (base, base - values)):
+            domain_rows.append(group_sums(groups.reshape(-1), matrix, len(names)))
+            domain_labels += [f"{name or '(none)'} {column}" for name in names.tolist()]
+    order = np.argsort(domain_labels, kind="stable")
+    summaries["domains"] = ("Domain Totals", [domain_labels[i] for i in order],
+                            period_means(np.vstack(domain_rows)[order], periods))
+    for name, (labels, matrix) in result.metrics.items():
+        # Utilization has a row per employee; the employee chunks already carry it
+        if name != "utilization":
+            summaries[f"metrics-{name}"] = (OUTPUT_METRICS[name][0], labels, period_means(matrix, periods))
+    for group, (labels, matrix) in result.costs.items():
+        summaries[f"costs-{group}"] = (f"Cost by {COST_GROUPS[group]}", labels, period_means(matrix, periods) * lengths)
+    for key, (_, labels, matrix) in summaries.items():
+        for n, (start, stop) in enumerate(blocks):
+            size += write_site_json(os.path.join(directory, "data", "summary", key, f"{n}.json"),
+                                    {"rows": labels, "values": site_matrix(matrix[:, start:stop])}, written)
+    size += write_site_json(os.path.join(directory, "manifest.json"), {
+        "title": os.path.splitext(os.path.basename(staffing_data.filename))[0],
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "periods": [p.label for p in periods],
+        "chunk_periods": SITE_CHUNK_PERIODS,
+        "summaries": [{"key": key, "title": title} for key, (title, _, _) in summaries.items()],
+        "outputs": outputs,
+    }, written)
+    with open(SITE_VIEWER, "rb") as src, open(os.path.join(directory, "index.html"), "wb") as dst:
+        dst.write(src.read())
+    size += os.path.getsize(os.path.join(directory, "index.html"))
+    # Chunks left by an earlier export at another horizon or resolution
+    for root, _, names in os.walk(os.path.join(directory, "data")):
+        for name in names:
+            if os.path.abspath(os.path.join(root, name)) not in written:
+                os.remove(os.path.join(root, name))
+    return len(written) + 1, size
+
+MEMORY_TOP_SITES = 10
+
+MemoryEntry = namedtuple("MemoryEntry", ["subsystem", "size", "count", "detail"])
+
+def deep_size(objects, seen):
+    # Bytes held by the containers under objects; seen is shared across
+    # subsystems so each object is charged to the first one that reaches it.
+    size = 0
+    stack = list(objects)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+    return size
+
+def qt_usage(widget):
+    # Qt allocates natively, out of tracemalloc's sight, so its objects are counted instead
+    items = chars = 0
+    for table in widget.findChildren(QTableWidget):
+        for row in range(table.rowCount()):
+            for col in range(table.columnCount()):
+                item = table.item(row, col)
+                if item is not None:
+                    items += 1
+                    chars += len(item.text())
+    combos = widget.findChildren(QComboBox)
+    return items, len(widget.findChildren(QWidget)), len(combos), sum(c.count() for c in combos), chars * 2
+
+def format_bytes(size, sign=""):
+    for unit in ["B", "KB", "MB"]:
+        if abs(size) < 1024:
+            return f"{size:{sign}.0f} {unit}" if unit == "B" else f"{size:{sign}.1f} {unit}"
+        size /= 1024
+    return f"{size:{sign}.1f} GB"
+
+def process_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class MemoryReport:
+    def __init__(self, staffing_data, caches=None, tabs=None):
+        self.staffing_data = staffing_data
+        # name -> callable returning the cache, so replaced caches are picked up
+        self.caches = caches or {}
+        self.tabs = tabs or {}
+
+    def measure(self):
+        sd = self.staffing_data
+        data = sd.data
+        seen = set()
+        # Series go first so that records are charged for their own fields only
+        series = list(data["availability"].values())
+        for kind, field in MONTHLY_FIELDS.items():
+            if kind != "availability":
+                series += [r.get(field, {}) for r in data[RECORD_LISTS[kind]]]
+        entries = [MemoryEntry("monthly series", deep_size(series, seen), len(series),
+                               f"{sum(len(s) for s in series)} values")]
+        records = sum(len(data[key]) for key in RECORD_LISTS.values())
+        entries.append(MemoryEntry("records", deep_size([data], seen), records, ""))
+        indexes = [sd.records, sd.next_ids, sd.project_ids_by_name,
+                   sd.demand_by_project, sd.allocation_by_project, sd.allocation_by_employee]
+        entries.append(MemoryEntry("indexes", deep_size(indexes, seen), sum(len(i) for i in indexes), ""))
+        undo = sd.undo_stack
+        entries.append(MemoryEntry("undo stack", deep_size([undo.undo_groups, undo.redo_groups], seen),
+                                   len(undo.undo_groups) + len(undo.redo_groups), "edit groups"))
+        entries.append(MemoryEntry("file copy", deep_size([sd.base_raw], seen), 1, "kept for reload merges"))
+        for name, cache in self.caches.items():
+            obj = cache()
+            entries.append(MemoryEntry(name, deep_size([obj], seen), len(obj) if isinstance(obj, dict) else 1, ""))
+        for name, tab in self.tabs.items():
+            items, widgets, combos, choices, text = qt_usage(tab)
+            entries.append(MemoryEntry(
+                f"tab: {name}", deep_size([vars(tab)], seen) + text, items,
+                f"{widgets} widgets, {combos} combo boxes with {choices} entries, {format_bytes(text)} of cell text"))
+        if tracemalloc.is_tracing():
+            entries.append(MemoryEntry("python heap", tracemalloc.get_traced_memory()[0], 1, "traced allocations"))
+        rss = process_rss()
+        if rss is not None:
+            entries.append(MemoryEntry("process", rss, 1, "resident, including Qt"))
+        return entries
+
+    def measure_action(self, action):
+        before = self.measure()
+        start = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+        action()
+        sites = []
+        if start is not None:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            end = tracemalloc.take_snapshot().filter_traces(ignore)
+            sites = end.compare_to(start.filter_traces(ignore), "lineno")[:MEMORY_TOP_SITES]
+        return self.measure(), before, sites
+
+    def format(self, entries, before=None, sites=()):
+        previous = {e.subsystem: e for e in before or []}
+        lines = [f"{'subsystem':<36}{'size':>12}{'count':>10}{'change':>12}  detail"]
+        for entry in entries:
+            old = previous.get(entry.subsystem)
+            change = format_bytes(entry.size - old.size, "+") if old else ""
+            lines.append(f"{entry.subsystem:<36}{format_bytes(entry.size):>12}{entry.count:>10}{change:>12}  {entry.detail}")
+        if sites:
+            lines.append("")
+            lines.append("largest allocation changes:")
+            for stat in sites:
+                frame = stat.traceback[0]
+                lines.append(f"{format_bytes(stat.size_diff, '+'):>12}{stat.count_diff:>+10}  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines)
+
+class MemoryDialog(QDialog):
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Memory Report")
+        self.resize(900, 600)
+        self.main_window = window
+        # Tracing only runs while the dialog is open; it slows every allocation down
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        self.report = window.memory_report()
+        self.entries = self.report.measure()
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.text.setPlainText(self.report.format(self.entries))
+        layout = QVBoxLayout()
+        layout.addWidget(self.text)
+        btns = QHBoxLayout()
+        refresh_btn = QPushButton("Refresh")
+        shift_btn = QPushButton("After >>")
+        reload_btn = QPushButton("After Tab Reload")
+        close_btn = QPushButton("Close")
+        refresh_btn.clicked.connect(lambda: self.run_action(lambda: None))
+        shift_btn.clicked.connect(lambda: self.run_action(lambda: self.main_window.shift_months(1)))
+        reload_btn.clicked.connect(lambda: self.run_action(self.main_window.reload_tabs))
+        close_btn.clicked.connect(self.accept)
+        btns.addWidget(refresh_btn)
+        btns.addWidget(shift_btn)
+        btns.addWidget(reload_btn)
+        btns.addStretch()
+        btns.addWidget(close_btn)
+        layout.addLayout(btns)
+        self.setLayout(layout)
+
+    def run_action(self, action):
+        entries, before, sites = self.report.measure_action(lambda: self.main_window.settle(action))
+        self.text.setPlainText(self.report.format(entries, before, sites))
+
+    def done(self, result):
+        if self.started_tracing:
+            tracemalloc.stop()
+        super().done(result)
+
+def run_memory_command(args, qt_args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    tracemalloc.start()
+    if not args.window:
+        staffing_data = StaffingData(args.file, readonly=True)
+        result = compute_outputs(build_snapshot(staffing_data, month_range(get_current_month(), HORIZONS[0])))
+        validator = PlanValidator(staffing_data)
+        report = MemoryReport(staffing_data, {
+            "output result": lambda: result,
+            "validation issues": lambda: validator.issues,
+        })
+        print(report.format(report.measure()))
+        return
+    app = QApplication(sys.argv[:1] + qt_args)
+    win = StaffingApp(args.file)
+    while win.staffing_data.loading:
+        app.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+    win.output_scheduler.compute_now()
+    report = win.memory_report()
+    print(report.format(report.measure()))
+    for label, action in [(">>", lambda: win.shift_months(1)), ("tab reload", win.reload_tabs)]:
+        entries, before, sites = report.measure_action(lambda: win.settle(action))
+        print(f"\nafter {label}:")
+        print(report.format(entries, before, sites))
+
+def run_history_command(args):
+    path = history_dir(args.file)
+    if args.action == "init":
+        PlanHistory.init(path)
+        StaffingData(args.file).save("history enabled")
+        return
+    history = PlanHistory(path)
+    if not history.exists():
+        sys.exit(f"no history at {path}; run 'history init' first")
+    if args.action == "log":
+        for version, saved, message in reversed(history.versions()):
+            print(f"{version[:10]}  {saved}  {message}")
+        return
+    if not args.version:
+        sys.exit(f"history {args.action} needs a version")
+    try:
+        version = history.resolve(args.version)
+    except KeyError as e:
+        sys.exit(e.args[0])
+    if args.action == "show":
+        plan = history.open(version, args.file)
+        print(f"version {version}")
+        for kind, key in RECORD_LISTS.items():
+            print(f"  {key}: {len(plan.data[key])}")
+    elif args.action == "export":
+        if not args.output:
+            sys.exit("history export needs an output file")
+        with open(args.output, "w") as f:
+            json.dump(history.read(version), f, indent=2)
+    else:
+        staffing_data = StaffingData(args.file)
+        staffing_data.restore(history.read(version))
+        staffing_data.save(f"restored {version[:10]}")
+
+def run_diff_command(args):
+    try:
+        old = load_plan_source(args.old, args.file)
+        new = load_plan_source(args.new or args.file, args.file)
+    except (KeyError, OSError, ValueError) as e:
+        sys.exit(f"diff failed: {e}")
+    diff = PlanDiff(old, new)
+    out = sys.stdout
+    for entry in diff:
+        if args.json:
+            out.write(json.dumps(dict(entry._asdict(), key=entry.key)) + "\n")
+        else:
+            out.write(diff.format(entry) + "\n")
+    if args.json:
+        out.write(json.dumps({"op": "summary", "projects": diff.by_project, "managers": diff.by_manager}) + "\n")
+        return
+    if diff.by_project:
+        out.write("\nFTE-month change by project (demand, allocation):\n")
+        for name, totals in sorted(diff.by_project.items()):
+            out.write(f"  {name}: {totals['demand']:+g}, {totals['allocation']:+g}\n")
+    if diff.by_manager:
+        out.write("\nFTE-month change by manager (availability, allocation):\n")
+        for name, totals in sorted(diff.by_manager.items()):
+            out.write(f"  {name or '(none)'}: {totals['availability']:+g}, {totals['allocation']:+g}\n")
+
+def run_validate_command(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    validator = PlanValidator(StaffingData(args.file, readonly=True))
+    for name, title in VALIDATION_RULES.items():
+        print(f"{validator.counts[name]:6d}  {title}")
+    if args.verbose:
+        for issue in validator.all_issues():
+            month = f" {issue.month}" if issue.month else ""
+            print(f"{issue.rule}: {validator.describe(issue)}{month}: {issue.message}")
+    if any(validator.counts.values()):
+        sys.exit(1)
+
+def run_convert_command(args):
+    try:
+        with open(args.source, "rb") as f:
+            data = read_plan_bytes(f.read())
+    except (OSError, ValueError) as e:
+        sys.exit(f"convert failed: {e}")
+    target_format = plan_save_format(args.target)
+    compression = COMPRESSORS.get(os.path.splitext(args.target)[1])
+    with open(args.target, "wb") as f:
+        if target_format == "columnar":
+            f.write(ColumnarPlan.encode(data))
+        elif target_format == "compact" or args.compact:
+            with (compression(f) if compression else nullcontext(f)) as out:
+                write_compact(out, data)
+        else:
+            f.write(json.dumps(data, indent=2).encode())
+    print(f"wrote {args.target} ({os.path.getsize(args.target)} bytes)")
+
+def filter_rows(staffing_data, subject):
+    if subject == "allocation":
+        return [a["id"] for a in staffing_data.data["allocation"]]
+    if subject == "employee":
+        return [e["id"] for e in staffing_data.data["employees"]]
+    pairs = {(d["project_id"], d["domain"]) for d in staffing_data.data["demand"]}
+    pairs.update((a["project_id"], a.get("domain", DOMAINS[0])) for a in staffing_data.data["allocation"])
+    return sorted(pairs, key=lambda pair: (staffing_data.project_name(pair[0]), pair[1]))
+
+def filter_row_text(staffing_data, subject, key):
+    if subject == "pair":
+        return f"{staffing_data.project_name(key[0])}\t{key[1]}"
+    employee = lambda eid: staffing_data.records["employee"].get(eid, {})
+    if subject == "employee":
+        return f"{key}\t{employee(key).get('name', '')}\t{employee(key).get('domain', '')}\t{employee(key).get('manager', '')}"
+    alloc = staffing_data.records["allocation"][key]
+    return (f"{key}\t{employee(alloc['employee_id']).get('name', '')}\t"
+            f"{staffing_data.project_name(alloc['project_id'])}\t{alloc.get('domain', DOMAINS[0])}")
+
+def run_filter_command(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    try:
+        expression = PlanFilter(args.expression, args.subject)
+        months = parse_month_range(args.months) if args.months else month_range(get_current_month(), HORIZONS[0])
+    except ValueError as e:
+        sys.exit(f"filter: {e}")
+    staffing_data = StaffingData(args.file, readonly=True)
+    keys = filter_rows(staffing_data, args.subject)
+    rows = expression.select(FilterContext(staffing_data, args.subject, keys, months))
+    if not args.count:
+        for i in rows:
+            print(filter_row_text(staffing_data, args.subject, keys[i]))
+    print(f"{len(rows)} of {len(keys)} rows", file=sys.stderr if not args.count else sys.stdout)
+
+def run_metrics_command(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    staffing_data = StaffingData(args.file, readonly=True)
+    try:
+        months = parse_month_range(args.months) if args.months else month_range(get_current_month(), HORIZONS[0])
+    except ValueError as e:
+        sys.exit(f"metrics: {e}")
+    fiscal_start = staffing_data.data.get("fiscal_year_start", 1)
+    first = period_start(months[0], args.resolution, fiscal_start)
+    periods = build_periods(first, month_span(first, months[-1]), args.resolution, fiscal_start)
+    snapshot = build_snapshot(staffing_data, [m for p in periods for m in p.months])
+    names = args.metric or plan_metrics(staffing_data.data)
+    try:
+        result = compute_outputs(snapshot._replace(metrics=names))
+    except ValueError as e:
+        sys.exit(f"metrics: {e}; run validate to find the bad value")
+    report = {}
+    for name in names:
+        labels, matrix = result.metrics[name]
+        report[name] = {"title": OUTPUT_METRICS[name][0], "periods": [p.label for p in periods], "rows": labels,
+                        "values": np.round(period_means(matrix, periods), 4).tolist()}
+    if args.json:
+        # Utilization and coverage are infinite where nothing is available or demanded
+        for table in report.values():
+            table["values"] = [[v if math.isfinite(v) else None for v in row] for row in table["values"]]
+        print(json.dumps(report, indent=2))
+        return
+    for name, table in report.items():
+        print(table["title"])
+        width = max([len(label) for label in table["rows"]] + [8])
+        print(" " * width + "".join(f"{label:>10}" for label in table["periods"]))
+        for label, values in zip(table["rows"], table["values"]):
+            print(f"{label:<{width}}" + "".join(f"{v:10.2f}" for v in values))
+        print()
+
+def run_available_command(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    try:
+        months = parse_month_range(args.months) if args.months else month_range(get_current_month(), HORIZONS[0])
+    except ValueError as e:
+        sys.exit(f"available: {e}")
+    staffing_data = StaffingData(args.file, readonly=True)
+    snapshot = build_snapshot(staffing_data, months)
+    try:
+        result = compute_outputs(snapshot._replace(metrics=[], rates=None))
+    except ValueError as e:
+        sys.exit(f"available: {e}; run validate to find the bad value")
+    index = FreeCapacityIndex()
+    index.update(result)
+    found = index.query(args.domain, args.minimum, months[0], months[-1])
+    for emp_id, name, domain, lowest, mean in found[:args.top]:
+        print(f"{emp_id}\t{name}\t{domain}\t{lowest:.2f}\t{mean:.2f}")
+    print(f"{len(found)} employee(s) with {args.minimum:g} FTE free from {months[0]} to {months[-1]}", file=sys.stderr)
+
+def run_dashboard_command(args):
+    if not os.path.exists(args.file):
+        sys.exit(f"no plan at {args.file}")
+    staffing_data = StaffingData(args.file, readonly=True)
+    try:
+        months = parse_month_range(args.months) if args.months else month_range(get_current_month(), HORIZONS[0])
+    except ValueError as e:
+        sys.exit(f"dashboard: {e}")
+    fiscal_start = staffing_data.data.get("fiscal_year_start", 1)
+    first = period_start(months[0], args.resolution, fiscal_start)
+    periods = build_periods(first, month_span(first, months[-1]), args.resolution, fiscal_start)
+    try:
+        result = compute_outputs(build_snapshot(staffing_data, [m for p in periods for m in p.months]))
+    except ValueError as e:
+        sys.exit(f"dashboard: {e}; run validate to find the bad value")
+    try:
+        files, size = export_site(staffing_data, result, periods, args.directory)
+    except (OSError, ValueError) as e:
+        sys.exit(f"dashboard: {e}")
+    print(f"wrote {files} files ({format_bytes(size)}) to {args.directory}")
 
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Staffing Demand vs Availability Tracker")
+    parser.add_argument("--file", default="staffing_data.json", help="plan file to open")
+    parser.add_argument("--publish", nargs="?", const="", metavar="NAME",
+                        help="share the computed outputs with read-only viewers on this host")
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="share one in-memory plan over a local HTTP API")
+    serve.add_argument("--host", default=SERVER_HOST)
+    serve.add_argument("--port", type=int, default=SERVER_PORT)
+    serve.add_argument("--autosave", type=float, default=SERVER_AUTOSAVE_S,
+                       help="seconds of quiet before edits are saved (0 disables)")
+    feed = commands.add_parser("import", help="import an availability, demand or allocation CSV feed")
+    feed.add_argument("kind", choices=list(IMPORT_KEYS))
+    feed.add_argument("csv", help="CSV with key columns and either month/fte columns or one column per month")
+    feed.add_argument("--dry-run", action="store_true", help="report what would change without saving")
+    history = commands.add_parser("history", help="list, inspect and restore saved versions of the plan")
+    history.add_argument("action", choices=["init", "log", "show", "export", "checkout"])
+    history.add_argument("version", nargs="?", help="version id or unique prefix")
+    history.add_argument("output", nargs="?", help="file to write for export")
+    diff = commands.add_parser("diff", help="compare two plans by employee, project/domain and allocation keys")
+    diff.add_argument("old", help="plan file or history version")
+    diff.add_argument("new", nargs="?", help="plan file or history version (default: --file)")
+    diff.add_argument("--json", action="store_true", help="write one JSON object per change")
+    validate = commands.add_parser("validate", help="check the plan and report issue counts per rule")
+    validate.add_argument("-v", "--verbose", action="store_true", help="list every issue")
+    convert = commands.add_parser("convert", help="convert a plan between JSON and the columnar format")
+    convert.add_argument("source", help="plan file in either format")
+    convert.add_argument("target", help=f"file to write; columnar when it ends in {COLUMNAR_SUFFIX}, "
+                         "compressed compact JSON when it ends in .gz or .xz")
+    convert.add_argument("--compact", action="store_true", help="write compact run-length encoded JSON")
+    filtering = commands.add_parser("filter", help="list the rows matching a filter expression")
+    filtering.add_argument("subject", choices=list(FILTER_METRICS),
+                           help="allocations, project/domain pairs or employees")
+    filtering.add_argument("expression", help="e.g. 'domain=HW and manager=Bob and util(2026-01..2026-06) > 1.1'")
+    filtering.add_argument("--months", metavar="FIRST..LAST",
+                           help=f"months for terms without a range (default: the next {HORIZONS[0]})")
+    filtering.add_argument("--count", action="store_true", help="only print the number of matching rows")
+    metrics = commands.add_parser("metrics", help="print utilization, bench, coverage and over-allocation per period")
+    metrics.add_argument("--metric", action="append", choices=list(OUTPUT_METRICS),
+                         help="metric to report; repeat for several (default: the plan's configured set)")
+    metrics.add_argument("--months", metavar="FIRST..LAST", help=f"months to cover (default: the next {HORIZONS[0]})")
+    metrics.add_argument("--resolution", choices=list(RESOLUTIONS), default="month")
+    metrics.add_argument("--json", action="store_true", help="write the tables as JSON")
+    available = commands.add_parser("available", help="list employees with free capacity in every month of a range")
+    available.add_argument("--domain", help="only employees in this domain (default: all)")
+    available.add_argument("--min", type=float, default=0.5, dest="minimum",
+                           help="FTE that must be free in every month (default: 0.5)")
+    available.add_argument("--months", metavar="FIRST..LAST", help=f"months to cover (default: the next {HORIZONS[0]})")
+    available.add_argument("--top", type=int, help="only list the N with the most free capacity")
+    dashboard = commands.add_parser("dashboard", help="export a static HTML dashboard of the outputs, e.g. for GitHub Pages")
+    dashboard.add_argument("directory", help="folder to write index.html and the JSON chunks to")
+    dashboard.add_argument("--months", metavar="FIRST..LAST", help=f"months to cover (default: the next {HORIZONS[0]})")
+    dashboard.add_argument("--resolution", choices=list(RESOLUTIONS), default="month")
+    memory = commands.add_parser("memory", help="report memory use by subsystem")
+    memory.add_argument("--window", action="store_true",
+                        help="also build the window to count Qt items per tab and measure >> and tab reloads")
+    view = commands.add_parser("view", help="show the outputs of a publishing instance without loading the plan")
+    view.add_argument("--name", help="shared outputs to attach to (default: the ones published for --file)")
+    args, qt_args = parser.parse_known_args()
+    # Only the commands that open a window hand leftover arguments on to Qt
+    if qt_args and not (args.command in (None, "view") or args.command == "memory" and args.window):
+        parser.error(f"unrecognized arguments: {' '.join(qt_args)}")
+
+    if args.command == "serve":
+        server = PlanServer(StaffingData(args.file), args.host, args.port, args.autosave if args.autosave > 0 else None)
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.command == "history":
+        run_history_command(args)
+        return
+    if args.command == "diff":
+        run_diff_command(args)
+        return
+    if args.command == "validate":
+        run_validate_command(args)
+        return
+    if args.command == "convert":
+        run_convert_command(args)
+        return
+    if args.command == "filter":
+        run_filter_command(args)
+        return
+    if args.command == "metrics":
+        run_metrics_command(args)
+        return
+    if args.command == "available":
+        run_available_command(args)
+        return
+    if args.command == "dashboard":
+        run_dashboard_command(args)
+        return
+    if args.command == "memory":
+        run_memory_command(args, qt_args)
+        return
+    if args.command == "import":
+        staffing_data = StaffingData(args.file)
+        try:
+            importer = CsvImport(staffing_data, args.kind).read(args.csv)
+        except (OSError, ValueError, csv.Error) as e:
+            sys.exit(f"import failed: {e}")
+        print(importer.describe())
+        if not args.dry_run:
+            importer.apply()
+            staffing_data.save()
+        return
+
+    app = QApplication(sys.argv[:1] + qt_args)
     if qdarkstyle:
         app.setStyleSheet(qdarkstyle.load_stylesheet(qt_api='pyqt6'))
-    win = StaffingApp()
+    if args.command == "view":
+        win = ReplicaViewer(args.name or replica_name(args.file))
+    else:
+        win = StaffingApp(args.file, None if args.publish is None else args.publish or replica_name(args.file))
     win.show()
     sys.exit(app.exec())
 